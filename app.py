@@ -6,15 +6,14 @@ Training Completion Simulator with Interactive Web Interface
 This is the UI layer that uses simulation_core.py for all business logic.
 """
 
+import time
+
 import gradio as gr
-import pandas as pd
-import os
-import io
-import zipfile
 from dotenv import load_dotenv
 
 # Import shared business logic
 import simulation_core as core
+from simulation_run_cache import RunCache, compute_run_fingerprint, get_state_watermark
 
 # Load environment variables
 load_dotenv()
@@ -22,18 +21,47 @@ load_dotenv()
 # Load configuration
 config = core.load_config()
 
+# Results of recent runs, reused when the same inputs are run again
+run_cache = RunCache.from_config(config)
+
 
 # ==============================================================================
 # Gradio UI Functions
 # ==============================================================================
 
-def run_simulation(employee_file, publish_enabled, progress=gr.Progress()):
+def get_run_fingerprint(run_config, employee_file_path, add_progress):
+    """
+    Fingerprint a run's inputs for the run cache.
+
+    Returns:
+        The fingerprint, or None if the inbound files cannot be listed or the
+        state tables cannot be read (the run then goes ahead uncached)
+    """
+    try:
+        course_catalog, standalone_content = core.list_most_recent_inbound_files(run_config)
+    except Exception as e:
+        add_progress(f"Run cache skipped: could not list SFTP inbound files ({e})")
+        return None
+    try:
+        state_watermark = get_state_watermark(run_config)
+    except Exception as e:
+        add_progress(f"Run cache skipped: could not read the state tables ({e})")
+        return None
+    return compute_run_fingerprint(run_config, employee_file_path, course_catalog, standalone_content,
+                                   state_watermark=state_watermark)
+
+
+def run_simulation(employee_file, publish_enabled, zip_compression, profile_enabled,
+                   force_rerun=False, progress=gr.Progress()):
     """
     Run the complete BTC training simulation.
 
     Args:
         employee_file: Uploaded CSV file with employee data
         publish_enabled: Whether to publish files to SFTP outbound
+        zip_compression: Compression for the download ZIP ('deflated' or 'stored')
+        profile_enabled: Whether to profile the run (artifacts are added to the ZIP)
+        force_rerun: Run even if the run cache holds a result for the same inputs
         progress: Gradio progress tracker
 
     Returns:
@@ -52,185 +80,33 @@ def run_simulation(employee_file, publish_enabled, progress=gr.Progress()):
         add_progress("=" * 80)
         add_progress("")
 
-        # Step 0: Cleanup - Remove old files from previous runs
-        add_progress("STEP 0: Cleanup")
-        add_progress("-" * 80)
-
-        core.cleanup_output_directory(config, add_progress)
-        add_progress("")
-
-        # Step 1: Load employee file
-        add_progress("STEP 1: Loading Employee Data")
-        add_progress("-" * 80)
-
         if employee_file is None:
             return "Error: No employee file uploaded", None
 
-        employees_df, filtered_count = core.load_and_filter_employees(
-            employee_file.name, add_progress)
-        add_progress("")
-
-        # Step 2: Download files from SFTP
-        add_progress("STEP 2: Downloading Files from SFTP")
-        add_progress("-" * 80)
-
-        course_catalog_path = core.download_most_recent_file_from_sftp(
-            config, 'course_catalog', add_progress)
-        standalone_content_path = core.download_most_recent_file_from_sftp(
-            config, 'standalone_content', add_progress)
-
-        if not course_catalog_path or not standalone_content_path:
-            return "\n".join(summary_lines) + "\n\nError: Failed to download required files", None
-
-        add_progress(f"Downloaded course catalog: {os.path.basename(course_catalog_path)}")
-        add_progress(f"Downloaded standalone content: {os.path.basename(standalone_content_path)}")
-        add_progress("")
-
-        # Load standalone content for lookups
-        standalone_df = pd.read_csv(standalone_content_path)
-
-        # Step 3: Manager Assignments
-        add_progress("STEP 3: Creating Manager Assignments")
-        add_progress("-" * 80)
-
-        employee_ids_list = employees_df['employee_id'].tolist()
-
-        # Query Databricks for open assignments
-        open_assignments_df = core.get_open_assignments_from_databricks(
-            config, employee_ids_list, add_progress)
-
-        # Convert Databricks assignments to output format
-        databricks_assignments = core.convert_databricks_assignments_to_output_format(
-            open_assignments_df)
-
-        add_progress(f"Loaded {len(databricks_assignments)} open assignments from Databricks")
-
-        # Create new manager assignments
-        new_manager_assignments = core.create_manager_assignments(
-            employees_df, add_progress)
-
-        # Combine all assignments
-        all_assignments = databricks_assignments + new_manager_assignments
-        add_progress(f"Total assignments: {len(all_assignments)}")
-
-        # Write NonCompletedAssignments file
-        assignments_path = core.write_non_completed_assignments_file(
-            all_assignments, config['output_dir'])
-        add_progress(f"Generated: {os.path.basename(assignments_path)}")
-        add_progress("")
-
-        # Step 4: Employee Training Simulation
-        add_progress("STEP 4: Simulating Employee Training Completions")
-        add_progress("-" * 80)
-
-        all_completions = []
-
-        for employee in employees_df.itertuples():
-            employee_id = employee.employee_id
-            employee_type = employee.employee_edu_type
-
-            add_progress(f"Processing employee {employee_id} (type {employee_type})...")
-
-            # Get AI recommendations
-            ai_recommendations = core.get_training_recommendations(config, employee_id, add_progress)
-
-            # Get manager assignments
-            manager_assignments = core.get_manager_assignments_for_employee(
-                employee_id, assignments_path, standalone_df)
-
-            # Process employee
-            completions = core.process_employee(
-                config, employee_id, employee_type,
-                manager_assignments, ai_recommendations,
-                standalone_df, add_progress)
-
-            all_completions.extend(completions)
-
-            if completions:
-                add_progress(f"  Completed {len(completions)} training(s)")
-
-        add_progress(f"Total completions: {len(all_completions)}")
-        add_progress("")
-
-        # Step 5: Generate Output Files
-        add_progress("STEP 5: Generating Output Files")
-        add_progress("-" * 80)
-
-        if all_completions:
-            output_path = core.write_content_user_completion_file(
-                all_completions, config['output_dir'])
-            add_progress(f"Generated: {os.path.basename(output_path)}")
-
-            # Update NonCompletedAssignments file
-            initial_count, removed_count = core.update_non_completed_assignments_file(
-                assignments_path, all_completions)
-            add_progress(f"Updated NonCompletedAssignments: removed {removed_count} completed assignments")
-        else:
-            add_progress("No completions to write")
-            output_path = None
-
-        # Generate UserCompletion file (dummy file)
-        user_completion_path = core.generate_user_completion_file_from_template(
-            config, add_progress)
-
-        add_progress("")
-
-        # Step 6: Publish to SFTP (if enabled)
-        if publish_enabled:
-            add_progress("STEP 6: Publishing Files to SFTP Outbound")
-            add_progress("-" * 80)
-
-            files_to_publish = []
-            if output_path and os.path.exists(output_path):
-                files_to_publish.append(output_path)
-            if os.path.exists(assignments_path):
-                files_to_publish.append(assignments_path)
-            if os.path.exists(user_completion_path):
-                files_to_publish.append(user_completion_path)
-            if course_catalog_path:
-                files_to_publish.append(course_catalog_path)
-            if standalone_content_path:
-                files_to_publish.append(standalone_content_path)
-
-            # Override config for this run
-            publish_config = config.copy()
-            publish_config['sftp_publish_enabled'] = True
-
-            success = core.publish_files_to_sftp_outbound(
-                publish_config, files_to_publish, add_progress)
-
-            if success:
-                add_progress("✓ All files published successfully")
-            else:
-                add_progress("⚠ Some files failed to publish")
-
-            add_progress("")
+        run_config = config.copy()
+        run_config['zip_compression'] = zip_compression
+        run_config['profile_enabled'] = profile_enabled
+
+        # Publishing and write-back runs always run, so the files really reach
+        # SFTP outbound and the run really reaches the state tables
+        fingerprint = None
+        if run_config['run_cache_enabled'] and not publish_enabled and not run_config['state_writeback_enabled']:
+            fingerprint = get_run_fingerprint(run_config, employee_file.name, add_progress)
+            cached = run_cache.get(fingerprint) if fingerprint and not force_rerun else None
+            if cached:
+                created = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(cached['created_at']))
+                notice = (f"Cached result from {created} (same employees file, inbound files, "
+                          f"configuration and PT date; tick \"Force rerun\" to run again)")
+                return notice + "\n\n" + cached['summary'], cached['zip_path']
+
+        # Steps 0-6: cleanup, load, download, assignments, completions, outputs, publish
+        result = core.run_simulation(run_config, employee_file.name, publish_enabled, add_progress)
 
         # Step 7: Create downloadable ZIP file
         add_progress("Creating download package...")
-        zip_buffer = io.BytesIO()
-
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            # Add generated files
-            if output_path and os.path.exists(output_path):
-                zip_file.write(output_path, os.path.basename(output_path))
-            if os.path.exists(assignments_path):
-                zip_file.write(assignments_path, os.path.basename(assignments_path))
-            if os.path.exists(user_completion_path):
-                zip_file.write(user_completion_path, os.path.basename(user_completion_path))
-
-            # Add downloaded files
-            if course_catalog_path and os.path.exists(course_catalog_path):
-                zip_file.write(course_catalog_path, os.path.basename(course_catalog_path))
-            if standalone_content_path and os.path.exists(standalone_content_path):
-                zip_file.write(standalone_content_path, os.path.basename(standalone_content_path))
-
-        zip_buffer.seek(0)
-
-        # Save ZIP to temp file
-        zip_path = os.path.join(config['output_dir'], "generated_files.zip")
-        with open(zip_path, 'wb') as f:
-            f.write(zip_buffer.read())
+
+        zip_files = core.get_run_files(result) + core.get_run_artifacts(result)
+        zip_path = core.create_download_zip(run_config, zip_files, progress_callback=add_progress)
 
         add_progress("")
         add_progress("=" * 80)
@@ -238,6 +114,8 @@ def run_simulation(employee_file, publish_enabled, progress=gr.Progress()):
         add_progress("=" * 80)
 
         summary = "\n".join(summary_lines)
+        if fingerprint:
+            run_cache.put(fingerprint, zip_path, summary)
         return summary, zip_path
 
     except Exception as e:
@@ -246,6 +124,31 @@ def run_simulation(employee_file, publish_enabled, progress=gr.Progress()):
         return "\n".join(summary_lines), None
 
 
+def estimate_run(employee_file, sample_size, progress=gr.Progress()):
+    """
+    Estimate a full run from a dry run of a sample of the uploaded employees.
+
+    Args:
+        employee_file: Uploaded CSV file with employee data
+        sample_size: Number of employees in the dry run
+        progress: Gradio progress tracker
+
+    Returns:
+        Estimate report text
+    """
+    try:
+        if employee_file is None:
+            return "Error: No employee file uploaded"
+
+        estimate = core.estimate_run(
+            config, employee_file.name, int(sample_size),
+            progress_callback=lambda msg: progress(0.5, desc=msg[:100]))
+        return core.format_run_estimate(estimate)
+
+    except Exception as e:
+        return f"✗ Estimate Error: {str(e)}"
+
+
 def test_api(employee_id_str):
     """Test ML Training Recommender API"""
     try:
@@ -267,6 +170,39 @@ def test_api(employee_id_str):
         return f"✗ API Error: {str(e)}"
 
 
+def probe_api(employee_file, employee_ids_text, sample_size, request_count, max_concurrency,
+              progress=gr.Progress()):
+    """
+    Probe ML Training Recommender API latency and throughput.
+
+    Args:
+        employee_file: Optional uploaded employees CSV to sample IDs from
+        employee_ids_text: Pasted employee IDs (used instead of the file when given)
+        sample_size: Number of IDs sampled from the file
+        request_count: Requests per concurrency level
+        max_concurrency: Highest concurrency level
+        progress: Gradio progress tracker
+
+    Returns:
+        Probe report text
+    """
+    try:
+        if employee_ids_text and employee_ids_text.strip():
+            employee_ids = core.parse_employee_id_list(employee_ids_text)
+        elif employee_file is not None:
+            employee_ids = core.sample_probe_employee_ids(employee_file.name, int(sample_size))
+        else:
+            return "Error: Upload an employees file or paste employee IDs"
+
+        report = core.probe_recommender(
+            config, employee_ids, int(request_count), int(max_concurrency),
+            progress_callback=lambda msg: progress(0.5, desc=msg[:100]))
+        return core.format_probe_report(report)
+
+    except Exception as e:
+        return f"✗ Probe Error: {str(e)}"
+
+
 def show_config():
     """Display current configuration"""
     config_text = "Current Configuration:\n"
@@ -275,7 +211,9 @@ def show_config():
     config_text += "API Configuration:\n"
     config_text += f"- Base URL: {config['api_base_url']}\n"
     config_text += f"- Endpoint: {config['api_endpoint']}\n"
-    config_text += f"- Timeout: {config['api_timeout']}s\n\n"
+    config_text += f"- Timeout: {config['api_timeout']}s\n"
+    config_text += f"- Batch Size: {config['recommender_batch_size']}\n"
+    config_text += f"- Concurrency: {config['recommender_concurrency']}\n\n"
 
     config_text += "Databricks:\n"
     config_text += f"- Host: {config['databricks_host']}\n"
@@ -296,7 +234,13 @@ def show_config():
     config_text += "File Paths:\n"
     config_text += f"- Employees File: {config['employees_file']}\n"
     config_text += f"- Output Dir: {config['output_dir']}\n"
-    config_text += f"- SFTP Local Dir: {config['sftp_local_dir']}\n"
+    config_text += f"- SFTP Local Dir: {config['sftp_local_dir']}\n\n"
+
+    config_text += "Run Cache:\n"
+    config_text += f"- Enabled: {config['run_cache_enabled']}\n"
+    config_text += f"- Directory: {run_cache.directory}\n"
+    config_text += f"- TTL: {config['run_cache_ttl_minutes']:g} min\n"
+    config_text += f"- Max Size: {config['run_cache_max_bytes']:,} bytes\n"
 
     return config_text
 
@@ -321,6 +265,23 @@ with gr.Blocks(title="BTC Fake - Training Simulator") as app:
                 value=False
             )
 
+            zip_compression_dropdown = gr.Dropdown(
+                label="Download ZIP Compression",
+                choices=list(core.ZIP_COMPRESSION_TYPES),
+                value=config['zip_compression']
+            )
+
+            profile_checkbox = gr.Checkbox(
+                label="Enable Profiling (adds profile files to the ZIP)",
+                value=config['profile_enabled']
+            )
+
+            force_rerun_checkbox = gr.Checkbox(
+                label="Force rerun (ignore cached results for the same inputs)",
+                value=False,
+                visible=config['run_cache_enabled']
+            )
+
             run_button = gr.Button("🚀 Run Simulation", variant="primary")
             output_summary = gr.Textbox(
                 label="Simulation Summary",
@@ -331,10 +292,29 @@ with gr.Blocks(title="BTC Fake - Training Simulator") as app:
 
             run_button.click(
                 fn=run_simulation,
-                inputs=[employee_file_input, publish_checkbox],
+                inputs=[employee_file_input, publish_checkbox, zip_compression_dropdown,
+                        profile_checkbox, force_rerun_checkbox],
                 outputs=[output_summary, download_button]
             )
 
+            gr.Markdown("### Estimate before running")
+            gr.Markdown("Dry-runs a random sample of the uploaded employees with real SFTP, "
+                        "Databricks and recommender calls (nothing is published or written back) "
+                        "and extrapolates time, API calls, queries and output sizes to the full file.")
+            estimate_sample_input = gr.Number(
+                label="Employees Sampled",
+                value=core.ESTIMATE_SAMPLE_SIZE,
+                precision=0
+            )
+            estimate_button = gr.Button("⏱ Estimate Run")
+            estimate_output = gr.Textbox(label="Run Estimate", lines=25)
+
+            estimate_button.click(
+                fn=estimate_run,
+                inputs=[employee_file_input, estimate_sample_input],
+                outputs=estimate_output
+            )
+
         # Tab 2: Test ML Reco API
         with gr.Tab("Test ML Reco API"):
             gr.Markdown("### Test ML Training Recommender API connectivity")
@@ -352,6 +332,31 @@ with gr.Blocks(title="BTC Fake - Training Simulator") as app:
                 outputs=[api_output]
             )
 
+            gr.Markdown("### Latency & throughput probe")
+            gr.Markdown("Fires requests at increasing concurrency (1, 2, 4, ... up to the maximum) "
+                        "and recommends a `RECOMMENDER_CONCURRENCY` for the main run.")
+
+            probe_file_input = gr.File(label="Sample IDs from Employees CSV", file_types=[".csv"])
+            probe_ids_input = gr.Textbox(
+                label="...or paste Employee IDs",
+                placeholder="88563, 88564, 88565",
+                lines=3
+            )
+            with gr.Row():
+                probe_sample_input = gr.Number(label="IDs sampled from file", value=50, precision=0)
+                probe_requests_input = gr.Number(label="Requests per concurrency level", value=100,
+                                                 precision=0)
+                probe_concurrency_input = gr.Number(label="Max concurrency", value=16, precision=0)
+            probe_button = gr.Button("📈 Run Probe")
+            probe_output = gr.Textbox(label="Probe Report", lines=20)
+
+            probe_button.click(
+                fn=probe_api,
+                inputs=[probe_file_input, probe_ids_input, probe_sample_input, probe_requests_input,
+                        probe_concurrency_input],
+                outputs=[probe_output]
+            )
+
         # Tab 3: Configuration
         with gr.Tab("Configuration"):
             gr.Markdown("### View current configuration from .env file")
@@ -0,0 +1,14 @@
+"""
+BTC Fake - Load Harness
+
+Local stand-ins for the external systems the simulator talks to, so the whole
+run_simulation() flow can be measured at any population size without touching
+the real Dataiku, Databricks or SFTP endpoints:
+
+- recommender_stub: HTTP stand-in for the ML Training Recommender API
+- sftp_stub: paramiko SFTP server serving fake CourseCatalog / StandAloneContent files
+- sql_standin: SQLite stand-in for the content_assignments / content_completion tables
+- harness: wires the stand-ins together and reports per-stage throughput
+
+Run with: python -m load_harness --sizes 100 1000
+"""
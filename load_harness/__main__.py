@@ -0,0 +1,67 @@
+"""
+Command-line entry point for the load harness.
+
+Usage:
+    python -m load_harness --sizes 100 1000
+    python -m load_harness --sizes 1000 --latency-ms 40 --latency-distribution lognormal --error-rate 0.01
+    python -m load_harness --sizes 10000 --latency-ms 40 --recommender-batch-size 100
+"""
+
+import argparse
+import json
+import sys
+
+from load_harness.harness import DEFAULT_CATALOG_SIZE, LoadHarness, format_report
+from load_harness.recommender_stub import LATENCY_DISTRIBUTIONS
+
+
+def main(argv=None) -> int:
+    """Run the harness for each requested population size."""
+    parser = argparse.ArgumentParser(
+        prog="python -m load_harness",
+        description="Run the full simulation against local stand-ins and report per-stage throughput")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100], help="Population sizes")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Recommender latency (median)")
+    parser.add_argument("--latency-distribution", choices=LATENCY_DISTRIBUTIONS, default='fixed')
+    parser.add_argument("--latency-spread", type=float, default=0.5,
+                        help="Uniform +/- fraction, or lognormal sigma")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of recommender requests that fail")
+    parser.add_argument("--catalog-size", type=int, default=DEFAULT_CATALOG_SIZE)
+    parser.add_argument("--state-store", action="store_true",
+                        help="Use the local state mirror (STATE_STORE_PATH) synced from the SQL stand-in")
+    parser.add_argument("--writeback", action="store_true",
+                        help="Write completions and assignments back to the SQL stand-in")
+    parser.add_argument("--recommender-batch-size", type=int, default=1,
+                        help="ba_ids per recommender request (RECOMMENDER_BATCH_SIZE)")
+    parser.add_argument("--no-recommender-batches", action="store_true",
+                        help="Make the recommender stub reject batch requests (tests the fallback)")
+    parser.add_argument("--no-publish", action="store_true", help="Skip the SFTP publish step")
+    parser.add_argument("--work-dir", help="Keep run files in this directory (default: temporary)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--verbose", action="store_true", help="Print pipeline progress")
+    parser.add_argument("--output", help="Write the reports to this JSON file")
+    args = parser.parse_args(argv)
+
+    reports = []
+    with LoadHarness(work_dir=args.work_dir, latency_ms=args.latency_ms,
+                     latency_distribution=args.latency_distribution,
+                     latency_spread=args.latency_spread, error_rate=args.error_rate,
+                     catalog_size=args.catalog_size, state_store=args.state_store,
+                     writeback=args.writeback, recommender_batch_size=args.recommender_batch_size,
+                     recommender_batch_enabled=not args.no_recommender_batches, seed=args.seed) as harness:
+        for size in args.sizes:
+            report = harness.run(size, publish=not args.no_publish,
+                                 progress_callback=print if args.verbose else None)
+            reports.append(report)
+            print(format_report(report))
+            print()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(reports, f, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""
+End-to-end load harness.
+
+Starts the recommender, SFTP and SQLite stand-ins, points a configuration at
+them and runs simulation_core.run_simulation() for one or more population
+sizes, then reports per-stage wall time and throughput from the run metrics.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import simulation_core as core
+from simulation_synthetic import generate_employee_chunks, write_employees_file
+
+from load_harness.recommender_stub import RecommenderStub
+from load_harness.sftp_stub import SFTPStubServer, write_fake_inbound_files
+from load_harness.sql_standin import seed_state_chunks
+
+INBOUND_REMOTE_PATH = "/inbound"
+OUTBOUND_REMOTE_PATH = "/outbound"
+
+# Synthetic catalog size (real content IDs are 6-7 digits)
+DEFAULT_CATALOG_SIZE = 200
+
+# Stages reported in the summary, in pipeline order
+REPORT_STAGES = ['cleanup', 'load_employees', 'sftp_download', 'load_standalone_content',
+                 'state_sync', 'databricks_open_assignments', 'assignments', 'recommender',
+                 'manager_assignments_lookup', 'recent_completions_lookup', 'process_employee',
+                 'population_completions', 'simulate_completions',
+                 'write_outputs', 'state_writeback', 'publish', 'run']
+
+
+def build_content_ids(catalog_size: int = DEFAULT_CATALOG_SIZE) -> List[int]:
+    """Content IDs for the fake catalog: the known IDs plus synthetic ones."""
+    known_ids = [int(content['id']) for content in core.DAILY_DOSE_CONTENT + core.NON_DAILY_DOSE_CONTENT]
+    synthetic_ids = [2_100_000 + i for i in range(max(catalog_size - len(known_ids), 0))]
+    return known_ids + synthetic_ids
+
+
+class LoadHarness:
+    """
+    Owns the stand-in services and a working directory for a series of runs.
+
+    Use as a context manager:
+
+        with LoadHarness(latency_ms=50) as harness:
+            report = harness.run(1000)
+    """
+
+    def __init__(self, work_dir: Optional[str] = None, latency_ms: float = 0.0,
+                 latency_distribution: str = 'fixed', latency_spread: float = 0.5,
+                 error_rate: float = 0.0, catalog_size: int = DEFAULT_CATALOG_SIZE,
+                 state_store: bool = False, writeback: bool = False, recommender_batch_size: int = 1,
+                 recommender_batch_enabled: bool = True, seed: int = 42):
+        self._owns_work_dir = work_dir is None
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix="btc_load_")
+        self.seed = seed
+        self.state_store = state_store
+        self.writeback = writeback
+        self.recommender_batch_size = recommender_batch_size
+        self.content_ids = build_content_ids(catalog_size)
+
+        self.sftp_root = os.path.join(self.work_dir, "sftp")
+        self.recommender = RecommenderStub(
+            self.content_ids, latency_ms=latency_ms, latency_distribution=latency_distribution,
+            latency_spread=latency_spread, error_rate=error_rate,
+            batch_enabled=recommender_batch_enabled, seed=seed)
+        self.sftp = SFTPStubServer(self.sftp_root)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self) -> None:
+        """Write the fake inbound files and start the stand-in services."""
+        os.makedirs(self.sftp_root + OUTBOUND_REMOTE_PATH, exist_ok=True)
+        write_fake_inbound_files(self.sftp_root + INBOUND_REMOTE_PATH, self.content_ids, seed=self.seed)
+        self.recommender.start()
+        self.sftp.start()
+
+    def stop(self) -> None:
+        """Stop the services and remove the working directory if it was temporary."""
+        self.recommender.stop()
+        self.sftp.stop()
+        if self._owns_work_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def build_config(self, run_dir: str, state_db_path: str) -> Dict:
+        """Configuration pointing every external dependency at a stand-in."""
+        sftp_host, sftp_port = self.sftp.address
+        output_dir = os.path.join(run_dir, "generated_files")
+        os.makedirs(output_dir, exist_ok=True)
+
+        config = core.load_config()
+        config.update({
+            'api_base_url': self.recommender.base_url,
+            'api_endpoint': self.recommender.endpoint,
+            'recommender_batch_size': self.recommender_batch_size,
+            'output_dir': output_dir,
+            'sftp_local_dir': output_dir,
+            'databricks_sqlite_path': state_db_path,
+            'sftp_inbound_host': sftp_host,
+            'sftp_inbound_port': sftp_port,
+            'sftp_inbound_user': self.sftp.username,
+            'sftp_inbound_password': self.sftp.password,
+            'sftp_inbound_remote_path': INBOUND_REMOTE_PATH,
+            'sftp_outbound_host': sftp_host,
+            'sftp_outbound_port': sftp_port,
+            'sftp_outbound_user': self.sftp.username,
+            'sftp_outbound_password': self.sftp.password,
+            'sftp_outbound_remote_path': OUTBOUND_REMOTE_PATH,
+            'metrics_enabled': True,
+            'state_writeback_enabled': self.writeback,
+        })
+        if self.state_store:
+            config['state_store_path'] = os.path.join(run_dir, "state_mirror.db")
+        return config
+
+    def run(self, population_size: int, publish: bool = True, progress_callback=None) -> Dict:
+        """
+        Run the full simulation against the stand-ins.
+
+        Args:
+            population_size: Number of employees
+            publish: Whether to run the SFTP publish step
+            progress_callback: Optional callback receiving the pipeline progress lines
+
+        Returns:
+            Report dictionary with wall time, per-stage timings and throughput
+        """
+        run_dir = os.path.join(self.work_dir, f"run_{population_size}")
+        os.makedirs(run_dir, exist_ok=True)
+
+        employees_path = os.path.join(run_dir, "employees.csv")
+        write_employees_file(employees_path, population_size, seed=self.seed)
+
+        # Seeding appends, so a repeated size or a reused work dir starts from
+        # empty state tables (and an empty mirror of them)
+        state_db_path = os.path.join(run_dir, "state.db")
+        for path in (state_db_path, os.path.join(run_dir, "state_mirror.db")):
+            if os.path.exists(path):
+                os.remove(path)
+
+        # The generator is deterministic: regenerate the IDs instead of holding them
+        employee_id_chunks = (chunk['employee_id'].to_numpy()
+                              for chunk in generate_employee_chunks(population_size, seed=self.seed))
+        seed_counts = seed_state_chunks(state_db_path, employee_id_chunks, self.content_ids, seed=self.seed)
+
+        config = self.build_config(run_dir, state_db_path)
+        requests_before = self.recommender.request_count
+        errors_before = self.recommender.error_count
+
+        start = time.perf_counter()
+        result = core.run_simulation(config, employees_path, publish, progress_callback)
+        wall_seconds = time.perf_counter() - start
+
+        with open(result['metrics_path']) as f:
+            metrics = json.load(f)
+
+        return build_report(population_size, wall_seconds, metrics, result, seed_counts,
+                            self.recommender.request_count - requests_before,
+                            self.recommender.error_count - errors_before)
+
+
+def build_report(population_size: int, wall_seconds: float, metrics: Dict, result: Dict,
+                 seed_counts: Dict, recommender_requests: int, recommender_errors: int) -> Dict:
+    """Summarize one harness run: per-stage seconds and employees/second."""
+    stages = {}
+    for name in REPORT_STAGES:
+        stats = metrics['stages'].get(name)
+        if not stats:
+            continue
+        seconds = stats['total_seconds']
+        stages[name] = {
+            'seconds': seconds,
+            'calls': stats['count'],
+            'employees_per_second': population_size / seconds if seconds > 0 else None,
+        }
+
+    return {
+        'population_size': population_size,
+        'wall_seconds': wall_seconds,
+        'employees_per_second': population_size / wall_seconds if wall_seconds > 0 else None,
+        'completions': result['completion_count'],
+        'published': result['published'],
+        'seeded_rows': seed_counts,
+        'recommender_requests': recommender_requests,
+        'recommender_errors': recommender_errors,
+        'stages': stages,
+        'latencies': metrics['latencies'],
+        'counters': metrics['counters'],
+    }
+
+
+def format_report(report: Dict) -> str:
+    """Render a harness report as a text table."""
+    lines = [
+        f"Population: {report['population_size']:,} employees  |  "
+        f"wall: {report['wall_seconds']:.2f}s  |  "
+        f"{report['employees_per_second']:.1f} employees/s  |  "
+        f"completions: {report['completions']:,}  |  "
+        f"recommender: {report['recommender_requests']:,} requests, {report['recommender_errors']:,} errors",
+        f"{'stage':<32} {'calls':>9} {'seconds':>10} {'employees/s':>14}",
+        "-" * 68,
+    ]
+    for name, stage in report['stages'].items():
+        throughput = stage['employees_per_second']
+        throughput_text = f"{throughput:,.1f}" if throughput is not None else "-"
+        lines.append(f"{name:<32} {stage['calls']:>9,} {stage['seconds']:>10.3f} {throughput_text:>14}")
+
+    for name, latency in report['latencies'].items():
+        lines.append(f"latency {name}: n={latency['count']:,} mean={latency['mean_ms']:.1f}ms "
+                     f"p50<={latency['p50_ms']:.0f}ms p90<={latency['p90_ms']:.0f}ms "
+                     f"p99<={latency['p99_ms']:.0f}ms")
+    return "\n".join(lines)
@@ -0,0 +1,233 @@
+"""
+Local stand-in for the ML Training Recommender API.
+
+Answers POST /public/api/v1/mltr/v3/run with the response shape of
+docs/external_apis/training_recommender/recommender_response.json, with a
+configurable latency distribution and error rate. Batch requests
+({"data": {"ba_ids": [...]}}) get one results entry per ba_id, or HTTP 400
+when the stub imitates an endpoint without batch support.
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+DEFAULT_ENDPOINT = "/public/api/v1/mltr/v3/run"
+
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'lognormal')
+
+
+class RecommenderStub:
+    """
+    Threaded HTTP server that imitates the recommender endpoint.
+
+    Latency (per request, in milliseconds):
+    - 'fixed': always latency_ms
+    - 'uniform': uniform between latency_ms * (1 - latency_spread) and latency_ms * (1 + latency_spread)
+    - 'lognormal': median latency_ms with sigma latency_spread (long right tail, like a real service)
+
+    A share of requests (error_rate) fails with HTTP 500. Recommendations are
+    deterministic per ba_id for a given seed. A batch request costs one latency
+    sample, like a multi-record scoring call; with batch_enabled=False it is
+    rejected with HTTP 400.
+    """
+
+    def __init__(self, content_ids: List[int], latency_ms: float = 0.0,
+                 latency_distribution: str = 'fixed', latency_spread: float = 0.5,
+                 error_rate: float = 0.0, max_recommendations: int = 3,
+                 endpoint: str = DEFAULT_ENDPOINT, batch_enabled: bool = True, seed: int = 42):
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {latency_distribution} "
+                             f"(expected one of {', '.join(LATENCY_DISTRIBUTIONS)})")
+
+        self.content_ids = list(content_ids)
+        self.latency_ms = latency_ms
+        self.latency_distribution = latency_distribution
+        self.latency_spread = latency_spread
+        self.error_rate = error_rate
+        self.max_recommendations = max_recommendations
+        self.endpoint = endpoint
+        self.batch_enabled = batch_enabled
+        self.seed = seed
+
+        self.request_count = 0
+        self.batch_request_count = 0
+        self.error_count = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        """Base URL to use as API_BASE_URL (server must be started)."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        Start serving in a background thread.
+
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 = any free port)
+
+        Returns:
+            Base URL of the stub
+        """
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                stub._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="recommender-stub",
+                                        daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self) -> None:
+        """Stop the server."""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    # -------------------------------------------------------------------------
+    # Request handling
+    # -------------------------------------------------------------------------
+
+    def _sample_latency(self) -> tuple:
+        with self._lock:
+            if self.latency_distribution == 'fixed':
+                latency_ms = self.latency_ms
+            elif self.latency_distribution == 'uniform':
+                low = self.latency_ms * (1 - self.latency_spread)
+                high = self.latency_ms * (1 + self.latency_spread)
+                latency_ms = self._rng.uniform(max(low, 0.0), high)
+            else:
+                latency_ms = self._rng.lognormvariate(0.0, self.latency_spread) * self.latency_ms
+            failed = self._rng.random() < self.error_rate
+        return latency_ms / 1000.0, failed
+
+    def _handle(self, request: BaseHTTPRequestHandler) -> None:
+        if request.path != self.endpoint:
+            self._send(request, 404, {"error": f"Unknown endpoint: {request.path}"})
+            return
+
+        length = int(request.headers.get('Content-Length', 0))
+        try:
+            payload = json.loads(request.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send(request, 400, {"error": "Invalid JSON"})
+            return
+
+        latency, failed = self._sample_latency()
+        if latency > 0:
+            time.sleep(latency)
+
+        with self._lock:
+            self.request_count += 1
+            if failed:
+                self.error_count += 1
+
+        if failed:
+            self._send(request, 500, {"error": "Simulated recommender failure"})
+            return
+
+        ba_ids = self._get_ba_ids(payload)
+        if ba_ids is not None and self.batch_enabled:
+            with self._lock:
+                self.batch_request_count += 1
+            self._send(request, 200, self.build_batch_response(ba_ids, int(latency * 1000)))
+            return
+
+        ba_id = self._get_ba_id(payload)
+        if ba_id is None:
+            self._send(request, 400, {"error": "Missing data.ba_id"})
+            return
+
+        self._send(request, 200, self.build_response(ba_id, int(latency * 1000)))
+
+    @staticmethod
+    def _get_ba_id(payload) -> Optional[int]:
+        data = payload.get("data") if isinstance(payload, dict) else None
+        if not isinstance(data, dict) or "ba_id" not in data:
+            return None
+        try:
+            return int(data["ba_id"])
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _get_ba_ids(payload) -> Optional[List[int]]:
+        data = payload.get("data") if isinstance(payload, dict) else None
+        if not isinstance(data, dict) or not isinstance(data.get("ba_ids"), list):
+            return None
+        try:
+            return [int(ba_id) for ba_id in data["ba_ids"]]
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _send(request: BaseHTTPRequestHandler, status: int, body: dict) -> None:
+        data = json.dumps(body).encode('utf-8')
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
+
+    def build_recommendations(self, ba_id: int) -> List[dict]:
+        """Deterministic ml_recommendations list for an employee."""
+        rng = random.Random(self.seed * 1_000_003 + ba_id)
+        count = rng.randint(0, min(self.max_recommendations, len(self.content_ids)))
+
+        recommendations = []
+        for order, content_id in enumerate(rng.sample(self.content_ids, count), start=1):
+            recommendations.append({
+                "ba_id": ba_id,
+                "course_id": 38765,
+                "course_name": "Sell.",
+                "recommended_content_id": content_id,
+                "recommended_content": f"Training Content {content_id}",
+                "content_desc": "Synthetic recommendation from the load harness stub.",
+                "content_name_french": "No french content name",
+                "content_description_french": "No french training description",
+                "recommended_content_url": f"https://link.zunos.com/mobile/link/media/sephora?mediaid={content_id}",
+                "is_recommended_content_completed": False,
+                "order": order,
+            })
+        return recommendations
+
+    def build_response(self, ba_id: int, execution_ms: int = 0) -> dict:
+        """Full response body for one employee."""
+        return {
+            "response": {
+                "ml_recommendations": self.build_recommendations(ba_id),
+                "coaching_note": {"en": "Synthetic coaching note.", "fr": "Note de coaching synthétique."},
+            },
+            "timing": {"preProcessing": 0, "wait": 0, "execution": execution_ms,
+                       "functionInternal": execution_ms},
+            "apiContext": {"serviceId": "mltr", "endpointId": "v3", "serviceGeneration": "stub"},
+        }
+
+    def build_batch_response(self, ba_ids: List[int], execution_ms: int = 0) -> dict:
+        """Full response body for a batch request: one results entry per ba_id."""
+        return {
+            "response": {
+                "results": [{"ba_id": ba_id, "ml_recommendations": self.build_recommendations(ba_id)}
+                            for ba_id in ba_ids],
+            },
+            "timing": {"preProcessing": 0, "wait": 0, "execution": execution_ms,
+                       "functionInternal": execution_ms},
+            "apiContext": {"serviceId": "mltr", "endpointId": "v3", "serviceGeneration": "stub"},
+        }
@@ -0,0 +1,346 @@
+"""
+Local paramiko SFTP server for the load harness.
+
+Serves a local directory over SFTP with password authentication, so
+download_most_recent_file_from_sftp() and publish_files_to_sftp_outbound()
+can run unchanged against it. Also writes fake CourseCatalog and
+StandAloneContent files in the vendor naming convention.
+
+drop_connections() makes the server cut sessions mid-transfer, to exercise
+the resumable transfers of simulation_sftp.py.
+"""
+
+import logging
+import os
+import random
+import socket
+import threading
+from datetime import date, datetime
+from typing import List, Tuple
+
+import paramiko
+
+SERVER_LOG_CHANNEL = "load_harness.sftp_stub.transport"
+logging.getLogger(SERVER_LOG_CHANNEL).setLevel(logging.CRITICAL)
+
+# Columns of the fake inbound files
+COURSE_CATALOG_COLUMNS = ["CourseId", "CourseName", "TrainingElementId", "TrainingElementName",
+                          "TrainingElementType"]
+STANDALONE_CONTENT_COLUMNS = ["ContentId", "ContentName", "ContentType", "Daily_Dose_BA", "CreateDate"]
+
+
+class _FaultInjector:
+    """Which sessions to cut: the next `remaining` ones reaching `after_bytes` transferred."""
+
+    def __init__(self):
+        self.after_bytes = 0
+        self.remaining = 0
+        self._lock = threading.Lock()
+
+    def should_drop(self, transferred: int) -> bool:
+        with self._lock:
+            if self.remaining > 0 and transferred >= self.after_bytes:
+                self.remaining -= 1
+                return True
+            return False
+
+
+class _StubServerInterface(paramiko.ServerInterface):
+    def __init__(self, username: str, password: str, transport: paramiko.Transport):
+        self.username = username
+        self.password = password
+        self.transport = transport
+
+    def check_auth_password(self, username, password):
+        if username == self.username and password == self.password:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+
+class _StubSFTPHandle(paramiko.SFTPHandle):
+    session = None
+
+    def read(self, offset, length):
+        data = super().read(offset, length)
+        if isinstance(data, bytes):
+            self.session.transferred(len(data))
+        return data
+
+    def write(self, offset, data):
+        result = super().write(offset, data)
+        self.session.transferred(len(data))
+        return result
+
+    def stat(self):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, attr):
+        try:
+            paramiko.SFTPServer.set_file_attr(self.filename, attr)
+            return paramiko.SFTP_OK
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+
+class _StubSFTPInterface(paramiko.SFTPServerInterface):
+    """Maps SFTP paths onto a local root directory."""
+
+    def __init__(self, server, *args, root: str, faults: _FaultInjector, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.root = root
+        self.transport = server.transport
+        self.faults = faults
+        self.bytes_transferred = 0
+        self.dropped = False
+
+    def transferred(self, count: int) -> None:
+        """Count file bytes read or written, cutting the session if a fault is due."""
+        self.bytes_transferred += count
+        if not self.dropped and self.faults.should_drop(self.bytes_transferred):
+            self.dropped = True
+            self.transport.close()
+
+    def _realpath(self, path):
+        return self.root + self.canonicalize(path)
+
+    def list_folder(self, path):
+        path = self._realpath(path)
+        try:
+            entries = []
+            for filename in os.listdir(path):
+                attr = paramiko.SFTPAttributes.from_stat(os.stat(os.path.join(path, filename)))
+                attr.filename = filename
+                entries.append(attr)
+            return entries
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(self._realpath(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def lstat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.lstat(self._realpath(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def open(self, path, flags, attr):
+        path = self._realpath(path)
+        try:
+            flags |= getattr(os, 'O_BINARY', 0)
+            mode = getattr(attr, 'st_mode', None)
+            fd = os.open(path, flags, mode if mode is not None else 0o666)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+        if (flags & os.O_CREAT) and attr is not None:
+            attr._flags &= ~attr.FLAG_PERMISSIONS
+            paramiko.SFTPServer.set_file_attr(path, attr)
+
+        if flags & os.O_WRONLY:
+            mode_str = 'ab' if flags & os.O_APPEND else 'wb'
+        elif flags & os.O_RDWR:
+            mode_str = 'a+b' if flags & os.O_APPEND else 'r+b'
+        else:
+            mode_str = 'rb'
+
+        try:
+            file_obj = os.fdopen(fd, mode_str)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+        handle = _StubSFTPHandle(flags)
+        handle.session = self
+        handle.filename = path
+        handle.readfile = file_obj
+        handle.writefile = file_obj
+        return handle
+
+    def remove(self, path):
+        try:
+            os.remove(self._realpath(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def rename(self, oldpath, newpath):
+        try:
+            os.rename(self._realpath(oldpath), self._realpath(newpath))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def posix_rename(self, oldpath, newpath):
+        try:
+            os.replace(self._realpath(oldpath), self._realpath(newpath))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def mkdir(self, path, attr):
+        try:
+            os.mkdir(self._realpath(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def rmdir(self, path):
+        try:
+            os.rmdir(self._realpath(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def chattr(self, path, attr):
+        try:
+            paramiko.SFTPServer.set_file_attr(self._realpath(path), attr)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+
+class SFTPStubServer:
+    """
+    Password-authenticated SFTP server rooted at a local directory.
+
+    Remote path "/inbound/x.csv" maps to "<root>/inbound/x.csv".
+    """
+
+    def __init__(self, root: str, username: str = "harness", password: str = "harness"):
+        self.root = os.path.abspath(root)
+        self.username = username
+        self.password = password
+        self.host_key = paramiko.RSAKey.generate(2048)
+
+        self._socket = None
+        self._thread = None
+        self._transports = []
+        self._stopping = threading.Event()
+        self._faults = _FaultInjector()
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        """(host, port) the server is listening on (server must be started)."""
+        return self._socket.getsockname()[:2]
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> Tuple[str, int]:
+        """
+        Start accepting connections in a background thread.
+
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 = any free port)
+
+        Returns:
+            (host, port) the server is listening on
+        """
+        os.makedirs(self.root, exist_ok=True)
+
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((host, port))
+        self._socket.listen(16)
+
+        self._thread = threading.Thread(target=self._accept_loop, name="sftp-stub", daemon=True)
+        self._thread.start()
+        return self.address
+
+    def drop_connections(self, after_bytes: int, count: int = 1) -> None:
+        """
+        Cut the next `count` sessions once they have read or written
+        `after_bytes` bytes of file data (0 to stop dropping).
+        """
+        self._faults.after_bytes = after_bytes
+        self._faults.remaining = count
+
+    def stop(self) -> None:
+        """Stop accepting connections and close open sessions."""
+        self._stopping.set()
+        if self._socket:
+            self._socket.close()
+        for transport in self._transports:
+            transport.close()
+        self._transports = []
+
+    def _accept_loop(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                connection, _ = self._socket.accept()
+            except OSError:
+                break
+
+            transport = paramiko.Transport(connection)
+            # Clients dropping the connection is normal here; keep it out of the report
+            transport.set_log_channel(SERVER_LOG_CHANNEL)
+            transport.add_server_key(self.host_key)
+            transport.set_subsystem_handler("sftp", paramiko.SFTPServer,
+                                            sftp_si=_StubSFTPInterface, root=self.root, faults=self._faults)
+            try:
+                transport.start_server(server=_StubServerInterface(self.username, self.password, transport))
+            except (paramiko.SSHException, EOFError, OSError):
+                transport.close()
+                continue
+
+            self._transports = [t for t in self._transports if t.is_active()] + [transport]
+
+
+def write_fake_inbound_files(directory: str, content_ids: List[int], file_date: date = None,
+                             daily_dose_count: int = 3, seed: int = 42) -> List[str]:
+    """
+    Write a fake CourseCatalog and StandAloneContent file pair.
+
+    Filenames follow the vendor convention
+    (CourseCatalog_V2_YYYY_M_D_1_<rand>.csv, StandAloneContent_v2_YYYY_M_D_1_<rand>.csv).
+
+    Args:
+        directory: Target directory
+        content_ids: Content IDs to include
+        file_date: Date embedded in the filenames (default: today)
+        daily_dose_count: Number of contents flagged Daily_Dose_BA=TRUE
+        seed: Random seed for the filename suffixes
+
+    Returns:
+        [course_catalog_path, standalone_content_path]
+    """
+    import simulation_core as core
+
+    rng = random.Random(seed)
+    file_date = file_date or date.today()
+    date_part = f"{file_date.year}_{file_date.month}_{file_date.day}"
+    os.makedirs(directory, exist_ok=True)
+
+    course_catalog_path = os.path.join(
+        directory, f"CourseCatalog_V2_{date_part}_1_{rng.getrandbits(24):06x}.csv")
+    standalone_content_path = os.path.join(
+        directory, f"StandAloneContent_v2_{date_part}_1_{rng.getrandbits(24):06x}.csv")
+
+    with open(course_catalog_path, 'w') as f:
+        f.write(",".join(f'"{column}"' for column in COURSE_CATALOG_COLUMNS) + "\n")
+        for index, content_id in enumerate(content_ids):
+            course_id = 30000 + index // 5
+            f.write(f'"{course_id}","Course {course_id}","{core.format_content_id(content_id)}",'
+                    f'"Training Content {content_id}","Media"\n')
+
+    create_date = datetime.combine(file_date, datetime.min.time()).isoformat()
+    with open(standalone_content_path, 'w') as f:
+        f.write(",".join(f'"{column}"' for column in STANDALONE_CONTENT_COLUMNS) + "\n")
+        for index, content_id in enumerate(content_ids):
+            daily_dose = "TRUE" if index < daily_dose_count else "FALSE"
+            f.write(f'"{core.format_content_id(content_id)}","Training Content {content_id}",'
+                    f'"Media","{daily_dose}","{create_date}"\n')
+
+    return [course_catalog_path, standalone_content_path]
@@ -0,0 +1,155 @@
+"""
+SQLite stand-in for the Databricks state tables.
+
+Creates content_assignments and content_completion with the columns from
+docs/state/*.md. Point the simulator at it with DATABRICKS_SQLITE_PATH (see
+simulation_core.connect_databricks).
+"""
+
+import sqlite3
+from datetime import date, datetime, timedelta
+from itertools import repeat
+from typing import Iterable, List
+
+STATE_TABLES_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS content_assignments (
+        ba_id INTEGER,
+        content_id INTEGER,
+        assignment_date TEXT,
+        update_date TEXT,
+        assignment_begin_date TEXT,
+        assignment_due_date TEXT,
+        content_type TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS content_completion (
+        ba_id INTEGER,
+        content_id INTEGER,
+        completion_date TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_assignments_ba_content ON content_assignments (ba_id, content_id)",
+    "CREATE INDEX IF NOT EXISTS idx_completion_ba_content ON content_completion (ba_id, content_id)",
+    "CREATE INDEX IF NOT EXISTS idx_completion_ba_date ON content_completion (ba_id, completion_date)",
+]
+
+
+def create_state_database(path: str) -> None:
+    """
+    Create the state tables (if missing) in a SQLite database.
+
+    Args:
+        path: SQLite database file path
+    """
+    connection = sqlite3.connect(path)
+    try:
+        for statement in STATE_TABLES_DDL:
+            connection.execute(statement)
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def seed_state_database(path: str, employee_ids: List[int], content_ids: List[int],
+                        assignments_per_employee: int = 2, completion_rate: float = 0.3,
+                        today: date = None, seed: int = 42) -> dict:
+    """
+    Fill the state tables with synthetic assignments and completions.
+
+    Each employee gets assignments_per_employee assignments from the current
+    week; a completion_rate share of them also get a completion row dated in
+    the last 13 days, so both the open-assignments anti-join and the
+    recent-completion lookup have work to do.
+
+    Args:
+        path: SQLite database file path (tables are created if missing)
+        employee_ids: Employee IDs (ba_id) to seed
+        content_ids: Content IDs to draw assignments from
+        assignments_per_employee: Assignments per employee
+        completion_rate: Share of assignments that are completed
+        today: Reference date (default: today)
+        seed: Random seed
+
+    Returns:
+        Dictionary with assignments and completions row counts
+    """
+    return seed_state_chunks(path, [employee_ids], content_ids, assignments_per_employee,
+                             completion_rate, today, seed)
+
+
+def seed_state_chunks(path: str, employee_id_chunks: Iterable, content_ids: List[int],
+                      assignments_per_employee: int = 2, completion_rate: float = 0.3,
+                      today: date = None, seed: int = 42, progress_callback=None) -> dict:
+    """
+    Seed the state tables for a population streamed in chunks.
+
+    Same rows as seed_state_database(), generated with NumPy one chunk at a
+    time, so populations of tens of millions (see
+    simulation_synthetic.generate_employee_chunks) seed in constant memory.
+    Each employee is assigned consecutive catalog entries from a random start,
+    so an employee never gets the same content twice.
+
+    Args:
+        path: SQLite database file path (tables are created if missing)
+        employee_id_chunks: Iterable of employee ID arrays (ba_id)
+        content_ids: Content IDs to draw assignments from
+        assignments_per_employee: Assignments per employee
+        completion_rate: Share of assignments that are completed
+        today: Reference date (default: today)
+        seed: Random seed
+        progress_callback: Optional callback function for progress updates
+
+    Returns:
+        Dictionary with assignments and completions row counts
+    """
+    import numpy as np
+
+    create_state_database(path)
+
+    rng = np.random.default_rng(seed)
+    catalog = np.asarray(content_ids, dtype=np.int64)
+    per_employee = min(assignments_per_employee, len(catalog))
+    today = today or date.today()
+    week_start = datetime.combine(today - timedelta(days=today.weekday()), datetime.min.time())
+    assignment_date = week_start.replace(hour=1, minute=15).isoformat()
+    due_date = (week_start + timedelta(days=7)).replace(hour=1, minute=3).isoformat()
+    completion_dates = np.array([(today - timedelta(days=days)).isoformat() for days in range(13)],
+                                dtype=object)
+
+    assignment_count = 0
+    completion_count = 0
+
+    connection = sqlite3.connect(path)
+    try:
+        for employee_ids in employee_id_chunks:
+            employee_ids = np.asarray(employee_ids, dtype=np.int64)
+            if not len(employee_ids) or not per_employee:
+                continue
+
+            starts = rng.integers(0, len(catalog), len(employee_ids))
+            positions = (starts[:, None] + np.arange(per_employee)) % len(catalog)
+            ba_ids = np.repeat(employee_ids, per_employee)
+            assigned = catalog[positions.ravel()]
+            completed = rng.random(len(ba_ids)) < completion_rate
+            dates = completion_dates[rng.integers(0, len(completion_dates), int(completed.sum()))]
+
+            connection.executemany(
+                "INSERT INTO content_assignments VALUES (?, ?, ?, ?, ?, ?, ?)",
+                zip(ba_ids.tolist(), assigned.tolist(), repeat(assignment_date), repeat(today.isoformat()),
+                    repeat(assignment_date), repeat(due_date), repeat("Media")))
+            connection.executemany(
+                "INSERT INTO content_completion VALUES (?, ?, ?)",
+                zip(ba_ids[completed].tolist(), assigned[completed].tolist(), dates.tolist()))
+            connection.commit()
+
+            assignment_count += len(ba_ids)
+            completion_count += len(dates)
+            if progress_callback:
+                progress_callback(f"Seeded {assignment_count:,} assignment(s), "
+                                  f"{completion_count:,} completion(s)")
+    finally:
+        connection.close()
+
+    return {'assignments': assignment_count, 'completions': completion_count}
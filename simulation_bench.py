@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+BTC Fake - Micro-Benchmarks for the Core Transforms
+
+Times the pure data transforms in simulation_core.py on synthetic populations
+and records their peak memory, then compares the results with a stored
+baseline. A function that is slower (or uses more memory) than the baseline
+by more than the tolerance fails the run with exit code 1.
+
+Everything runs offline: inputs are generated in memory or in a temporary
+directory, and Databricks / SFTP / the recommender are never contacted.
+
+Usage:
+    python -m simulation_bench                                  # 1k and 10k, compare to baseline
+    python -m simulation_bench --sizes 1000 10000 100000 1000000
+    python -m simulation_bench --update-baseline                # record a new baseline
+    python -m simulation_bench --only process_employee --repeat 5
+
+Timings are machine-dependent: record the baseline on the machine (or CI
+runner) that will run the comparison.
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import simulation_core as core
+import simulation_population as population
+from simulation_records import TrainingItem
+
+DEFAULT_SIZES = [1000, 10000]
+DEFAULT_BASELINE_PATH = os.path.join("benchmarks", "baseline.json")
+
+# Synthetic population shape
+EMPLOYEE_TYPE_WEIGHTS = {'a': 0.4, 'b': 0.4, 'f': 0.2}
+COMMENT_ROW_RATE = 0.01
+OPEN_ASSIGNMENTS_PER_EMPLOYEE = 2
+MAX_AI_RECOMMENDATIONS = 3
+
+ALL_CONTENT = core.DAILY_DOSE_CONTENT + core.NON_DAILY_DOSE_CONTENT
+
+
+# ==============================================================================
+# Synthetic Inputs
+# ==============================================================================
+
+def generate_employee_ids(size: int, rng: random.Random) -> List[int]:
+    """Generate unique employee IDs in the range used by real ba_ids."""
+    return rng.sample(range(100_000, 100_000 + size * 20), size)
+
+
+def generate_employees_csv(path: str, employee_ids: List[int], rng: random.Random) -> None:
+    """Write an employees CSV with a small share of comment rows."""
+    types = list(EMPLOYEE_TYPE_WEIGHTS)
+    weights = list(EMPLOYEE_TYPE_WEIGHTS.values())
+
+    with open(path, 'w') as f:
+        f.write("employee_id,employee_edu_type\n")
+        for employee_id in employee_ids:
+            if rng.random() < COMMENT_ROW_RATE:
+                f.write(f"# comment {employee_id},a\n")
+            f.write(f"{employee_id},{rng.choices(types, weights)[0]}\n")
+
+
+def generate_open_assignments_df(employee_ids: List[int], rng: random.Random):
+    """Build a DataFrame shaped like get_open_assignments_from_databricks() output."""
+    import pandas as pd
+
+    assignment_date = datetime(2025, 11, 3, 1, 15)
+    rows = []
+    for employee_id in employee_ids:
+        for _ in range(OPEN_ASSIGNMENTS_PER_EMPLOYEE):
+            content = rng.choice(ALL_CONTENT)
+            rows.append((employee_id, int(content['id']), assignment_date, assignment_date,
+                         assignment_date + timedelta(days=7), "Media"))
+
+    return pd.DataFrame(rows, columns=['ba_id', 'content_id', 'assignment_date', 'assignment_begin_date',
+                                       'assignment_due_date', 'content_type'])
+
+
+def generate_training_lists(employee_ids: List[int], rng: random.Random) -> Dict[int, tuple]:
+    """Build (manager_assignments, ai_recommendations) per employee for process_employee()."""
+    training = {}
+    for employee_id in employee_ids:
+        manager_assignments = [
+            TrainingItem(int(content['id']), content['name'], "manager")
+            for content in rng.sample(ALL_CONTENT, 3)
+        ]
+        ai_recommendations = [
+            TrainingItem(int(content['id']), content['name'], "ai")
+            for content in rng.sample(ALL_CONTENT, rng.randint(0, MAX_AI_RECOMMENDATIONS))
+        ]
+        training[employee_id] = (manager_assignments, ai_recommendations)
+    return training
+
+
+def build_offline_config(output_dir: str) -> Dict:
+    """Configuration that keeps every external service disabled."""
+    config = core.load_config()
+    config.update({
+        'output_dir': output_dir,
+        'sftp_local_dir': output_dir,
+        'databricks_host': '',
+        'databricks_http_path': '',
+        'databricks_token': '',
+        'metrics_enabled': False,
+        'profile_enabled': False,
+    })
+    return config
+
+
+# ==============================================================================
+# Benchmark Cases
+# ==============================================================================
+
+class BenchmarkCase:
+    """A function to benchmark: setup() builds inputs once, run(inputs) is timed."""
+
+    def __init__(self, name: str, setup: Callable, run: Callable):
+        self.name = name
+        self.setup = setup
+        self.run = run
+
+
+def build_cases(size: int, work_dir: str, seed: int) -> List[BenchmarkCase]:
+    """
+    Build the benchmark cases for one population size.
+
+    Inputs are generated lazily and shared between cases, so the cost of
+    generating them is never included in a measurement.
+    """
+    import pandas as pd
+
+    rng = random.Random(seed)
+    config = build_offline_config(work_dir)
+    shared = {}
+
+    def employee_ids():
+        if 'employee_ids' not in shared:
+            shared['employee_ids'] = generate_employee_ids(size, rng)
+        return shared['employee_ids']
+
+    def employees_csv():
+        if 'employees_csv' not in shared:
+            path = os.path.join(work_dir, f"employees_{size}.csv")
+            generate_employees_csv(path, employee_ids(), rng)
+            shared['employees_csv'] = path
+        return shared['employees_csv']
+
+    def employees_df():
+        if 'employees_df' not in shared:
+            shared['employees_df'], _ = core.load_and_filter_employees(employees_csv())
+        return shared['employees_df']
+
+    def assignments():
+        if 'assignments' not in shared:
+            shared['assignments'] = (
+                core.convert_databricks_assignments_to_output_format(
+                    generate_open_assignments_df(employee_ids(), rng))
+                + core.create_manager_assignments(employees_df()))
+        return shared['assignments']
+
+    def completions():
+        if 'completions' not in shared:
+            training = generate_training_lists(employee_ids(), rng)
+            shared['completions'] = run_process_employee((employees_df(), training))
+        return shared['completions']
+
+    def run_process_employee(inputs):
+        # One clock per run, as simulate_completions() does
+        df, training = inputs
+        clock = core.RunClock()
+        standalone_df = pd.DataFrame()
+        results = []
+        for employee in df.itertuples():
+            manager_assignments, ai_recommendations = training[employee.employee_id]
+            results.extend(core.process_employee(
+                config, employee.employee_id, employee.employee_edu_type,
+                manager_assignments, ai_recommendations, standalone_df, clock=clock))
+        return results
+
+    def population_tables():
+        # Same inputs as the process_employee case, as population tables
+        training = generate_training_lists(employee_ids(), rng)
+        return (employees_df(),
+                population.build_training_table({e: m for e, (m, _) in training.items()}),
+                population.build_training_table({e: a for e, (_, a) in training.items()}),
+                population.build_recent_completions_table({}))
+
+    def fresh_assignments_file():
+        # update_non_completed_assignments_file rewrites its input, so each
+        # measurement gets its own copy
+        path = core.write_non_completed_assignments_file(assignments(), work_dir)
+        return path, completions()
+
+    return [
+        BenchmarkCase(
+            'load_and_filter_employees',
+            setup=employees_csv,
+            run=lambda path: core.load_and_filter_employees(path)),
+        BenchmarkCase(
+            'create_manager_assignments',
+            setup=employees_df,
+            run=lambda df: core.create_manager_assignments(df)),
+        BenchmarkCase(
+            'convert_databricks_assignments_to_output_format',
+            setup=lambda: generate_open_assignments_df(employee_ids(), rng),
+            run=lambda df: core.convert_databricks_assignments_to_output_format(df)),
+        BenchmarkCase(
+            'process_employee',
+            setup=lambda: (employees_df(), generate_training_lists(employee_ids(), rng)),
+            run=run_process_employee),
+        BenchmarkCase(
+            'simulate_population_completions',
+            setup=population_tables,
+            run=lambda tables: population.simulate_population_completions(*tables)),
+        BenchmarkCase(
+            'write_non_completed_assignments_file',
+            setup=assignments,
+            run=lambda rows: core.write_non_completed_assignments_file(rows, work_dir)),
+        BenchmarkCase(
+            'write_content_user_completion_file',
+            setup=completions,
+            run=lambda rows: core.write_content_user_completion_file(rows, work_dir)),
+        BenchmarkCase(
+            'update_non_completed_assignments_file',
+            setup=fresh_assignments_file,
+            run=lambda inputs: core.update_non_completed_assignments_file(*inputs)),
+    ]
+
+
+# ==============================================================================
+# Measurement
+# ==============================================================================
+
+def measure_case(case: BenchmarkCase, repeat: int) -> Dict:
+    """
+    Time a case (best of `repeat` runs) and measure its peak memory in a
+    separate run, so tracemalloc overhead does not distort the timings.
+
+    Returns:
+        Dictionary with seconds and peak_bytes
+    """
+    timings = []
+    for _ in range(repeat):
+        inputs = case.setup()
+        gc.collect()
+        start = time.perf_counter()
+        case.run(inputs)
+        timings.append(time.perf_counter() - start)
+
+    inputs = case.setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        case.run(inputs)
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {'seconds': min(timings), 'peak_bytes': peak_bytes}
+
+
+def run_benchmarks(sizes: List[int], repeat: int, only: Optional[List[str]] = None,
+                   seed: int = 42, progress_callback=None) -> Dict:
+    """
+    Run all benchmark cases for each population size.
+
+    Args:
+        sizes: Population sizes (number of employees)
+        repeat: Timed runs per case (the best one is kept)
+        only: Optional list of case names to run
+        seed: Random seed for the synthetic inputs
+        progress_callback: Optional callback function for progress updates
+
+    Returns:
+        {case_name: {str(size): {'seconds', 'peak_bytes'}}}
+    """
+    results = {}
+
+    for size in sizes:
+        with tempfile.TemporaryDirectory(prefix="btc_bench_") as work_dir:
+            for case in build_cases(size, work_dir, seed):
+                if only and case.name not in only:
+                    continue
+
+                measurement = measure_case(case, repeat)
+                results.setdefault(case.name, {})[str(size)] = measurement
+
+                if progress_callback:
+                    progress_callback(f"{case.name:<50} {size:>9,}  "
+                                      f"{measurement['seconds'] * 1000:>10.1f} ms  "
+                                      f"{measurement['peak_bytes'] / 1024 / 1024:>9.1f} MiB")
+
+    return results
+
+
+def compare_to_baseline(results: Dict, baseline: Dict, time_tolerance: float,
+                        memory_tolerance: float, min_time_delta: float = 0.05) -> List[str]:
+    """
+    Compare results with a baseline.
+
+    Args:
+        results: Output of run_benchmarks()
+        baseline: Previously stored results
+        time_tolerance: Allowed slowdown as a fraction (0.25 = 25% slower)
+        memory_tolerance: Allowed peak memory growth as a fraction
+        min_time_delta: Slowdowns smaller than this many seconds are treated as noise
+
+    Returns:
+        List of regression descriptions (empty if none)
+    """
+    regressions = []
+
+    for name, by_size in results.items():
+        for size, measurement in by_size.items():
+            reference = baseline.get(name, {}).get(size)
+            if not reference:
+                continue
+
+            time_limit = reference['seconds'] * (1 + time_tolerance)
+            slowdown = measurement['seconds'] - reference['seconds']
+            if measurement['seconds'] > time_limit and slowdown > min_time_delta:
+                regressions.append(
+                    f"{name} @ {int(size):,}: {measurement['seconds'] * 1000:.1f} ms "
+                    f"> {reference['seconds'] * 1000:.1f} ms baseline (+{time_tolerance:.0%} allowed)")
+
+            memory_limit = reference['peak_bytes'] * (1 + memory_tolerance)
+            if measurement['peak_bytes'] > memory_limit:
+                regressions.append(
+                    f"{name} @ {int(size):,}: {measurement['peak_bytes'] / 1024 / 1024:.1f} MiB peak "
+                    f"> {reference['peak_bytes'] / 1024 / 1024:.1f} MiB baseline (+{memory_tolerance:.0%} allowed)")
+
+    return regressions
+
+
+def load_baseline(path: str) -> Dict:
+    """Load a stored baseline, or an empty one if the file does not exist."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get('results', {})
+
+
+def save_baseline(path: str, results: Dict, baseline: Dict) -> None:
+    """Merge results into the baseline file (sizes not re-run are kept)."""
+    merged = {name: dict(by_size) for name, by_size in baseline.items()}
+    for name, by_size in results.items():
+        merged.setdefault(name, {}).update(by_size)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({
+            'recorded_at': datetime.now().astimezone().isoformat(),
+            'python': sys.version.split()[0],
+            'results': merged,
+        }, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+# ==============================================================================
+# Command Line
+# ==============================================================================
+
+def main(argv=None) -> int:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(
+        prog="python -m simulation_bench",
+        description="Benchmark the simulation_core transforms and gate on regressions")
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES,
+                        help="Population sizes (default: 1000 10000)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case (best is kept)")
+    parser.add_argument("--only", nargs="+", help="Run only these cases")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for synthetic inputs")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Store these results as the new baseline instead of comparing")
+    parser.add_argument("--time-tolerance", type=float, default=0.5,
+                        help="Allowed slowdown vs baseline (default: 0.5 = 50%%)")
+    parser.add_argument("--memory-tolerance", type=float, default=0.10,
+                        help="Allowed peak memory growth vs baseline (default: 0.10 = 10%%)")
+    parser.add_argument("--min-time-delta", type=float, default=0.05,
+                        help="Ignore slowdowns smaller than this many seconds (default: 0.05)")
+    parser.add_argument("--output", help="Also write these results to a JSON file")
+    args = parser.parse_args(argv)
+
+    print(f"{'function':<50} {'employees':>9}  {'time':>13}  {'peak memory':>13}")
+    print("-" * 90)
+    results = run_benchmarks(args.sizes, args.repeat, args.only, args.seed, print)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    baseline = load_baseline(args.baseline)
+
+    if args.update_baseline:
+        save_baseline(args.baseline, results, baseline)
+        print(f"\nBaseline updated: {args.baseline}")
+        return 0
+
+    if not baseline:
+        print(f"\nNo baseline found at {args.baseline} (run with --update-baseline to create one)")
+        return 0
+
+    regressions = compare_to_baseline(results, baseline, args.time_tolerance, args.memory_tolerance,
+                                      args.min_time_delta)
+    if regressions:
+        print(f"\nFAILED: {len(regressions)} regression(s) against {args.baseline}")
+        for regression in regressions:
+            print(f"  - {regression}")
+        return 1
+
+    print(f"\nOK: no regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
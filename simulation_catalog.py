@@ -0,0 +1,284 @@
+"""
+BTC Fake - CourseCatalog Index
+
+The newest CourseCatalog file is downloaded every run. CourseCatalogIndex
+answers "is this content in the catalog, and what is it called" without
+loading the CSV into pandas:
+
+    index = CourseCatalogIndex.open(course_catalog_path)
+    known = index.contains(content_ids)          # vectorized, boolean array
+    entry = index.get(1915085)                   # CatalogEntry or None
+
+The index is a file next to the catalog (<catalog>.idx): a small header
+followed by (content_id, byte offset, byte length) records sorted by content
+ID, opened with np.memmap. Membership is a binary search over the mapped IDs;
+titles and types are read from the memory-mapped CSV at the recorded offset.
+Only the pages touched are read, so lookups for millions of recommendations
+cost a few MB of resident memory whatever the catalog size.
+
+The header records the catalog's size and modification time; an index that
+no longer matches its catalog is rebuilt on open.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import mmap
+import os
+import struct
+import tempfile
+from typing import TYPE_CHECKING, Iterator, NamedTuple, Optional, Tuple
+
+from simulation_content_ids import parse_content_id
+
+if TYPE_CHECKING:
+    import numpy as np
+
+INDEX_SUFFIX = ".idx"
+
+# magic, catalog size, catalog mtime (ns), record count
+_HEADER = struct.Struct('<8sqqq')
+_MAGIC = b'BTCCIX01'
+
+CONTENT_ID_COLUMN = "TrainingElementId"
+NAME_COLUMN = "TrainingElementName"
+TYPE_COLUMN = "TrainingElementType"
+
+
+class CatalogEntry(NamedTuple):
+    """One TrainingElement of the CourseCatalog (its first row, if listed under several courses)."""
+    content_id: int
+    name: str
+    content_type: str
+    course_id: str
+    course_name: str
+
+
+def _record_dtype():
+    import numpy as np
+
+    return np.dtype([('content_id', '<i8'), ('offset', '<i8'), ('length', '<i4')])
+
+
+def get_index_path(catalog_path: str) -> str:
+    """Return the index file path for a CourseCatalog file."""
+    return catalog_path + INDEX_SUFFIX
+
+
+def _iter_csv_records(data) -> Iterator[Tuple[int, int]]:
+    """
+    Yield (offset, length) of every CSV record after the header line.
+
+    A record ends at a newline outside quotes, so quoted fields may contain
+    line breaks.
+    """
+    size = len(data)
+    position = 0
+    header = True
+    while position < size:
+        start = position
+        in_quotes = False
+        while True:
+            newline = data.find(b'\n', position)
+            end = size if newline < 0 else newline
+            if data[position:end].count(b'"') % 2:
+                in_quotes = not in_quotes
+            position = end + 1
+            if not in_quotes or newline < 0:
+                break
+        length = min(position, size) - start
+        if header:
+            header = False
+        elif data[start:start + length].strip():
+            yield start, length
+
+
+def _parse_record(raw: bytes) -> list:
+    return next(csv.reader(io.StringIO(raw.decode('utf-8-sig'))), [])
+
+
+def build_catalog_index(catalog_path: str, index_path: Optional[str] = None) -> str:
+    """
+    Scan a CourseCatalog CSV once and write its index file.
+
+    Rows whose TrainingElementId is not an integer ID are skipped; a content
+    ID listed under several courses is indexed at its first row.
+
+    Args:
+        catalog_path: CourseCatalog CSV file
+        index_path: Index file (default: <catalog_path>.idx)
+
+    Returns:
+        Path of the index file
+
+    Raises:
+        ValueError: If the file has no TrainingElementId column
+    """
+    import numpy as np
+
+    index_path = index_path or get_index_path(catalog_path)
+    stat = os.stat(catalog_path)
+
+    content_ids, offsets, lengths = [], [], []
+    with open(catalog_path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b''
+        try:
+            header_end = data.find(b'\n')
+            header = _parse_record(data[:header_end if header_end >= 0 else len(data)])
+            if CONTENT_ID_COLUMN not in header:
+                raise ValueError(f"{os.path.basename(catalog_path)} has no {CONTENT_ID_COLUMN} column")
+            id_column = header.index(CONTENT_ID_COLUMN)
+
+            for offset, length in _iter_csv_records(data):
+                row = _parse_record(data[offset:offset + length])
+                try:
+                    content_id = parse_content_id(row[id_column])
+                except (IndexError, ValueError):
+                    continue
+                content_ids.append(content_id)
+                offsets.append(offset)
+                lengths.append(length)
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+    records = np.empty(len(content_ids), dtype=_record_dtype())
+    records['content_id'] = content_ids
+    records['offset'] = offsets
+    records['length'] = lengths
+    # Stable sort keeps the first row of repeated IDs first
+    records = records[np.argsort(records['content_id'], kind='stable')]
+    if len(records) > 1:
+        first = np.ones(len(records), dtype=bool)
+        first[1:] = records['content_id'][1:] != records['content_id'][:-1]
+        records = records[first]
+
+    # Concurrent runs sharing a download (simulation_fanout.py) may build the
+    # same index at once; each writes its own temporary file
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(index_path) + ".",
+                                     dir=os.path.dirname(os.path.abspath(index_path)))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, stat.st_size, stat.st_mtime_ns, len(records)))
+            f.write(records.tobytes())
+        os.replace(temp_path, index_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return index_path
+
+
+def _read_index_header(index_path: str) -> Optional[Tuple[int, int, int]]:
+    """Return (catalog size, catalog mtime ns, record count), or None if not an index file."""
+    try:
+        with open(index_path, 'rb') as f:
+            header = f.read(_HEADER.size)
+    except OSError:
+        return None
+    if len(header) < _HEADER.size:
+        return None
+    magic, catalog_size, catalog_mtime_ns, count = _HEADER.unpack(header)
+    if magic != _MAGIC:
+        return None
+    return catalog_size, catalog_mtime_ns, count
+
+
+class CourseCatalogIndex:
+    """
+    Read-only lookups of content IDs in a CourseCatalog file through its
+    memory-mapped index. Open with CourseCatalogIndex.open(); close() (or use
+    as a context manager) releases the mappings.
+    """
+
+    def __init__(self, catalog_path: str, index_path: str, count: int):
+        import numpy as np
+
+        self.catalog_path = catalog_path
+        self.index_path = index_path
+        if count:
+            records = np.memmap(index_path, dtype=_record_dtype(), mode='r',
+                                offset=_HEADER.size, shape=(count,))
+        else:
+            records = np.empty(0, dtype=_record_dtype())
+        self._records = records
+        self._content_ids = records['content_id']
+
+        self._file = open(catalog_path, 'rb')
+        self._data = (mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                      if os.path.getsize(catalog_path) else b'')
+        header_end = self._data.find(b'\n')
+        self._columns = _parse_record(self._data[:header_end if header_end >= 0 else len(self._data)])
+
+    @classmethod
+    def open(cls, catalog_path: str, rebuild: bool = False) -> CourseCatalogIndex:
+        """
+        Open the index of a CourseCatalog file, building it if it is missing,
+        stale (catalog changed since) or rebuild is set.
+
+        Raises:
+            ValueError: If the catalog has no TrainingElementId column
+        """
+        index_path = get_index_path(catalog_path)
+        stat = os.stat(catalog_path)
+        header = None if rebuild else _read_index_header(index_path)
+        if header is None or header[:2] != (stat.st_size, stat.st_mtime_ns):
+            build_catalog_index(catalog_path, index_path)
+            header = _read_index_header(index_path)
+        return cls(catalog_path, index_path, header[2])
+
+    def close(self) -> None:
+        """Release the memory mappings."""
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+        self._records = self._content_ids = None
+
+    def __enter__(self) -> CourseCatalogIndex:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._content_ids)
+
+    def __contains__(self, content_id) -> bool:
+        return bool(self.contains([parse_content_id(content_id)])[0])
+
+    def __repr__(self) -> str:
+        return f"CourseCatalogIndex({os.path.basename(self.catalog_path)}, {len(self)} content IDs)"
+
+    def _positions(self, content_ids) -> Tuple[np.ndarray, np.ndarray]:
+        import numpy as np
+
+        content_ids = np.asarray(content_ids, dtype=np.int64)
+        positions = np.searchsorted(self._content_ids, content_ids)
+        found = positions < len(self._content_ids)
+        found[found] = self._content_ids[positions[found]] == content_ids[found]
+        return positions, found
+
+    def contains(self, content_ids) -> np.ndarray:
+        """
+        Vectorized membership test.
+
+        Args:
+            content_ids: Integer content IDs (array-like)
+
+        Returns:
+            Boolean array, True where the content ID is in the catalog
+        """
+        return self._positions(content_ids)[1]
+
+    def get(self, content_id) -> Optional[CatalogEntry]:
+        """Return the catalog entry of a content ID ("1,915,085" or 1915085), or None."""
+        content_id = parse_content_id(content_id)
+        positions, found = self._positions([content_id])
+        if not found[0]:
+            return None
+
+        record = self._records[positions[0]]
+        offset, length = int(record['offset']), int(record['length'])
+        row = dict(zip(self._columns, _parse_record(self._data[offset:offset + length])))
+        return CatalogEntry(content_id, row.get(NAME_COLUMN, ""), row.get(TYPE_COLUMN, ""),
+                            row.get("CourseId", ""), row.get("CourseName", ""))
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+BTC Fake - Command-Line Runner
+Headless entry point for scheduled runs, cron jobs and scripting.
+
+Runs the full pipeline or a single stage using simulation_core.py, without
+loading the Gradio web stack. Third-party packages are only imported by the
+stage that needs them, so `--help` and light stages start quickly.
+
+Usage:
+    python -m simulation_cli run --employees input/employees.csv [--publish] [--zip] [--profile]
+                                 [--writeback] [--run-id RUN_ID] [--now 2025-01-14T09:30]
+                                 [--backend local|spark]
+    python -m simulation_cli cleanup
+    python -m simulation_cli download
+    python -m simulation_cli assign --employees input/employees.csv
+    python -m simulation_cli reco 88563 [88564 ...]
+    python -m simulation_cli probe --employees input/employees.csv [--sample 50] [--requests 100]
+                                   [--max-concurrency 16] [--ids 88563,88564]
+    python -m simulation_cli estimate --employees input/employees.csv [--sample 50]
+    python -m simulation_cli publish FILE [FILE ...]
+    python -m simulation_cli sync-state [--full]
+    python -m simulation_cli timeline --start 2025-01-06 --end 2025-02-02 [--publish] [--zip]
+    python -m simulation_cli fanout --profile dev=.env.dev --profile qa=.env.qa [--publish] [--zip]
+    python -m simulation_cli generate-employees --size 10000000 --output input/employees_10m.csv
+                                                [--mix a=0.4,b=0.4,f=0.2] [--comment-rate 0.001]
+                                                [--seed-state state.db]
+"""
+
+import argparse
+import os
+import sys
+from datetime import date
+
+import simulation_core as core
+
+
+# ==============================================================================
+# Helpers
+# ==============================================================================
+
+def print_progress(msg):
+    """Progress callback that writes to stdout."""
+    print(msg, flush=True)
+
+
+def load_cli_config(args) -> dict:
+    """
+    Load environment variables (optionally from a specific .env file) and build
+    the configuration, applying command-line overrides.
+
+    Args:
+        args: Parsed command-line arguments
+
+    Returns:
+        Configuration dictionary
+    """
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        load_dotenv = None
+
+    if args.env_file:
+        if load_dotenv is None:
+            raise RuntimeError("python-dotenv is required for --env-file")
+        if not os.path.exists(args.env_file):
+            raise RuntimeError(f"Environment file not found: {args.env_file}")
+        load_dotenv(args.env_file, override=True)
+    elif load_dotenv is not None:
+        load_dotenv()
+
+    config = core.load_config()
+
+    if args.output_dir:
+        config['output_dir'] = args.output_dir
+        config['sftp_local_dir'] = args.output_dir
+
+    return config
+
+
+# ==============================================================================
+# Commands
+# ==============================================================================
+
+def cmd_run(args, config) -> int:
+    """Run the complete simulation pipeline."""
+    employees_file = args.employees or config['employees_file']
+
+    if args.profile:
+        config['profile_enabled'] = True
+    if args.writeback:
+        config['state_writeback_enabled'] = True
+    if args.run_id:
+        config['run_id'] = args.run_id
+    if args.now:
+        config['run_clock_now'] = args.now
+    if args.backend:
+        config['execution_backend'] = args.backend
+
+    print_progress("=" * 80)
+    print_progress("BTC FAKE - TRAINING COMPLETION SIMULATOR")
+    print_progress("=" * 80)
+    print_progress("")
+
+    result = core.run_simulation(config, employees_file, args.publish, print_progress)
+
+    if args.zip:
+        print_progress("Creating download package...")
+        zip_files = core.get_run_files(result) + core.get_run_artifacts(result)
+        core.create_download_zip(config, zip_files, progress_callback=print_progress)
+        print_progress("")
+
+    print_progress("=" * 80)
+    print_progress("SIMULATION COMPLETE")
+    print_progress("=" * 80)
+
+    if result['published'] is False:
+        return 1
+    return 0
+
+
+def cmd_timeline(args, config) -> int:
+    """Simulate a range of days in one process."""
+    from simulation_timeline import run_timeline_simulation
+
+    employees_file = args.employees or config['employees_file']
+
+    result = run_timeline_simulation(
+        config, employees_file, args.start, args.end, args.publish,
+        recommendation_refresh=args.recommendations, progress_callback=print_progress)
+
+    if args.zip:
+        print_progress("Creating download package...")
+        zip_files = result['files'] + core.get_run_artifacts(result)
+        core.create_download_zip(config, zip_files, progress_callback=print_progress)
+
+    if result['published'] is False:
+        return 1
+    return 0
+
+
+def cmd_fanout(args, config) -> int:
+    """Run the pipeline for several environment profiles, sharing downloads and recommendations."""
+    from simulation_fanout import parse_profile_spec, run_fanout_simulation
+
+    employees_file = args.employees or config['employees_file']
+    profiles = [parse_profile_spec(spec) for spec in args.profile]
+
+    result = run_fanout_simulation(
+        config, profiles, employees_file, args.publish, args.zip,
+        max_workers=args.workers, progress_callback=print_progress)
+
+    if result['errors'] or result['published'] is False:
+        return 1
+    return 0
+
+
+def cmd_cleanup(args, config) -> int:
+    """Remove files left by previous runs."""
+    core.cleanup_output_directory(config, print_progress)
+    return 0
+
+
+def cmd_download(args, config) -> int:
+    """Download the most recent inbound catalog files."""
+    course_catalog_path, standalone_content_path = core.download_inbound_files(config, print_progress)
+
+    if not course_catalog_path or not standalone_content_path:
+        print_progress("Error: Failed to download required files")
+        return 1
+    return 0
+
+
+def cmd_assign(args, config) -> int:
+    """Create manager assignments and write the NonCompletedAssignments file."""
+    employees_file = args.employees or config['employees_file']
+
+    employees_df, _ = core.load_and_filter_employees(employees_file, print_progress)
+    core.build_assignments(config, employees_df, print_progress)
+    return 0
+
+
+def cmd_reco(args, config) -> int:
+    """Call the ML Training Recommender API for one or more employees."""
+    failures = 0
+
+    for employee_id in args.employee_ids:
+        recommendations = core.get_training_recommendations(config, employee_id, print_progress)
+        if not recommendations:
+            failures += 1
+
+    return 1 if failures == len(args.employee_ids) else 0
+
+
+def cmd_probe(args, config) -> int:
+    """Measure recommender latency and throughput at increasing concurrency."""
+    if args.ids:
+        employee_ids = core.parse_employee_id_list(args.ids)
+    else:
+        employee_ids = core.sample_probe_employee_ids(args.employees or config['employees_file'],
+                                                      args.sample, args.seed)
+
+    report = core.probe_recommender(config, employee_ids, args.requests, args.max_concurrency, print_progress)
+    print_progress("")
+    print_progress(core.format_probe_report(report))
+    return 0
+
+
+def cmd_estimate(args, config) -> int:
+    """Estimate a full run from a sampled dry run (nothing is published or written back)."""
+    estimate = core.estimate_run(config, args.employees or config['employees_file'],
+                                 args.sample, args.seed, print_progress)
+    print_progress("")
+    print_progress(core.format_run_estimate(estimate))
+    return 0
+
+
+def cmd_publish(args, config) -> int:
+    """Publish existing files to the SFTP outbound server."""
+    publish_config = config.copy()
+    publish_config['sftp_publish_enabled'] = True
+
+    success = core.publish_files_to_sftp_outbound(publish_config, args.files, print_progress)
+    return 0 if success else 1
+
+
+def cmd_sync_state(args, config) -> int:
+    """Sync the local state mirror (STATE_STORE_PATH) from Databricks."""
+    if not config['state_store_path']:
+        print_progress("Error: STATE_STORE_PATH is not set")
+        return 1
+
+    from simulation_state import sync_state_store
+
+    sync_config = config.copy()
+    sync_config['state_store_sync_enabled'] = True
+    sync_state_store(sync_config, args.full, print_progress)
+    return 0
+
+
+def cmd_generate_employees(args, config) -> int:
+    """Write a synthetic employees file and optionally seed matching state-table rows."""
+    from simulation_synthetic import generate_employee_chunks, parse_type_mix, write_employees_file
+
+    type_mix = parse_type_mix(args.mix) if args.mix else None
+    population = dict(size=args.size, type_mix=type_mix, id_start=args.id_start, id_end=args.id_end,
+                      chunk_size=args.chunk_size, seed=args.seed)
+
+    write_employees_file(args.output, comment_rate=args.comment_rate,
+                         progress_callback=print_progress, **population)
+
+    if args.seed_state:
+        from load_harness.harness import build_content_ids
+        from load_harness.sql_standin import seed_state_chunks
+
+        employee_id_chunks = (chunk['employee_id'].to_numpy()
+                              for chunk in generate_employee_chunks(**population))
+        counts = seed_state_chunks(args.seed_state, employee_id_chunks, build_content_ids(args.catalog_size),
+                                   args.assignments_per_employee, args.completion_rate, seed=args.seed,
+                                   progress_callback=print_progress)
+        print_progress(f"Seeded {args.seed_state}: {counts['assignments']:,} content_assignments row(s), "
+                       f"{counts['completions']:,} content_completion row(s)")
+    return 0
+
+
+# ==============================================================================
+# Argument Parsing
+# ==============================================================================
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command-line argument parser."""
+    parser = argparse.ArgumentParser(
+        prog="python -m simulation_cli",
+        description="BTC Fake - Training Completion Simulator (headless runner)")
+    parser.add_argument("--env-file", help="Load environment variables from this file (default: .env)")
+    parser.add_argument("--output-dir", help="Override OUTPUT_DIR and SFTP_LOCAL_DIR")
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the complete simulation pipeline")
+    run_parser.add_argument("--employees", help="Employees CSV file (default: EMPLOYEES_FILE)")
+    run_parser.add_argument("--publish", action="store_true", help="Publish files to SFTP outbound")
+    run_parser.add_argument("--zip", action="store_true", help="Package run files into generated_files.zip")
+    run_parser.add_argument("--profile", action="store_true",
+                            help="Profile the run (pstats, collapsed stacks, memory report)")
+    run_parser.add_argument("--writeback", action="store_true",
+                            help="Write completions and new assignments back to the state tables")
+    run_parser.add_argument("--run-id", help="Run ID for the write-back (reuse it when retrying a run)")
+    run_parser.add_argument("--now", help="Freeze the run clock at this ISO-8601 time, PT if naive "
+                                          "(overrides RUN_CLOCK_NOW)")
+    run_parser.add_argument("--backend", choices=["local", "spark"],
+                            help="Execution backend (overrides EXECUTION_BACKEND)")
+    run_parser.set_defaults(func=cmd_run)
+
+    timeline_parser = subparsers.add_parser("timeline", help="Simulate a range of days in one process")
+    timeline_parser.add_argument("--start", type=date.fromisoformat, required=True,
+                                 help="First simulated day (YYYY-MM-DD)")
+    timeline_parser.add_argument("--end", type=date.fromisoformat, required=True,
+                                 help="Last simulated day (YYYY-MM-DD)")
+    timeline_parser.add_argument("--employees", help="Employees CSV file (default: EMPLOYEES_FILE)")
+    timeline_parser.add_argument("--recommendations", choices=["once", "daily"], default="once",
+                                 help="Fetch recommendations once per employee or every day")
+    timeline_parser.add_argument("--publish", action="store_true", help="Publish all files to SFTP outbound")
+    timeline_parser.add_argument("--zip", action="store_true", help="Package run files into generated_files.zip")
+    timeline_parser.set_defaults(func=cmd_timeline)
+
+    fanout_parser = subparsers.add_parser(
+        "fanout", help="Run several environments at once, sharing downloads and recommendations")
+    fanout_parser.add_argument("--profile", action="append", required=True, metavar="[NAME=]ENV_FILE",
+                               help="Environment profile (.env file layered over the current environment); "
+                                    "repeat for each environment. NAME defaults to the file suffix "
+                                    "(.env.qa -> qa)")
+    fanout_parser.add_argument("--employees", help="Employees CSV file (default: EMPLOYEES_FILE)")
+    fanout_parser.add_argument("--workers", type=int, default=0,
+                               help="Environments run at the same time (default: 0 = all)")
+    fanout_parser.add_argument("--publish", action="store_true",
+                               help="Publish each environment's files to its own SFTP outbound target")
+    fanout_parser.add_argument("--zip", action="store_true",
+                               help="Package each environment's files into <dir>/generated_files.zip")
+    fanout_parser.set_defaults(func=cmd_fanout)
+
+    cleanup_parser = subparsers.add_parser("cleanup", help="Remove files from previous runs")
+    cleanup_parser.set_defaults(func=cmd_cleanup)
+
+    download_parser = subparsers.add_parser("download", help="Download inbound catalog files from SFTP")
+    download_parser.set_defaults(func=cmd_download)
+
+    assign_parser = subparsers.add_parser("assign", help="Write the NonCompletedAssignments file")
+    assign_parser.add_argument("--employees", help="Employees CSV file (default: EMPLOYEES_FILE)")
+    assign_parser.set_defaults(func=cmd_assign)
+
+    reco_parser = subparsers.add_parser("reco", help="Call the ML Training Recommender API")
+    reco_parser.add_argument("employee_ids", nargs="+", type=int, help="Employee IDs (ba_id)")
+    reco_parser.set_defaults(func=cmd_reco)
+
+    probe_parser = subparsers.add_parser("probe", help="Measure recommender latency and throughput")
+    probe_parser.add_argument("--employees", help="Employees CSV file to sample IDs from (default: EMPLOYEES_FILE)")
+    probe_parser.add_argument("--ids", help="Employee IDs to use instead (comma-separated)")
+    probe_parser.add_argument("--sample", type=int, default=50, help="IDs sampled from the employees file")
+    probe_parser.add_argument("--requests", type=int, default=100, help="Requests per concurrency level")
+    probe_parser.add_argument("--max-concurrency", type=int, default=16, help="Highest concurrency level")
+    probe_parser.add_argument("--seed", type=int, help="Seed for sampling IDs")
+    probe_parser.set_defaults(func=cmd_probe)
+
+    estimate_parser = subparsers.add_parser(
+        "estimate", help="Estimate run time, API calls and output sizes from a sampled dry run")
+    estimate_parser.add_argument("--employees", help="Employees CSV file (default: EMPLOYEES_FILE)")
+    estimate_parser.add_argument("--sample", type=int, default=core.ESTIMATE_SAMPLE_SIZE,
+                                 help="Employees sampled for the dry run")
+    estimate_parser.add_argument("--seed", type=int, help="Seed for sampling employees")
+    estimate_parser.set_defaults(func=cmd_estimate)
+
+    publish_parser = subparsers.add_parser("publish", help="Publish files to SFTP outbound")
+    publish_parser.add_argument("files", nargs="+", help="Local files to upload")
+    publish_parser.set_defaults(func=cmd_publish)
+
+    sync_parser = subparsers.add_parser("sync-state", help="Sync the local state mirror from Databricks")
+    sync_parser.add_argument("--full", action="store_true", help="Rebuild the mirror instead of fetching the delta")
+    sync_parser.set_defaults(func=cmd_sync_state)
+
+    generate_parser = subparsers.add_parser("generate-employees",
+                                            help="Write a synthetic employees file (streamed in chunks)")
+    generate_parser.add_argument("--size", type=int, required=True, help="Number of employees")
+    generate_parser.add_argument("--output", required=True, help="Employees CSV file to write")
+    generate_parser.add_argument("--mix", help="Employee type mix, e.g. a=0.4,b=0.4,f=0.2 (default)")
+    generate_parser.add_argument("--id-start", type=int, default=100_000, help="Lowest employee ID")
+    generate_parser.add_argument("--id-end", type=int, help="Highest employee ID (default: 20 IDs per employee)")
+    generate_parser.add_argument("--comment-rate", type=float, default=0.0,
+                                 help="Comment rows per employee row (e.g. 0.001)")
+    generate_parser.add_argument("--chunk-size", type=int, default=100_000, help="Rows generated per chunk")
+    generate_parser.add_argument("--seed", type=int, default=42)
+    generate_parser.add_argument("--seed-state", metavar="SQLITE_PATH",
+                                 help="Also seed content_assignments / content_completion rows for the "
+                                      "population into this SQLite database (DATABRICKS_SQLITE_PATH "
+                                      "or STATE_STORE_PATH)")
+    generate_parser.add_argument("--assignments-per-employee", type=int, default=2)
+    generate_parser.add_argument("--completion-rate", type=float, default=0.3,
+                                 help="Share of seeded assignments that are completed")
+    generate_parser.add_argument("--catalog-size", type=int, default=200,
+                                 help="Content IDs to draw seeded assignments from")
+    generate_parser.set_defaults(func=cmd_generate_employees)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    """Command-line entry point."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        config = load_cli_config(args)
+        return args.func(args, config)
+    except Exception as e:
+        print_progress(f"ERROR: {str(e)}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
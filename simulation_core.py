@@ -2,28 +2,85 @@
 BTC Fake - Training Completion Simulator Core Module
 
 This module contains the shared business logic for simulating training completions.
-It is used by both the Gradio web application (app.py) and the Jupyter notebook (btc_simulation.ipynb).
+It is used by the Gradio web application (app.py), the command-line runner
+(simulation_cli.py) and the Jupyter notebook (btc_simulation.ipynb).
+
+Heavy third-party dependencies (pandas, requests, paramiko, pytz, urllib3) are
+imported inside the functions that need them, so importing this module is cheap.
 """
 
+from __future__ import annotations
+
+import copy
 import os
-import pandas as pd
-import requests
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple
-import urllib3
-import pytz
-import paramiko
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
 import re
 import glob
 import shutil
 import random
+import tempfile
+import uuid
+import warnings
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from simulation_content_ids import format_content_id, format_content_ids, parse_content_id, parse_content_ids
+from simulation_keys import PairKeyIndex
+from simulation_records import AssignmentRecord, CompletionRecord, TrainingItem, parse_recommendations
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+    from simulation_catalog import CourseCatalogIndex
+
+
+# =============================================================================
+# TIMEZONES
+# =============================================================================
+
+_TIMEZONES = {}
+
+
+def get_pt_timezone():
+    """
+    Get the Pacific timezone (America/Los_Angeles), importing pytz on first use.
+
+    Returns:
+        pytz timezone for PT
+    """
+    if 'PT' not in _TIMEZONES:
+        import pytz
+        _TIMEZONES['PT'] = pytz.timezone('America/Los_Angeles')
+    return _TIMEZONES['PT']
 
-# Disable SSL warnings when ignoring certificate verification
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-# Define timezones globally
-PT = pytz.timezone('America/Los_Angeles')
-UTC = pytz.UTC
+def get_utc_timezone():
+    """
+    Get the UTC timezone, importing pytz on first use.
+
+    Returns:
+        pytz UTC timezone
+    """
+    if 'UTC' not in _TIMEZONES:
+        import pytz
+        _TIMEZONES['UTC'] = pytz.UTC
+    return _TIMEZONES['UTC']
+
+
+def __getattr__(name):
+    # Keep core.PT / core.UTC available without importing pytz at module load
+    if name == 'PT':
+        return get_pt_timezone()
+    if name == 'UTC':
+        return get_utc_timezone()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # =============================================================================
@@ -42,6 +99,10 @@ def load_config() -> Dict:
         'api_base_url': os.getenv("API_BASE_URL", "https://dataiku-api-devqa.lower.internal.sephora.com"),
         'api_endpoint': os.getenv("API_ENDPOINT", "/public/api/v1/mltr/v3/run"),
         'api_timeout': int(os.getenv("API_TIMEOUT", "30")),
+        # ba_ids per recommender request (1 = one request per employee)
+        'recommender_batch_size': int(os.getenv("RECOMMENDER_BATCH_SIZE", "1")),
+        # Recommender requests in flight (1 = one at a time)
+        'recommender_concurrency': int(os.getenv("RECOMMENDER_CONCURRENCY", "1")),
 
         # File Paths
         'employees_file': os.getenv("EMPLOYEES_FILE", "input/employees.csv"),
@@ -56,9 +117,20 @@ def load_config() -> Dict:
         'databricks_token': os.getenv("DATABRICKS_TOKEN", ""),
         'databricks_catalog': os.getenv("DATABRICKS_CATALOG", "retail_systems_dev"),
         'databricks_schema': os.getenv("DATABRICKS_SCHEMA", "store_enablement"),
+        # Local SQLite stand-in for the state tables (load testing / offline dev)
+        'databricks_sqlite_path': os.getenv("DATABRICKS_SQLITE_PATH", ""),
+
+        # Local State Store (SQLite mirror of the state tables, see simulation_state.py)
+        'state_store_path': os.getenv("STATE_STORE_PATH", ""),
+        'state_store_sync_enabled': os.getenv("STATE_STORE_SYNC", "true").lower() in ['true', '1', 'yes'],
+
+        # State Write-Back (simulated completions/assignments into the state tables)
+        'state_writeback_enabled': os.getenv("STATE_WRITEBACK_ENABLED", "false").lower() in ['true', '1', 'yes'],
+        'state_writeback_batch_size': int(os.getenv("STATE_WRITEBACK_BATCH_SIZE", "1000")),
 
         # SFTP Inbound Server
         'sftp_inbound_host': os.getenv("SFTP_INBOUND_HOST", "sftp.sephora.com"),
+        'sftp_inbound_port': int(os.getenv("SFTP_INBOUND_PORT", "22")),
         'sftp_inbound_user': os.getenv("SFTP_INBOUND_USER", "SephoraMSL"),
         'sftp_inbound_password': os.getenv("SFTP_INBOUND_PASSWORD", ""),
         'sftp_inbound_remote_path': os.getenv("SFTP_INBOUND_REMOTE_PATH",
@@ -66,14 +138,327 @@ def load_config() -> Dict:
 
         # SFTP Outbound Server (Publishing)
         'sftp_outbound_host': os.getenv("SFTP_OUTBOUND_HOST", "internal-sftp.sephoraus.com"),
+        'sftp_outbound_port': int(os.getenv("SFTP_OUTBOUND_PORT", "22")),
         'sftp_outbound_user': os.getenv("SFTP_OUTBOUND_USER", "SephoraRDIInternal"),
         'sftp_outbound_password': os.getenv("SFTP_OUTBOUND_PASSWORD", ""),
         'sftp_outbound_remote_path': os.getenv("SFTP_OUTBOUND_REMOTE_PATH",
                                               "/inbound/BTC/retailData/prod/vendor/mySephoraLearningV2"),
-        'sftp_publish_enabled': os.getenv("SFTP_PUBLISH_ENABLED", "true").lower() in ['true', '1', 'yes']
+        'sftp_publish_enabled': os.getenv("SFTP_PUBLISH_ENABLED", "true").lower() in ['true', '1', 'yes'],
+
+        # SFTP Transfers (both servers; see simulation_sftp.py)
+        'sftp_transfer_retries': int(os.getenv("SFTP_TRANSFER_RETRIES", "3")),
+        'sftp_retry_delay_seconds': float(os.getenv("SFTP_RETRY_DELAY_SECONDS", "2")),
+        'sftp_verify_checksum': os.getenv("SFTP_VERIFY_CHECKSUM", "true").lower() in ['true', '1', 'yes'],
+        # Parse StandAloneContent while it downloads instead of reading it again afterwards
+        'sftp_stream_parse': os.getenv("SFTP_STREAM_PARSE", "true").lower() in ['true', '1', 'yes'],
+
+        # Sharded Outputs (0 = no limit; both 0 = one file per output)
+        'output_shard_max_rows': int(os.getenv("OUTPUT_SHARD_MAX_ROWS", "0")),
+        'output_shard_max_bytes': int(os.getenv("OUTPUT_SHARD_MAX_BYTES", "0")),
+        'output_shard_workers': int(os.getenv("OUTPUT_SHARD_WORKERS", "0")),
+
+        # Download Package (ZIP)
+        'zip_compression': os.getenv("ZIP_COMPRESSION", "deflated").lower(),
+        'zip_compresslevel': int(os.getenv("ZIP_COMPRESSLEVEL", "1")),
+        'zip_workers': int(os.getenv("ZIP_WORKERS", "0")),
+        'zip_parallel_min_bytes': int(os.getenv("ZIP_PARALLEL_MIN_BYTES", str(8 * 1024 * 1024))),
+
+        # Completion engine: per_employee (process_employee loop) or vectorized
+        'completion_engine': os.getenv("COMPLETION_ENGINE", "per_employee").lower(),
+
+        # Execution backend: local (this process) or spark (see simulation_spark.py)
+        'execution_backend': os.getenv("EXECUTION_BACKEND", "local").lower(),
+        'spark_master': os.getenv("SPARK_MASTER", "local[*]"),
+        'spark_partitions': int(os.getenv("SPARK_PARTITIONS", "0")),
+        'spark_staging_dir': os.getenv("SPARK_STAGING_DIR", ""),
+
+        # Run Clock: frozen "now" (ISO-8601, naive = PT) and training start/completion times
+        'run_clock_now': os.getenv("RUN_CLOCK_NOW", ""),
+        'training_time_distribution': os.getenv("TRAINING_TIME_DISTRIBUTION", "fixed").lower(),
+        'training_start_spread_minutes': float(os.getenv("TRAINING_START_SPREAD_MINUTES", "90")),
+        'training_duration_median_minutes': float(os.getenv("TRAINING_DURATION_MEDIAN_MINUTES", "4")),
+        'training_duration_sigma': float(os.getenv("TRAINING_DURATION_SIGMA", "0.5")),
+        'training_time_seed': os.getenv("TRAINING_TIME_SEED", ""),
+
+        # Run Instrumentation
+        'metrics_enabled': os.getenv("METRICS_ENABLED", "true").lower() in ['true', '1', 'yes'],
+        'metrics_trace_enabled': os.getenv("METRICS_TRACE_ENABLED", "false").lower() in ['true', '1', 'yes'],
+
+        # Run Result Cache (Gradio app, see simulation_run_cache.py)
+        'run_cache_enabled': os.getenv("RUN_CACHE_ENABLED", "true").lower() in ['true', '1', 'yes'],
+        'run_cache_dir': os.getenv("RUN_CACHE_DIR", ""),
+        'run_cache_ttl_minutes': float(os.getenv("RUN_CACHE_TTL_MINUTES", "30")),
+        'run_cache_max_bytes': int(os.getenv("RUN_CACHE_MAX_BYTES", str(1024 * 1024 * 1024))),
+
+        # Run Profiling
+        'profile_enabled': os.getenv("PROFILE_RUN", "false").lower() in ['true', '1', 'yes'],
+        'profile_sample_interval_ms': float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
     }
 
 
+# =============================================================================
+# INSTRUMENTATION
+# =============================================================================
+
+METRICS_FILENAME = "run_metrics.json"
+TRACE_FILENAME = "run_trace.json"
+
+# Upper bounds (milliseconds) of the latency histogram buckets
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+
+class RunMetrics:
+    """
+    Collects per-stage timings, latency histograms and counters for one run.
+
+    Stages are timed with the stage() context manager (they may nest), external
+    call latencies are recorded with observe() and row/byte/error counts with
+    increment(). When trace is enabled every stage occurrence is also kept as a
+    Chrome trace event. All methods are thread-safe.
+    """
+
+    def __init__(self, trace: bool = False):
+        self.trace = trace
+        self.started_at = datetime.now().astimezone().isoformat()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._histograms = {}
+        self._counters = {}
+        self._trace_events = []
+        self._thread_ids = {}
+        self._stage_listeners = []
+
+    def add_stage_listener(self, on_enter, on_exit) -> None:
+        """
+        Register callbacks invoked as on_enter(name) / on_exit(name) around every stage.
+
+        Args:
+            on_enter: Callable run when a stage starts
+            on_exit: Callable run when a stage ends
+        """
+        self._stage_listeners.append((on_enter, on_exit))
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a block of work as the named stage."""
+        for on_enter, _ in self._stage_listeners:
+            on_enter(name)
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self._record_stage(name, start, end)
+
+            for _, on_exit in reversed(self._stage_listeners):
+                on_exit(name)
+
+    def _record_stage(self, name: str, start: float, end: float) -> None:
+        elapsed = end - start
+
+        with self._lock:
+            stats = self._stages.setdefault(name, {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+            stats['count'] += 1
+            stats['total_seconds'] += elapsed
+            stats['max_seconds'] = max(stats['max_seconds'], elapsed)
+
+            if self.trace:
+                thread_id = self._thread_ids.setdefault(threading.get_ident(), len(self._thread_ids) + 1)
+                self._trace_events.append({
+                    'name': name,
+                    'cat': 'stage',
+                    'ph': 'X',
+                    'ts': round((start - self._start) * 1e6, 1),
+                    'dur': round(elapsed * 1e6, 1),
+                    'pid': os.getpid(),
+                    'tid': thread_id,
+                })
+
+    def observe(self, name: str, seconds: float) -> None:
+        """
+        Record one latency sample (e.g. a single API call) in the named histogram.
+
+        Args:
+            name: Histogram name
+            seconds: Measured latency in seconds
+        """
+        latency_ms = seconds * 1000.0
+
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = {'count': 0, 'sum_ms': 0.0, 'min_ms': None, 'max_ms': 0.0,
+                             'buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1)}
+                self._histograms[name] = histogram
+
+            histogram['count'] += 1
+            histogram['sum_ms'] += latency_ms
+            histogram['max_ms'] = max(histogram['max_ms'], latency_ms)
+            if histogram['min_ms'] is None or latency_ms < histogram['min_ms']:
+                histogram['min_ms'] = latency_ms
+
+            bucket_index = len(LATENCY_BUCKETS_MS)
+            for i, upper_bound in enumerate(LATENCY_BUCKETS_MS):
+                if latency_ms <= upper_bound:
+                    bucket_index = i
+                    break
+            histogram['buckets'][bucket_index] += 1
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        """
+        Add to the named counter (rows, bytes, errors, ...).
+
+        Args:
+            name: Counter name
+            amount: Amount to add
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    @staticmethod
+    def _histogram_percentile(histogram: Dict, fraction: float) -> Optional[float]:
+        # Estimate a percentile as the upper bound of the bucket containing it
+        if histogram['count'] == 0:
+            return None
+
+        target = fraction * histogram['count']
+        cumulative = 0
+        for i, bucket_count in enumerate(histogram['buckets']):
+            cumulative += bucket_count
+            if cumulative >= target:
+                if i < len(LATENCY_BUCKETS_MS):
+                    return min(float(LATENCY_BUCKETS_MS[i]), histogram['max_ms'])
+                return histogram['max_ms']
+        return histogram['max_ms']
+
+    def to_dict(self) -> Dict:
+        """
+        Summarize the collected metrics.
+
+        Returns:
+            JSON-serializable dictionary with stages, latencies and counters
+        """
+        with self._lock:
+            stages = {name: dict(stats) for name, stats in self._stages.items()}
+            counters = dict(self._counters)
+            histograms = {name: dict(histogram, buckets=list(histogram['buckets']))
+                          for name, histogram in self._histograms.items()}
+
+        latencies = {}
+        for name, histogram in histograms.items():
+            latencies[name] = {
+                'count': histogram['count'],
+                'mean_ms': histogram['sum_ms'] / histogram['count'] if histogram['count'] else None,
+                'min_ms': histogram['min_ms'],
+                'max_ms': histogram['max_ms'],
+                'p50_ms': self._histogram_percentile(histogram, 0.50),
+                'p90_ms': self._histogram_percentile(histogram, 0.90),
+                'p99_ms': self._histogram_percentile(histogram, 0.99),
+                'bucket_bounds_ms': LATENCY_BUCKETS_MS,
+                'buckets': histogram['buckets'],
+            }
+
+        return {
+            'started_at': self.started_at,
+            'wall_seconds': time.perf_counter() - self._start,
+            'stages': stages,
+            'latencies': latencies,
+            'counters': counters,
+        }
+
+    def write_metrics(self, path: str) -> str:
+        """Write the metrics summary as JSON and return the path."""
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+    def write_trace(self, path: str) -> str:
+        """Write stage events in Chrome trace format and return the path."""
+        with self._lock:
+            events = list(self._trace_events)
+
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        return path
+
+
+# The active collector is per thread, so concurrent runs (simulation_fanout.py)
+# keep separate metrics; work handed to pool threads is not recorded
+_active_metrics = threading.local()
+
+
+def get_run_metrics() -> Optional[RunMetrics]:
+    """Return the metrics collector of the run in progress on this thread, or None."""
+    return getattr(_active_metrics, 'metrics', None)
+
+
+@contextmanager
+def activate_run_metrics(metrics: Optional[RunMetrics]):
+    """Make metrics the active collector of the calling thread for the duration of the block."""
+    previous = get_run_metrics()
+    _active_metrics.metrics = metrics
+    try:
+        yield metrics
+    finally:
+        _active_metrics.metrics = previous
+
+
+def stage_timer(name: str):
+    """Time a block as the named stage of the active run (no-op outside a run)."""
+    metrics = get_run_metrics()
+    if metrics is None:
+        return nullcontext()
+    return metrics.stage(name)
+
+
+def observe_latency(name: str, seconds: float) -> None:
+    """Record an external call latency on the active run (no-op outside a run)."""
+    metrics = get_run_metrics()
+    if metrics is not None:
+        metrics.observe(name, seconds)
+
+
+def increment_counter(name: str, amount: int = 1) -> None:
+    """Add to a counter on the active run (no-op outside a run)."""
+    metrics = get_run_metrics()
+    if metrics is not None:
+        metrics.increment(name, amount)
+
+
+def export_run_metrics(metrics: RunMetrics, output_dir: str,
+                       progress_callback=None) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Write the metrics JSON file (and trace file, if enabled) into the run directory.
+
+    Args:
+        metrics: Collector of the finished run
+        output_dir: Run output directory
+        progress_callback: Optional callback function for progress updates
+
+    Returns:
+        Tuple of (metrics_path, trace_path); trace_path is None when tracing is off
+    """
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        metrics_path = metrics.write_metrics(os.path.join(output_dir, METRICS_FILENAME))
+        trace_path = None
+        if metrics.trace:
+            trace_path = metrics.write_trace(os.path.join(output_dir, TRACE_FILENAME))
+    except Exception as e:
+        if progress_callback:
+            progress_callback(f"  Warning: Could not write run metrics: {e}")
+        return None, None
+
+    if progress_callback:
+        progress_callback(f"Run metrics written: {os.path.basename(metrics_path)}")
+        if trace_path:
+            progress_callback(f"Run trace written: {os.path.basename(trace_path)}")
+
+    return metrics_path, trace_path
+
+
 # =============================================================================
 # CONTENT DEFINITIONS
 # =============================================================================
@@ -106,31 +491,27 @@ for content in DAILY_DOSE_CONTENT + NON_DAILY_DOSE_CONTENT:
 # UTILITY FUNCTIONS
 # =============================================================================
 
-def format_content_id(content_id: int) -> str:
-    """
-    Format content ID with commas for human readability.
-    Example: 1915085 -> "1,915,085"
-
-    Args:
-        content_id: The numeric content ID
-
-    Returns:
-        Formatted string with commas
-    """
-    return f"{content_id:,}"
+def _now_pt(now: Optional[datetime] = None) -> datetime:
+    """Return now converted to PT, or the current PT time if now is None."""
+    if now is None:
+        return datetime.now(get_pt_timezone())
+    return now.astimezone(get_pt_timezone())
 
 
-def get_sunday_of_current_week() -> datetime:
+def get_sunday_of_current_week(now: Optional[datetime] = None) -> datetime:
     """
     Get most recent Monday (current or past) at 01:15:00 UTC.
 
     NOTE: Function name says Sunday but returns Monday for assignment start dates.
     This matches the assignment date logic.
 
+    Args:
+        now: Timezone-aware reference time (default: current time)
+
     Returns:
         datetime object for most recent Monday at 01:15:00 UTC
     """
-    now = datetime.now(UTC)
+    now = now.astimezone(get_utc_timezone()) if now else datetime.now(get_utc_timezone())
     current_weekday = now.weekday()  # Monday is 0
 
     if current_weekday == 0:
@@ -143,46 +524,67 @@ def get_sunday_of_current_week() -> datetime:
     return monday
 
 
-def get_next_future_sunday() -> datetime:
+def get_next_future_sunday(now: Optional[datetime] = None) -> datetime:
     """
     Get next Monday (7 days after start Monday) at 01:03:00 UTC.
 
     NOTE: Function name says Sunday but returns next Monday for assignment due dates.
     This matches the assignment date logic.
 
+    Args:
+        now: Timezone-aware reference time (default: current time)
+
     Returns:
         datetime object for next Monday at 01:03:00 UTC
     """
-    start_monday = get_sunday_of_current_week()
+    start_monday = get_sunday_of_current_week(now)
     next_monday = start_monday + timedelta(days=7)
     next_monday = next_monday.replace(hour=1, minute=3, second=0, microsecond=0)
     return next_monday
 
 
-def generate_request_id() -> str:
+def generate_request_id(now: Optional[datetime] = None) -> str:
     """
     Generate RequestId in format: fake:DD
     Example: fake:14 (for the 14th day of the month)
     Uses PT timezone for date component.
 
+    Args:
+        now: Timezone-aware reference time (default: current time)
+
     Returns:
         RequestId string
     """
-    now = datetime.now(PT)
+    now = _now_pt(now)
     day = now.strftime("%d")
     return f"fake:{day}"
 
 
-def generate_non_completed_assignments_filename() -> str:
+def generate_run_id() -> str:
+    """
+    Generate a unique run ID: UTC timestamp plus a random suffix.
+    Example: 20250114T211503Z-3f9c2a1b
+
+    Returns:
+        Run ID string
+    """
+    now = datetime.now(get_utc_timezone())
+    return f"{now.strftime('%Y%m%dT%H%M%SZ')}-{uuid.uuid4().hex[:8]}"
+
+
+def generate_non_completed_assignments_filename(now: Optional[datetime] = None) -> str:
     """
     Generate NonCompletedAssignments filename with timestamp.
     Format: Non_Completed_Assignments_V2_YYYY_M_DD_1_HHMMSS.csv
     Uses PT timezone for date and time components.
 
+    Args:
+        now: Timezone-aware reference time (default: current time)
+
     Returns:
         Generated filename
     """
-    now = datetime.now(PT)
+    now = _now_pt(now)
     year = now.strftime("%Y")
     month = now.strftime("%-m")
     day = now.strftime("%-d")
@@ -190,16 +592,19 @@ def generate_non_completed_assignments_filename() -> str:
     return f"Non_Completed_Assignments_V2_{year}_{month}_{day}_1_{time_suffix}.csv"
 
 
-def generate_output_filename() -> str:
+def generate_output_filename(now: Optional[datetime] = None) -> str:
     """
     Generate ContentUserCompletion filename with timestamp.
     Format: ContentUserCompletion_V2_YYYY_MM_DD_1_HHMMSS.csv
     Uses PT timezone for date and time components.
 
+    Args:
+        now: Timezone-aware reference time (default: current time)
+
     Returns:
         Generated filename
     """
-    now = datetime.now(PT)
+    now = _now_pt(now)
     year = now.strftime("%Y")
     month = now.strftime("%m")
     day = now.strftime("%d")
@@ -207,16 +612,19 @@ def generate_output_filename() -> str:
     return f"ContentUserCompletion_V2_{year}_{month}_{day}_1_{time_suffix}.csv"
 
 
-def generate_user_completion_filename() -> str:
+def generate_user_completion_filename(now: Optional[datetime] = None) -> str:
     """
     Generate UserCompletion filename with timestamp.
     Format: UserCompletion_v2_YYYY_M_DD_1_HHMMSS.csv
     Uses PT timezone for date and time components.
 
+    Args:
+        now: Timezone-aware reference time (default: current time)
+
     Returns:
         Generated filename
     """
-    now = datetime.now(PT)
+    now = _now_pt(now)
     year = now.strftime("%Y")
     month = now.strftime("%-m")
     day = now.strftime("%-d")
@@ -224,25 +632,26 @@ def generate_user_completion_filename() -> str:
     return f"UserCompletion_v2_{year}_{month}_{day}_1_{time_suffix}.csv"
 
 
-def generate_training_times(num_courses: int) -> List[Tuple[str, str]]:
+def generate_training_times(num_courses: int, now: Optional[datetime] = None) -> List[Tuple[str, str]]:
     """
     Generate start and completion times for training courses.
     Calculates times in PT timezone (13:15 and 13:19), then converts to UTC for output.
 
     Args:
         num_courses: Number of courses to generate times for
+        now: Timezone-aware reference time; its PT date is used (default: current time)
 
     Returns:
         List of (start_time, end_time) tuples in ISO-8601 format with UTC timezone
     """
     times = []
-    now = datetime.now(PT)
+    now = _now_pt(now)
 
     start_time_pt = now.replace(hour=13, minute=15, second=0, microsecond=0)
     end_time_pt = now.replace(hour=13, minute=19, second=0, microsecond=0)
 
-    start_time_utc = start_time_pt.astimezone(UTC)
-    end_time_utc = end_time_pt.astimezone(UTC)
+    start_time_utc = start_time_pt.astimezone(get_utc_timezone())
+    end_time_utc = end_time_pt.astimezone(get_utc_timezone())
 
     for _ in range(num_courses):
         times.append((
@@ -253,10 +662,185 @@ def generate_training_times(num_courses: int) -> List[Tuple[str, str]]:
     return times
 
 
+# =============================================================================
+# RUN CLOCK
+# =============================================================================
+
+TRAINING_TIME_DISTRIBUTIONS = ('fixed', 'random')
+
+# Fixed training times (PT): start 13:15, completion 4 minutes later
+TRAINING_START_HOUR_PT = 13
+TRAINING_START_MINUTE_PT = 15
+TRAINING_DURATION_MINUTES = 4
+
+# Random training times stay within these bounds (minutes)
+TRAINING_MAX_START_OFFSET_MINUTES = 8 * 60
+TRAINING_MIN_DURATION_MINUTES = 1
+TRAINING_MAX_DURATION_MINUTES = 4 * 60
+
+
+class RunClock:
+    """
+    A run's "now", fixed once, with the timestamps and strings derived from it.
+
+    Every record of a run is stamped from the same clock, so per-row code does
+    no clock reads or timezone conversions, the whole run agrees on its date
+    even across midnight, and a frozen clock (RUN_CLOCK_NOW) with a fixed
+    TRAINING_TIME_SEED makes runs reproducible: the seed drives both the
+    random training times and each employee's non-Daily Dose assignment.
+
+    Training times are either 'fixed' (13:15 -> 13:19 PT, as before) or
+    'random': start normally distributed around 13:15 PT with the given
+    spread, duration log-normal around the given median.
+    """
+
+    def __init__(self, now: Optional[datetime] = None, training_time_distribution: str = 'fixed',
+                 start_spread_minutes: float = 90.0, duration_median_minutes: float = 4.0,
+                 duration_sigma: float = 0.5, seed: Optional[int] = None):
+        if training_time_distribution not in TRAINING_TIME_DISTRIBUTIONS:
+            raise ValueError(f"Unknown training time distribution: {training_time_distribution} "
+                             f"(expected one of {', '.join(TRAINING_TIME_DISTRIBUTIONS)})")
+
+        utc = get_utc_timezone()
+        self.now = _now_pt(now)
+        self.now_utc = self.now.astimezone(utc)
+
+        # Assignment fields
+        self.created_date = self.now_utc.isoformat()
+        self.request_id = generate_request_id(self.now)
+        self.assignment_start_date = get_sunday_of_current_week(self.now).isoformat()
+        self.assignment_due_date = get_next_future_sunday(self.now).isoformat()
+
+        # Training times
+        start_pt = self.now.replace(hour=TRAINING_START_HOUR_PT, minute=TRAINING_START_MINUTE_PT,
+                                    second=0, microsecond=0)
+        self.training_start = start_pt.astimezone(utc)
+        self.training_end = (start_pt + timedelta(minutes=TRAINING_DURATION_MINUTES)).astimezone(utc)
+        self.training_time = (self.training_start.isoformat(), self.training_end.isoformat())
+
+        self.training_time_distribution = training_time_distribution
+        self.start_spread_minutes = start_spread_minutes
+        self.duration_median_minutes = duration_median_minutes
+        self.duration_sigma = duration_sigma
+        self.seed = seed
+        self.stream = 0
+        self._rng = None
+
+    @classmethod
+    def from_config(cls, config: Dict, now: Optional[datetime] = None) -> RunClock:
+        """
+        Build the clock for a run from RUN_CLOCK_NOW and the TRAINING_TIME_* settings.
+
+        Args:
+            config: Configuration dictionary
+            now: Explicit time; overrides RUN_CLOCK_NOW
+
+        Raises:
+            ValueError: If RUN_CLOCK_NOW or TRAINING_TIME_DISTRIBUTION is invalid
+        """
+        if now is None and config.get('run_clock_now'):
+            now = parse_clock_time(config['run_clock_now'])
+
+        seed = config.get('training_time_seed')
+        return cls(now,
+                   training_time_distribution=config.get('training_time_distribution', 'fixed'),
+                   start_spread_minutes=config.get('training_start_spread_minutes', 90.0),
+                   duration_median_minutes=config.get('training_duration_median_minutes', 4.0),
+                   duration_sigma=config.get('training_duration_sigma', 0.5),
+                   seed=int(seed) if seed not in (None, '') else None)
+
+    def for_stream(self, stream: int) -> RunClock:
+        """
+        Copy of the clock with its own random training-time stream, for code
+        drawing times in parallel (e.g. one stream per Spark partition).
+        Stream 0 is the clock's own stream.
+        """
+        clock = copy.copy(self)
+        clock.stream = stream
+        clock._rng = None
+        return clock
+
+    def choose_for_employee(self, employee_id: int, options: List):
+        """
+        Pick one of options for an employee.
+
+        With a seed, the choice depends only on (seed, PT date, employee_id),
+        so it does not change with employee order or between runs; without
+        one it is random.
+        """
+        if self.seed is None:
+            return random.choice(options)
+        return random.Random(f"{self.seed}:{self.now.date().toordinal()}:{employee_id}").choice(options)
+
+    def training_times(self, num_courses: int) -> List[Tuple[str, str]]:
+        """Same as generate_training_times(num_courses, now), without per-call clock work."""
+        if self.training_time_distribution == 'fixed':
+            return [self.training_time] * num_courses
+
+        starts, ends = self.training_time_arrays(num_courses)
+        return list(zip(starts.tolist(), ends.tolist()))
+
+    def training_time_arrays(self, num_courses: int):
+        """
+        Start and completion times for num_courses courses, as arrays.
+
+        Returns:
+            Tuple of (start_times, end_times): NumPy object arrays of ISO-8601 UTC strings
+        """
+        import numpy as np
+
+        if self.training_time_distribution == 'fixed':
+            return (np.full(num_courses, self.training_time[0], dtype=object),
+                    np.full(num_courses, self.training_time[1], dtype=object))
+
+        if self._rng is None:
+            # Seeded per PT date, so each day of a multi-day simulation draws different times
+            seed = [self.seed, self.now.date().toordinal()] + ([self.stream] if self.stream else [])
+            self._rng = np.random.default_rng(None if self.seed is None else seed)
+
+        start_offsets = np.clip(self._rng.normal(0.0, self.start_spread_minutes, num_courses),
+                                -TRAINING_MAX_START_OFFSET_MINUTES, TRAINING_MAX_START_OFFSET_MINUTES)
+        durations = np.clip(self._rng.lognormal(np.log(self.duration_median_minutes), self.duration_sigma,
+                                                num_courses),
+                            TRAINING_MIN_DURATION_MINUTES, TRAINING_MAX_DURATION_MINUTES)
+
+        base = np.datetime64(self.training_start.replace(tzinfo=None), 's')
+        starts = base + np.round(start_offsets * 60).astype('timedelta64[s]')
+        ends = starts + np.round(durations * 60).astype('timedelta64[s]')
+        return _format_utc_times(starts), _format_utc_times(ends)
+
+
+def _format_utc_times(times) -> np.ndarray:
+    """Format datetime64[s] UTC values like datetime.isoformat() on a UTC-aware datetime."""
+    import numpy as np
+
+    return np.char.add(np.datetime_as_string(times, unit='s'), '+00:00').astype(object)
+
+
+def parse_clock_time(value: str) -> datetime:
+    """
+    Parse a RUN_CLOCK_NOW value: ISO-8601, naive values are PT.
+
+    Raises:
+        ValueError: If the value is not an ISO-8601 date or datetime
+    """
+    try:
+        parsed = datetime.fromisoformat(value.strip())
+    except ValueError:
+        raise ValueError(f"Invalid RUN_CLOCK_NOW (expected ISO-8601, e.g. 2025-01-14T09:30): {value}") from None
+    if parsed.tzinfo is None:
+        parsed = get_pt_timezone().localize(parsed)
+    return parsed
+
+
 def cleanup_output_directory(config: Dict, progress_callback=None) -> int:
     """
     Remove old files from output directory before new simulation run.
 
+    Interrupted SFTP downloads (.part files, see simulation_sftp.py) are kept
+    so the next download can resume them, unless they are older than
+    PARTIAL_MAX_AGE_SECONDS.
+
     Args:
         config: Configuration dictionary
         progress_callback: Optional callback function for progress updates
@@ -264,6 +848,8 @@ def cleanup_output_directory(config: Dict, progress_callback=None) -> int:
     Returns:
         Number of files removed
     """
+    from simulation_sftp import PARTIAL_MAX_AGE_SECONDS, is_partial_transfer
+
     output_dir = config['output_dir']
     files_removed = 0
 
@@ -279,6 +865,9 @@ def cleanup_output_directory(config: Dict, progress_callback=None) -> int:
         if os.path.basename(file_path) == ".gitkeep":
             continue
 
+        if is_partial_transfer(file_path) and time.time() - os.path.getmtime(file_path) < PARTIAL_MAX_AGE_SECONDS:
+            continue
+
         # Only remove files, not subdirectories
         if os.path.isfile(file_path):
             try:
@@ -305,6 +894,8 @@ def load_and_filter_employees(file_path: str, progress_callback=None) -> Tuple[p
     Returns:
         Tuple of (filtered_dataframe, filtered_count)
     """
+    import pandas as pd
+
     employees_df = pd.read_csv(file_path)
 
     # Filter out comment rows
@@ -315,6 +906,10 @@ def load_and_filter_employees(file_path: str, progress_callback=None) -> Tuple[p
 
     filtered_count = initial_count - len(employees_df)
 
+    increment_counter('rows.employees_loaded', len(employees_df))
+    increment_counter('rows.employee_comment_rows_filtered', filtered_count)
+    increment_counter('bytes.employees_file', os.path.getsize(file_path))
+
     if progress_callback:
         if filtered_count > 0:
             progress_callback(f"Filtered out {filtered_count} comment row(s)")
@@ -323,78 +918,102 @@ def load_and_filter_employees(file_path: str, progress_callback=None) -> Tuple[p
     return employees_df, filtered_count
 
 
-def convert_databricks_assignments_to_output_format(open_assignments_df: pd.DataFrame) -> List[Dict]:
+def convert_databricks_assignments_to_output_format(open_assignments_df: pd.DataFrame,
+                                                    clock: Optional[RunClock] = None) -> List[AssignmentRecord]:
     """
     Convert Databricks open assignments to NonCompletedAssignments output format.
 
     Args:
         open_assignments_df: DataFrame with columns: ba_id, content_id, assignment_date,
                             assignment_begin_date, assignment_due_date, content_type
+        clock: Run clock for the RequestId (default: current time)
 
     Returns:
-        List of assignment dictionaries in output format
+        List of AssignmentRecord in output format
     """
     databricks_assignments = []
 
     if open_assignments_df.empty:
         return databricks_assignments
 
-    for _, row in open_assignments_df.iterrows():
-        databricks_assignments.append({
-            "UserID": int(row['ba_id']),
-            "CreateDate_text": row['assignment_date'].isoformat() if hasattr(row['assignment_date'], 'isoformat') else str(row['assignment_date']),
-            "RequestId": generate_request_id(),
-            "TrainingElementId": format_content_id(int(row['content_id'])),
-            "Start_Date_text": row['assignment_begin_date'].isoformat() if hasattr(row['assignment_begin_date'], 'isoformat') else str(row['assignment_begin_date']),
-            "DueDate_text": row['assignment_due_date'].isoformat() if hasattr(row['assignment_due_date'], 'isoformat') else str(row['assignment_due_date']),
-            "ContentType": row['content_type'] if 'content_type' in row else "Media"
-        })
+    def as_text(value):
+        return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+    request_id = clock.request_id if clock else generate_request_id()
+
+    if 'content_type' in open_assignments_df.columns:
+        content_types = open_assignments_df['content_type'].tolist()
+    else:
+        content_types = ["Media"] * len(open_assignments_df)
+
+    for user_id, assignment_date, content_id, begin_date, due_date, content_type in zip(
+            open_assignments_df['ba_id'].tolist(),
+            open_assignments_df['assignment_date'].tolist(),
+            format_content_ids(open_assignments_df['content_id']),
+            open_assignments_df['assignment_begin_date'].tolist(),
+            open_assignments_df['assignment_due_date'].tolist(),
+            content_types):
+        databricks_assignments.append(AssignmentRecord(
+            UserID=int(user_id),
+            CreateDate_text=as_text(assignment_date),
+            RequestId=request_id,
+            TrainingElementId=content_id,
+            Start_Date_text=as_text(begin_date),
+            DueDate_text=as_text(due_date),
+            ContentType=content_type
+        ))
 
     return databricks_assignments
 
 
-def create_manager_assignments(employees_df: pd.DataFrame, progress_callback=None) -> List[Dict]:
+def create_manager_assignments(employees_df: pd.DataFrame, progress_callback=None,
+                               now: Optional[datetime] = None,
+                               clock: Optional[RunClock] = None) -> List[AssignmentRecord]:
     """
     Create new manager assignments (Daily Dose + random non-DD) for all employees.
 
     Args:
         employees_df: DataFrame with employee_id column
         progress_callback: Optional callback function for progress updates
+        now: Timezone-aware creation time (default: current time)
+        clock: Run clock; takes precedence over now
 
     Returns:
-        List of assignment dictionaries
+        List of AssignmentRecord
     """
     new_manager_assignments = []
-    created_date = datetime.now(PT).astimezone(UTC).isoformat()
-    start_date = get_sunday_of_current_week().isoformat()
-    due_date = get_next_future_sunday().isoformat()
+    clock = clock or RunClock(now)
+    created_date = clock.created_date
+    request_id = clock.request_id
+    start_date = clock.assignment_start_date
+    due_date = clock.assignment_due_date
 
     for employee in employees_df.itertuples():
         employee_id = employee.employee_id
 
         # Assign Daily Dose
         for dd_content in DAILY_DOSE_CONTENT:
-            new_manager_assignments.append({
-                "UserID": employee_id,
-                "CreateDate_text": created_date,
-                "RequestId": generate_request_id(),
-                "TrainingElementId": format_content_id(int(dd_content['id'])),
-                "Start_Date_text": start_date,
-                "DueDate_text": due_date,
-                "ContentType": "Media"
-            })
+            new_manager_assignments.append(AssignmentRecord(
+                UserID=employee_id,
+                CreateDate_text=created_date,
+                RequestId=request_id,
+                TrainingElementId=format_content_id(int(dd_content['id'])),
+                Start_Date_text=start_date,
+                DueDate_text=due_date,
+                ContentType="Media"
+            ))
 
         # Assign random non-Daily Dose content
-        random_content = random.choice(NON_DAILY_DOSE_CONTENT)
-        new_manager_assignments.append({
-            "UserID": employee_id,
-            "CreateDate_text": created_date,
-            "RequestId": generate_request_id(),
-            "TrainingElementId": format_content_id(int(random_content['id'])),
-            "Start_Date_text": start_date,
-            "DueDate_text": due_date,
-            "ContentType": "Media"
-        })
+        random_content = clock.choose_for_employee(employee_id, NON_DAILY_DOSE_CONTENT)
+        new_manager_assignments.append(AssignmentRecord(
+            UserID=employee_id,
+            CreateDate_text=created_date,
+            RequestId=request_id,
+            TrainingElementId=format_content_id(int(random_content['id'])),
+            Start_Date_text=start_date,
+            DueDate_text=due_date,
+            ContentType="Media"
+        ))
 
     if progress_callback:
         progress_callback(f"Created {len(new_manager_assignments)} new manager assignments")
@@ -402,18 +1021,20 @@ def create_manager_assignments(employees_df: pd.DataFrame, progress_callback=Non
     return new_manager_assignments
 
 
-def generate_user_completion_file_from_template(config: Dict, progress_callback=None) -> Optional[str]:
+def generate_user_completion_file_from_template(config: Dict, progress_callback=None,
+                                                now: Optional[datetime] = None) -> Optional[str]:
     """
     Generate UserCompletion file by copying template with timestamped filename.
 
     Args:
         config: Configuration dictionary
         progress_callback: Optional callback function for progress updates
+        now: Timezone-aware time used for the filename (default: current time)
 
     Returns:
         Path to generated file, or None if generation fails
     """
-    user_completion_filename = generate_user_completion_filename()
+    user_completion_filename = generate_user_completion_filename(now)
     user_completion_path = os.path.join(config['output_dir'], user_completion_filename)
 
     if not os.path.exists(config['user_completion_template_file']):
@@ -490,6 +1111,50 @@ def parse_standalone_content_filename(filename: str) -> Optional[Tuple]:
     return None
 
 
+def select_most_recent_file(filenames: List[str], file_type: str) -> Optional[Tuple[str, datetime]]:
+    """
+    Pick the most recent file of a type from a directory listing.
+
+    Args:
+        filenames: File names in the inbound directory
+        file_type: Either 'course_catalog' or 'standalone_content'
+
+    Returns:
+        Tuple of (filename, file date), or None if no file name matches
+    """
+    parse = parse_course_catalog_filename if file_type == 'course_catalog' else parse_standalone_content_filename
+    parsed_files = [(f, p) for f, p in ((f, parse(f)) for f in filenames) if p is not None]
+    if not parsed_files:
+        return None
+
+    # Most recent date wins
+    filename, parsed = max(parsed_files, key=lambda x: x[1][3])
+    return filename, parsed[3]
+
+
+def list_most_recent_inbound_files(config: Dict) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Name the CourseCatalog and StandAloneContent files a run would download,
+    without downloading them (one directory listing on SFTP inbound).
+
+    Returns:
+        Tuple of (course_catalog_filename, standalone_content_filename); either may be None
+
+    Raises:
+        Exception: If the SFTP server cannot be reached or listed
+    """
+    from simulation_sftp import SftpConnection
+
+    with SftpConnection.from_config(config, 'inbound') as connection:
+        files = connection.sftp.listdir()
+
+    names = []
+    for file_type in ('course_catalog', 'standalone_content'):
+        most_recent = select_most_recent_file(files, file_type)
+        names.append(most_recent[0] if most_recent else None)
+    return names[0], names[1]
+
+
 def download_most_recent_file_from_sftp(config: Dict, file_type: str,
                                         progress_callback=None) -> Optional[str]:
     """
@@ -503,58 +1168,58 @@ def download_most_recent_file_from_sftp(config: Dict, file_type: str,
     Returns:
         Path to the downloaded file, or None if download fails
     """
+    from simulation_sftp import CsvStreamParser, SftpConnection, download_file
+
+    parser = None
     try:
         if progress_callback:
             progress_callback(f"Connecting to SFTP server: {config['sftp_inbound_host']}")
 
-        transport = paramiko.Transport((config['sftp_inbound_host'], 22))
-        transport.connect(username=config['sftp_inbound_user'],
-                         password=config['sftp_inbound_password'])
-        sftp = paramiko.SFTPClient.from_transport(transport)
-
-        sftp.chdir(config['sftp_inbound_remote_path'])
-
-        if progress_callback:
-            progress_callback(f"Connected. Listing files in: {config['sftp_inbound_remote_path']}")
-
-        files = sftp.listdir()
-
-        # Parse files based on type
-        if file_type == 'course_catalog':
-            parsed_files = [(f, parse_course_catalog_filename(f)) for f in files]
-            parsed_files = [(f, p) for f, p in parsed_files if p is not None]
-        else:  # standalone_content
-            parsed_files = [(f, parse_standalone_content_filename(f)) for f in files]
-            parsed_files = [(f, p) for f, p in parsed_files if p is not None]
-
-        if not parsed_files:
+        with SftpConnection.from_config(config, 'inbound') as connection:
             if progress_callback:
-                progress_callback(f"No valid {file_type} files found")
-            sftp.close()
-            transport.close()
-            return None
+                progress_callback(f"Connected. Listing files in: {config['sftp_inbound_remote_path']}")
 
-        # Sort by date (most recent first)
-        parsed_files.sort(key=lambda x: x[1][3], reverse=True)
-        most_recent_file = parsed_files[0][0]
-        most_recent_date = parsed_files[0][1][3]
+            files = connection.sftp.listdir()
 
-        if progress_callback:
-            progress_callback(f"Downloading: {most_recent_file} (date: {most_recent_date.strftime('%Y-%m-%d')})")
+            most_recent = select_most_recent_file(files, file_type)
+            if most_recent is None:
+                if progress_callback:
+                    progress_callback(f"No valid {file_type} files found")
+                return None
 
-        # Download the file
-        local_path = os.path.join(config['sftp_local_dir'], most_recent_file)
-        sftp.get(most_recent_file, local_path)
+            most_recent_file, most_recent_date = most_recent
 
-        sftp.close()
-        transport.close()
+            if progress_callback:
+                progress_callback(f"Downloading: {most_recent_file} (date: {most_recent_date.strftime('%Y-%m-%d')})")
+
+            # StandAloneContent is parsed as it arrives, see load_standalone_content()
+            if file_type == 'standalone_content' and config['sftp_stream_parse']:
+                parser = CsvStreamParser()
+
+            # Download the file (resumable, verified, renamed into place when complete)
+            local_path = os.path.join(config['sftp_local_dir'], most_recent_file)
+            transfer_start = time.perf_counter()
+            transfer = download_file(connection, most_recent_file, local_path,
+                                     retries=config['sftp_transfer_retries'],
+                                     retry_delay=config['sftp_retry_delay_seconds'],
+                                     verify_checksum=config['sftp_verify_checksum'],
+                                     parser=parser, progress_callback=progress_callback)
+            if parser is not None:
+                remember_parsed_inbound_file(local_path, parser.finish())
+                parser = None
+            observe_latency('sftp.download', time.perf_counter() - transfer_start)
+            increment_counter('bytes.sftp_downloaded', transfer['bytes'] - transfer['resumed_from'])
 
         if progress_callback:
-            progress_callback(f"Downloaded to: {local_path}")
+            progress_callback(f"Downloaded to: {local_path}"
+                              + (" (checksum verified)" if transfer['checksum_verified'] else ""))
 
         return local_path
 
     except Exception as e:
+        if parser is not None:
+            parser.abort()
+        increment_counter('errors.sftp_download')
         if progress_callback:
             progress_callback(f"Error downloading {file_type}: {e}")
         return None
@@ -565,14 +1230,19 @@ def publish_files_to_sftp_outbound(config: Dict, files_to_publish: List[str],
     """
     Publish generated files to SFTP outbound server.
 
+    A sharded output's manifest is published after all of its parts, and only
+    if every part was uploaded.
+
     Args:
         config: Configuration dictionary
-        files_to_publish: List of local file paths to upload
+        files_to_publish: List of local file paths to upload (shard manifests stand for their parts)
         progress_callback: Optional callback function for progress updates
 
     Returns:
         True if all files published successfully, False otherwise
     """
+    from simulation_sftp import SftpConnection, upload_file
+
     if not config['sftp_publish_enabled']:
         if progress_callback:
             progress_callback("SFTP publishing is disabled (SFTP_PUBLISH_ENABLED=false)")
@@ -592,12 +1262,8 @@ def publish_files_to_sftp_outbound(config: Dict, files_to_publish: List[str],
         if progress_callback:
             progress_callback(f"Connecting to SFTP outbound server: {config['sftp_outbound_host']}")
 
-        transport = paramiko.Transport((config['sftp_outbound_host'], 22))
-        transport.connect(username=config['sftp_outbound_user'],
-                         password=config['sftp_outbound_password'])
-        sftp = paramiko.SFTPClient.from_transport(transport)
-
-        sftp.chdir(config['sftp_outbound_remote_path'])
+        connection = SftpConnection.from_config(config, 'outbound')
+        connection.open()
 
         if progress_callback:
             progress_callback(f"Connected. Publishing to: {config['sftp_outbound_remote_path']}")
@@ -605,27 +1271,54 @@ def publish_files_to_sftp_outbound(config: Dict, files_to_publish: List[str],
         published_count = 0
         failed_count = 0
 
-        for local_file_path in files_to_publish:
+        def upload(local_file_path: str) -> bool:
+            nonlocal published_count, failed_count
+
             if not os.path.exists(local_file_path):
                 if progress_callback:
                     progress_callback(f"File not found (skipping): {local_file_path}")
                 failed_count += 1
-                continue
+                return False
 
             filename = os.path.basename(local_file_path)
 
             try:
-                sftp.put(local_file_path, filename)
+                transfer_start = time.perf_counter()
+                # Written as <filename>.part and renamed once verified
+                transfer = upload_file(connection, local_file_path, filename,
+                                       retries=config['sftp_transfer_retries'],
+                                       retry_delay=config['sftp_retry_delay_seconds'],
+                                       verify_checksum=config['sftp_verify_checksum'],
+                                       progress_callback=progress_callback)
+                observe_latency('sftp.upload', time.perf_counter() - transfer_start)
+                increment_counter('bytes.sftp_uploaded', transfer['bytes'])
                 if progress_callback:
-                    progress_callback(f"Uploaded: {filename}")
+                    progress_callback(f"Uploaded: {filename}"
+                                      + (" (checksum verified)" if transfer['checksum_verified'] else ""))
                 published_count += 1
+                return True
             except Exception as e:
+                increment_counter('errors.sftp_upload')
                 if progress_callback:
                     progress_callback(f"Failed to upload {filename}: {e}")
                 failed_count += 1
+                return False
+
+        for local_file_path in files_to_publish:
+            if is_shard_manifest(local_file_path) and os.path.exists(local_file_path):
+                # Parts first, manifest last: a reader waiting for the manifest sees the whole set
+                uploaded = [upload(part_path) for part_path in get_shard_part_paths(local_file_path)]
+                if all(uploaded):
+                    upload(local_file_path)
+                else:
+                    if progress_callback:
+                        progress_callback(f"Not publishing {os.path.basename(local_file_path)}: "
+                                          f"{uploaded.count(False)} part(s) failed")
+                    failed_count += 1
+            else:
+                upload(local_file_path)
 
-        sftp.close()
-        transport.close()
+        connection.close()
 
         if progress_callback:
             progress_callback(f"Publishing complete: {published_count} succeeded, {failed_count} failed")
@@ -633,6 +1326,7 @@ def publish_files_to_sftp_outbound(config: Dict, files_to_publish: List[str],
         return failed_count == 0
 
     except Exception as e:
+        increment_counter('errors.sftp_publish')
         if progress_callback:
             progress_callback(f"ERROR: Failed to publish files: {e}")
         return False
@@ -642,6 +1336,61 @@ def publish_files_to_sftp_outbound(config: Dict, files_to_publish: List[str],
 # DATABRICKS OPERATIONS
 # =============================================================================
 
+def is_databricks_configured(config: Dict) -> bool:
+    """
+    Check whether the state tables can be queried.
+
+    Args:
+        config: Configuration dictionary
+
+    Returns:
+        True if the Databricks warehouse or the local SQLite stand-in is configured
+    """
+    if config.get('databricks_sqlite_path'):
+        return True
+    return all([config['databricks_host'], config['databricks_http_path'], config['databricks_token']])
+
+
+def connect_databricks(config: Dict):
+    """
+    Open a DB-API connection to the Databricks SQL warehouse, or to the local
+    SQLite stand-in when DATABRICKS_SQLITE_PATH is set.
+
+    Args:
+        config: Configuration dictionary
+
+    Returns:
+        DB-API connection (caller must close it)
+    """
+    if config.get('databricks_sqlite_path'):
+        import sqlite3
+        return sqlite3.connect(config['databricks_sqlite_path'])
+
+    from databricks import sql
+
+    return sql.connect(
+        server_hostname=config['databricks_host'],
+        http_path=config['databricks_http_path'],
+        access_token=config['databricks_token']
+    )
+
+
+def get_state_table_name(config: Dict, table: str) -> str:
+    """
+    Get the fully qualified name of a state table (content_assignments, content_completion).
+
+    Args:
+        config: Configuration dictionary
+        table: Unqualified table name
+
+    Returns:
+        <catalog>.<schema>.<table> for Databricks, or the bare table name for SQLite
+    """
+    if config.get('databricks_sqlite_path'):
+        return table
+    return f"{config['databricks_catalog']}.{config['databricks_schema']}.{table}"
+
+
 def get_open_assignments_from_databricks(config: Dict, employee_ids: List[int],
                                         progress_callback=None) -> pd.DataFrame:
     """
@@ -659,33 +1408,44 @@ def get_open_assignments_from_databricks(config: Dict, employee_ids: List[int],
                                assignment_due_date, content_type
         Returns empty DataFrame if Databricks is not configured.
     """
-    # Check if Databricks is configured
-    if not all([config['databricks_host'], config['databricks_http_path'], config['databricks_token']]):
-        if progress_callback:
-            progress_callback("Databricks not configured. Skipping assignments query.")
-        return pd.DataFrame()
+    import pandas as pd
 
     if not employee_ids:
         if progress_callback:
             progress_callback("No employee IDs provided. Skipping assignments query.")
         return pd.DataFrame()
 
-    try:
-        from databricks import sql
+    # Answer from the local mirror when the state store is enabled
+    if config['state_store_path']:
+        from simulation_state import LocalStateStore
+
+        query_start = time.perf_counter()
+        with LocalStateStore(config['state_store_path']) as store:
+            df = store.get_open_assignments(employee_ids)
+        observe_latency('state_store.open_assignments', time.perf_counter() - query_start)
+        increment_counter('rows.databricks_open_assignments', len(df))
+
+        if progress_callback:
+            progress_callback(f"Retrieved {len(df)} open assignment(s) from local state mirror")
+        return df
+
+    # Check if Databricks is configured
+    if not is_databricks_configured(config):
+        if progress_callback:
+            progress_callback("Databricks not configured. Skipping assignments query.")
+        return pd.DataFrame()
 
+    try:
         if progress_callback:
-            progress_callback(f"Connecting to Databricks: {config['databricks_host']}")
+            progress_callback(f"Connecting to Databricks: "
+                              f"{config.get('databricks_sqlite_path') or config['databricks_host']}")
 
-        connection = sql.connect(
-            server_hostname=config['databricks_host'],
-            http_path=config['databricks_http_path'],
-            access_token=config['databricks_token']
-        )
+        connection = connect_databricks(config)
 
         cursor = connection.cursor()
 
-        assignments_table = f"{config['databricks_catalog']}.{config['databricks_schema']}.content_assignments"
-        completion_table = f"{config['databricks_catalog']}.{config['databricks_schema']}.content_completion"
+        assignments_table = get_state_table_name(config, 'content_assignments')
+        completion_table = get_state_table_name(config, 'content_completion')
 
         if progress_callback:
             progress_callback(f"Querying {len(employee_ids)} employee(s) for open assignments")
@@ -709,10 +1469,13 @@ def get_open_assignments_from_databricks(config: Dict, employee_ids: List[int],
         ORDER BY a.ba_id, a.assignment_due_date
         """
 
+        query_start = time.perf_counter()
         cursor.execute(query)
 
         columns = [desc[0] for desc in cursor.description]
         rows = cursor.fetchall()
+        observe_latency('databricks.open_assignments', time.perf_counter() - query_start)
+        increment_counter('rows.databricks_open_assignments', len(rows))
 
         cursor.close()
         connection.close()
@@ -725,13 +1488,14 @@ def get_open_assignments_from_databricks(config: Dict, employee_ids: List[int],
         return df
 
     except Exception as e:
+        increment_counter('errors.databricks_open_assignments')
         if progress_callback:
             progress_callback(f"ERROR: Failed to query Databricks: {e}")
         raise RuntimeError(f"Databricks query failed: {str(e)}") from e
 
 
 def get_employee_recent_completions(config: Dict, employee_id: int,
-                                    lookback_days: int = 13) -> set:
+                                    lookback_days: int = 13, now: Optional[datetime] = None) -> set:
     """
     Query content_completion table to get training completed by employee in the last N days.
 
@@ -739,342 +1503,2565 @@ def get_employee_recent_completions(config: Dict, employee_id: int,
         config: Configuration dictionary
         employee_id: The employee's ID (ba_id)
         lookback_days: Number of days to look back (default: 13 = today + prior 12 days)
+        now: Timezone-aware reference time; the window ends on its PT date (default: current time)
 
     Returns:
         Set of content IDs completed in the lookback period
     """
-    if not all([config['databricks_host'], config['databricks_http_path'], config['databricks_token']]):
-        return set()
+    return set(get_employee_completion_dates(config, employee_id, lookback_days, now))
 
-    try:
-        from databricks import sql
 
-        connection = sql.connect(
-            server_hostname=config['databricks_host'],
-            http_path=config['databricks_http_path'],
-            access_token=config['databricks_token']
-        )
+def get_employee_completion_dates(config: Dict, employee_id: int,
+                                  lookback_days: int = 13, now: Optional[datetime] = None) -> Dict[int, str]:
+    """
+    Query content_completion table for the latest completion date of each content
+    the employee completed in the last N days.
 
-        cursor = connection.cursor()
+    Args:
+        config: Configuration dictionary
+        employee_id: The employee's ID (ba_id)
+        lookback_days: Number of days to look back (default: 13 = today + prior 12 days)
+        now: Timezone-aware reference time; the window ends on its PT date (default: current time)
+
+    Returns:
+        Dictionary of {content_id: latest completion date (YYYY-MM-DD)}
+    """
+    now_pt = _now_pt(now)
+    start_date = (now_pt - timedelta(days=lookback_days - 1)).date()
+    end_date = now_pt.date()
+
+    if config['state_store_path']:
+        from simulation_state import LocalStateStore
+
+        query_start = time.perf_counter()
+        with LocalStateStore(config['state_store_path']) as store:
+            completion_dates = store.get_completion_dates(
+                employee_id, start_date.isoformat(), end_date.isoformat())
+        observe_latency('state_store.recent_completions', time.perf_counter() - query_start)
+        return completion_dates
+
+    if not is_databricks_configured(config):
+        return {}
 
-        completion_table = f"{config['databricks_catalog']}.{config['databricks_schema']}.content_completion"
+    try:
+        connection = connect_databricks(config)
+
+        cursor = connection.cursor()
 
-        now_pt = datetime.now(PT)
-        start_date = (now_pt - timedelta(days=lookback_days - 1)).date()
-        end_date = now_pt.date()
+        completion_table = get_state_table_name(config, 'content_completion')
 
         query = f"""
-        SELECT DISTINCT content_id
+        SELECT content_id, MAX(completion_date)
         FROM {completion_table}
         WHERE ba_id = {employee_id}
             AND completion_date >= '{start_date}'
             AND completion_date <= '{end_date}'
+        GROUP BY content_id
         """
 
+        query_start = time.perf_counter()
         cursor.execute(query)
         rows = cursor.fetchall()
+        observe_latency('databricks.recent_completions', time.perf_counter() - query_start)
 
         cursor.close()
         connection.close()
 
-        recent_content_ids = set()
-        for row in rows:
-            content_id = int(row[0])
-            recent_content_ids.add(content_id)
+        completion_dates = {}
+        for content_id, completion_date in rows:
+            if hasattr(completion_date, 'isoformat'):
+                completion_date = completion_date.isoformat()
+            completion_dates[int(content_id)] = str(completion_date)
 
-        return recent_content_ids
+        return completion_dates
 
     except Exception as e:
-        return set()
+        increment_counter('errors.databricks_recent_completions')
+        return {}
 
 
-# =============================================================================
+# Employee IDs per IN (...) list in population-wide Databricks lookups
+RECENT_COMPLETIONS_QUERY_CHUNK = 1000
+
+
+def get_recent_completions_for_employees(config: Dict, employee_ids: List[int],
+                                         lookback_days: int = 13,
+                                         now: Optional[datetime] = None) -> pd.DataFrame:
+    """
+    Query content_completion for the training completed in the last N days by a whole
+    population, with one query per RECENT_COMPLETIONS_QUERY_CHUNK employees instead
+    of one per employee.
+
+    Args:
+        config: Configuration dictionary
+        employee_ids: Employee IDs (ba_id)
+        lookback_days: Number of days to look back (default: 13 = today + prior 12 days)
+        now: Timezone-aware reference time; the window ends on its PT date (default: current time)
+
+    Returns:
+        DataFrame with columns: ba_id, content_id (empty if Databricks is not configured)
+    """
+    import pandas as pd
+
+    now_pt = _now_pt(now)
+    start_date = (now_pt - timedelta(days=lookback_days - 1)).date()
+    end_date = now_pt.date()
+    empty = pd.DataFrame(columns=['ba_id', 'content_id'], dtype='int64')
+
+    if config['state_store_path']:
+        from simulation_state import LocalStateStore
+
+        query_start = time.perf_counter()
+        with LocalStateStore(config['state_store_path']) as store:
+            recent_df = store.get_recent_completions_table(
+                employee_ids, start_date.isoformat(), end_date.isoformat())
+        observe_latency('state_store.recent_completions_bulk', time.perf_counter() - query_start)
+        return recent_df
+
+    if not is_databricks_configured(config) or not employee_ids:
+        return empty
+
+    try:
+        connection = connect_databricks(config)
+        cursor = connection.cursor()
+        completion_table = get_state_table_name(config, 'content_completion')
+
+        rows = []
+        for start in range(0, len(employee_ids), RECENT_COMPLETIONS_QUERY_CHUNK):
+            chunk = employee_ids[start:start + RECENT_COMPLETIONS_QUERY_CHUNK]
+            employee_ids_str = ", ".join(str(int(emp_id)) for emp_id in chunk)
+
+            query = f"""
+            SELECT DISTINCT ba_id, content_id
+            FROM {completion_table}
+            WHERE ba_id IN ({employee_ids_str})
+                AND completion_date >= '{start_date}'
+                AND completion_date <= '{end_date}'
+            """
+
+            query_start = time.perf_counter()
+            cursor.execute(query)
+            rows.extend(cursor.fetchall())
+            observe_latency('databricks.recent_completions_bulk', time.perf_counter() - query_start)
+
+        cursor.close()
+        connection.close()
+
+        return pd.DataFrame([(int(ba_id), int(content_id)) for ba_id, content_id in rows],
+                            columns=['ba_id', 'content_id'], dtype='int64')
+
+    except Exception as e:
+        increment_counter('errors.databricks_recent_completions')
+        return empty
+
+
+def get_completion_dates_for_employees(config: Dict, employee_ids: List[int],
+                                       lookback_days: int = 13,
+                                       now: Optional[datetime] = None) -> pd.DataFrame:
+    """
+    Query content_completion for the latest completion date of each content a
+    whole population completed in the last N days, with one query per
+    RECENT_COMPLETIONS_QUERY_CHUNK employees instead of one per employee
+    (the population form of get_employee_completion_dates()).
+
+    Args:
+        config: Configuration dictionary
+        employee_ids: Employee IDs (ba_id)
+        lookback_days: Number of days to look back (default: 13 = today + prior 12 days)
+        now: Timezone-aware reference time; the window ends on its PT date (default: current time)
+
+    Returns:
+        DataFrame with columns: ba_id, content_id, completion_date (YYYY-MM-DD);
+        empty if Databricks is not configured
+    """
+    import pandas as pd
+
+    now_pt = _now_pt(now)
+    start_date = (now_pt - timedelta(days=lookback_days - 1)).date()
+    end_date = now_pt.date()
+    columns = ['ba_id', 'content_id', 'completion_date']
+    empty = pd.DataFrame(columns=columns)
+
+    if config['state_store_path']:
+        from simulation_state import LocalStateStore
+
+        query_start = time.perf_counter()
+        with LocalStateStore(config['state_store_path']) as store:
+            dates_df = store.get_completion_dates_table(
+                employee_ids, start_date.isoformat(), end_date.isoformat())
+        observe_latency('state_store.completion_dates_bulk', time.perf_counter() - query_start)
+        return dates_df
+
+    if not is_databricks_configured(config) or not employee_ids:
+        return empty
+
+    try:
+        connection = connect_databricks(config)
+        cursor = connection.cursor()
+        completion_table = get_state_table_name(config, 'content_completion')
+
+        rows = []
+        for start in range(0, len(employee_ids), RECENT_COMPLETIONS_QUERY_CHUNK):
+            chunk = employee_ids[start:start + RECENT_COMPLETIONS_QUERY_CHUNK]
+            employee_ids_str = ", ".join(str(int(emp_id)) for emp_id in chunk)
+
+            query = f"""
+            SELECT ba_id, content_id, MAX(completion_date)
+            FROM {completion_table}
+            WHERE ba_id IN ({employee_ids_str})
+                AND completion_date >= '{start_date}'
+                AND completion_date <= '{end_date}'
+            GROUP BY ba_id, content_id
+            """
+
+            query_start = time.perf_counter()
+            cursor.execute(query)
+            rows.extend(cursor.fetchall())
+            observe_latency('databricks.completion_dates_bulk', time.perf_counter() - query_start)
+
+        cursor.close()
+        connection.close()
+
+        return pd.DataFrame([(int(ba_id), int(content_id),
+                              completion_date.isoformat() if hasattr(completion_date, 'isoformat')
+                              else str(completion_date))
+                             for ba_id, content_id, completion_date in rows], columns=columns)
+
+    except Exception as e:
+        increment_counter('errors.databricks_recent_completions')
+        return empty
+
+
+def sync_local_state_store(config: Dict, full: bool = False, progress_callback=None) -> Dict:
+    """
+    Sync the local state mirror (STATE_STORE_PATH) from the warehouse.
+
+    A failed sync is reported and the existing mirror is used, so a run can
+    still proceed on slightly stale state when the warehouse is unavailable.
+
+    Args:
+        config: Configuration dictionary
+        full: Rebuild the mirror instead of fetching the delta
+        progress_callback: Optional callback function for progress updates
+
+    Returns:
+        Dictionary of {table: rows fetched}; empty if skipped or failed
+    """
+    from simulation_state import sync_state_store
+
+    try:
+        return sync_state_store(config, full, progress_callback)
+    except Exception as e:
+        increment_counter('errors.state_sync')
+        if progress_callback:
+            progress_callback(f"  Warning: State store sync failed, using existing mirror: {e}")
+        return {}
+
+
+# Ledger of write-backs already applied, one row per (run_id, table)
+WRITEBACK_RUNS_TABLE = "simulation_writeback_runs"
+
+# Written state tables: (columns, key columns, Databricks column types)
+WRITEBACK_TABLES = {
+    'content_completion': (
+        ['ba_id', 'content_id', 'completion_date'],
+        ['ba_id', 'content_id', 'completion_date'],
+        {'ba_id': 'INT', 'content_id': 'INT', 'completion_date': 'DATE'},
+    ),
+    'content_assignments': (
+        ['ba_id', 'content_id', 'assignment_date', 'update_date', 'assignment_begin_date',
+         'assignment_due_date', 'content_type'],
+        ['ba_id', 'content_id', 'assignment_date'],
+        {'ba_id': 'INT', 'content_id': 'INT', 'assignment_date': 'TIMESTAMP', 'update_date': 'DATE',
+         'assignment_begin_date': 'TIMESTAMP', 'assignment_due_date': 'TIMESTAMP',
+         'content_type': 'STRING'},
+    ),
+}
+
+
+def build_completion_state_rows(completions: List[Dict]) -> List[Tuple]:
+    """
+    Convert completion records to content_completion rows (ba_id, content_id, completion_date).
+
+    The completion date is the PT date of DateCompleted, matching the
+    recent-completion lookup. Duplicate rows are dropped.
+
+    Args:
+        completions: List of completion records
+
+    Returns:
+        List of unique row tuples
+    """
+    pt = get_pt_timezone()
+    rows = {}
+    for completion in completions:
+        completion_date = datetime.fromisoformat(completion['DateCompleted']).astimezone(pt).date()
+        row = (int(completion['UserId']), parse_content_id(completion['ContentId']), completion_date.isoformat())
+        rows[row] = row
+    return list(rows)
+
+
+def build_assignment_state_rows(assignments: List[Dict], clock: Optional[RunClock] = None) -> List[Tuple]:
+    """
+    Convert NonCompletedAssignments records to content_assignments rows.
+
+    Args:
+        assignments: List of assignment records (UserID, TrainingElementId, CreateDate_text, ...)
+        clock: Run clock stamping update_date (default: the current time)
+
+    Returns:
+        List of unique row tuples in WRITEBACK_TABLES['content_assignments'] column order
+    """
+    update_date = (clock.now if clock else _now_pt()).date().isoformat()
+    rows = {}
+    for assignment in assignments:
+        row = (int(assignment['UserID']), parse_content_id(assignment['TrainingElementId']),
+               assignment['CreateDate_text'], update_date,
+               assignment['Start_Date_text'], assignment['DueDate_text'],
+               assignment.get('ContentType', 'Media'))
+        rows[row[:3]] = row
+    return list(rows.values())
+
+
+def _sql_literal(value) -> str:
+    """Render a value as a SQL literal for multi-row VALUES lists."""
+    if value is None:
+        return "NULL"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _merge_rows_databricks(cursor, table_name: str, columns: List[str], keys: List[str],
+                           types: Dict, rows: List[Tuple]) -> None:
+    """Insert rows missing from a Delta table with one multi-row MERGE statement."""
+    values = ",\n".join("(" + ", ".join(_sql_literal(v) for v in row) + ")" for row in rows)
+    source_columns = ", ".join(f"CAST({c} AS {types[c]}) AS {c}" for c in columns)
+    match = " AND ".join(f"t.{k} = s.{k}" for k in keys)
+
+    cursor.execute(f"""
+    MERGE INTO {table_name} AS t
+    USING (
+        SELECT {source_columns}
+        FROM VALUES
+        {values}
+        AS v({', '.join(columns)})
+    ) AS s
+    ON {match}
+    WHEN NOT MATCHED THEN INSERT ({', '.join(columns)}) VALUES ({', '.join('s.' + c for c in columns)})
+    """)
+
+
+def _merge_rows_sqlite(cursor, table_name: str, columns: List[str], keys: List[str],
+                       rows: List[Tuple]) -> None:
+    """Insert rows missing from a SQLite table via a staging table (no MERGE in SQLite)."""
+    staging = f"writeback_staging_{table_name}"
+    cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS {staging} AS SELECT {', '.join(columns)} "
+                   f"FROM {table_name} WHERE 0")
+    cursor.execute(f"DELETE FROM {staging}")
+    cursor.executemany(f"INSERT INTO {staging} VALUES ({', '.join('?' for _ in columns)})", rows)
+
+    match = " AND ".join(f"t.{k} = s.{k}" for k in keys)
+    cursor.execute(f"""
+    INSERT INTO {table_name} ({', '.join(columns)})
+    SELECT {', '.join('s.' + c for c in columns)}
+    FROM {staging} s
+    WHERE NOT EXISTS (SELECT 1 FROM {table_name} t WHERE {match})
+    """)
+
+
+def write_back_run_state(config: Dict, run_id: str, completions: List[Dict],
+                         new_assignments: List[Dict], progress_callback=None,
+                         clock: Optional[RunClock] = None) -> Dict:
+    """
+    Bulk-load a run's completions and new manager assignments into the state tables.
+
+    Rows are written in batches of STATE_WRITEBACK_BATCH_SIZE with one
+    multi-row MERGE per batch (Databricks) or a staging-table INSERT ... SELECT
+    (SQLite stand-in / local mirror), inserting only rows whose key is not
+    present yet. Each finished table is recorded with the run ID in
+    simulation_writeback_runs; a repeated write-back of the same run skips it.
+
+    Target: the warehouse (or DATABRICKS_SQLITE_PATH stand-in) if configured,
+    otherwise the local state mirror (STATE_STORE_PATH) for offline runs.
+
+    Args:
+        config: Configuration dictionary
+        run_id: Run ID the write-back is keyed by
+        completions: Completion records of the run
+        new_assignments: Manager assignments created by the run
+        progress_callback: Optional callback function for progress updates
+        clock: Run clock of the run (default: the current time)
+
+    Returns:
+        Dictionary of {table: rows submitted}; tables already written for run_id are omitted
+
+    Raises:
+        RuntimeError: If no target is configured or the write fails
+    """
+    target_config = config
+    if not is_databricks_configured(config):
+        if not config['state_store_path']:
+            raise RuntimeError("State write-back needs Databricks or STATE_STORE_PATH configured")
+
+        from simulation_state import LocalStateStore
+
+        # Offline: write into the local mirror (created with the state tables if missing)
+        LocalStateStore(config['state_store_path']).close()
+        target_config = config.copy()
+        target_config['databricks_sqlite_path'] = config['state_store_path']
+
+    is_sqlite = bool(target_config.get('databricks_sqlite_path'))
+    connection = connect_databricks(target_config)
+
+    table_rows = {
+        'content_completion': build_completion_state_rows(completions),
+        'content_assignments': build_assignment_state_rows(new_assignments, clock),
+    }
+    batch_size = max(config['state_writeback_batch_size'], 1)
+    runs_table = get_state_table_name(target_config, WRITEBACK_RUNS_TABLE)
+    written = {}
+
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {runs_table} "
+                       f"(run_id STRING, table_name STRING, row_count INT, written_at TIMESTAMP)")
+        cursor.execute(f"SELECT table_name FROM {runs_table} WHERE run_id = {_sql_literal(run_id)}")
+        already_written = {row[0] for row in cursor.fetchall()}
+
+        for table, rows in table_rows.items():
+            if table in already_written:
+                if progress_callback:
+                    progress_callback(f"{table}: already written for run {run_id}, skipping")
+                continue
+
+            columns, keys, types = WRITEBACK_TABLES[table]
+            target_table = get_state_table_name(target_config, table)
+            write_start = time.perf_counter()
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                if is_sqlite:
+                    _merge_rows_sqlite(cursor, target_table, columns, keys, batch)
+                else:
+                    _merge_rows_databricks(cursor, target_table, columns, keys, types, batch)
+
+            written_at = datetime.now(get_utc_timezone()).isoformat()
+            cursor.execute(f"INSERT INTO {runs_table} VALUES ({_sql_literal(run_id)}, {_sql_literal(table)}, "
+                           f"{len(rows)}, {_sql_literal(written_at) if is_sqlite else 'current_timestamp()'})")
+            if is_sqlite:
+                connection.commit()
+
+            observe_latency(f'databricks.writeback.{table}', time.perf_counter() - write_start)
+            increment_counter(f'rows.writeback_{table}', len(rows))
+            written[table] = len(rows)
+
+            if progress_callback:
+                progress_callback(f"{table}: wrote {len(rows)} row(s) for run {run_id}")
+
+        cursor.close()
+        return written
+
+    except Exception as e:
+        increment_counter('errors.state_writeback')
+        raise RuntimeError(f"State write-back failed: {str(e)}") from e
+
+    finally:
+        connection.close()
+
+
+# =============================================================================
 # API CALLS
 # =============================================================================
 
-def get_training_recommendations(config: Dict, employee_id: int,
-                                progress_callback=None) -> List[Dict]:
+def _disable_insecure_request_warnings() -> None:
+    """Disable SSL warnings when ignoring certificate verification."""
+    import urllib3
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+
+def get_training_recommendations(config: Dict, employee_id: int,
+                                progress_callback=None) -> List[TrainingItem]:
+    """
+    Call the ML Training Recommender API for a given employee.
+
+    Args:
+        config: Configuration dictionary
+        employee_id: The employee's ID (ba_id)
+        progress_callback: Optional callback function for progress updates
+
+    Returns:
+        List of TrainingItem with source 'ai'; entries without a usable
+        recommended_content_id are skipped
+    """
+    # Fan-out runs share one fetch per (API URL, employee), see simulation_fanout.py
+    cache = config.get('recommendation_cache')
+
+    try:
+        if cache is None:
+            return _request_training_recommendations(config, employee_id, progress_callback)
+        url = f"{config['api_base_url']}{config['api_endpoint']}"
+        return cache.get_or_fetch(
+            (url, employee_id),
+            lambda: _request_training_recommendations(config, employee_id, progress_callback))
+
+    except Exception as e:
+        increment_counter('errors.recommender')
+        if progress_callback:
+            progress_callback(f"Error fetching recommendations for employee {employee_id}: {e}")
+        return []
+
+
+def _request_training_recommendations(config: Dict, employee_id: int,
+                                      progress_callback=None) -> List[TrainingItem]:
+    """get_training_recommendations() without the error handling: raises if the call fails."""
+    import requests
+
+    _disable_insecure_request_warnings()
+
+    url = f"{config['api_base_url']}{config['api_endpoint']}"
+    payload = {"data": {"ba_id": employee_id}}
+
+    if progress_callback:
+        progress_callback(f"Calling ML Reco API for employee {employee_id}...")
+
+    request_start = time.perf_counter()
+    try:
+        response = requests.post(url, json=payload, timeout=config['api_timeout'], verify=False)
+    finally:
+        observe_latency('recommender.request', time.perf_counter() - request_start)
+    response.raise_for_status()
+    data = response.json()
+
+    # Parse response structure
+    if isinstance(data, dict):
+        response_data = data.get("response", {})
+        if isinstance(response_data, dict):
+            recommendations = response_data.get("ml_recommendations", [])
+        else:
+            recommendations = response_data if isinstance(response_data, list) else []
+    else:
+        recommendations = []
+
+    return _read_recommendations(recommendations, progress_callback)
+
+
+def _read_recommendations(recommendations, progress_callback=None) -> List[TrainingItem]:
+    """Validate one employee's ml_recommendations list and report it."""
+    # Validate once here; process_employee() relies on well-formed items
+    recommendations, invalid = parse_recommendations(
+        recommendations if isinstance(recommendations, list) else [])
+
+    increment_counter('rows.recommendations_received', len(recommendations))
+    if invalid:
+        increment_counter('errors.invalid_recommendations', len(invalid))
+        if progress_callback:
+            for message in invalid:
+                progress_callback(f"  Warning: Skipping {message}")
+
+    # Output recommendations summary
+    if progress_callback:
+        if not recommendations:
+            progress_callback("  no ML recommendations returned")
+        else:
+            course_ids = [str(rec.recommended_content_id) for rec in recommendations]
+            course_ids_str = ", ".join(course_ids)
+            progress_callback(f"  {len(recommendations)} ML recommendation(s): {course_ids_str}")
+
+    return recommendations
+
+
+def is_recommender_prefetch_enabled(config: Dict) -> bool:
+    """
+    True if recommendations are fetched for the whole population up front
+    (RECOMMENDER_BATCH_SIZE or RECOMMENDER_CONCURRENCY above 1) instead of
+    one employee at a time.
+    """
+    return config['recommender_batch_size'] > 1 or config['recommender_concurrency'] > 1
+
+
+def get_training_recommendations_batch(config: Dict, employee_ids: List[int],
+                                       progress_callback=None) -> Dict[int, List[TrainingItem]]:
+    """
+    Call the ML Training Recommender API for many employees,
+    RECOMMENDER_BATCH_SIZE ba_ids per request and up to
+    RECOMMENDER_CONCURRENCY requests in flight.
+
+    A batch request sends {"data": {"ba_ids": [...]}} and expects
+    {"response": {"results": [{"ba_id": ..., "ml_recommendations": [...]}, ...]}}.
+    Employees are fetched one request each (get_training_recommendations())
+    when the batch size is 1, when a batch still fails after its retries, or
+    when a batch response leaves them out. If the endpoint rejects batches
+    (HTTP 400/404/405/413/415/422 or a response without results), the
+    remaining employees are fetched one request each too. Throttling and
+    transient errors (HTTP 408/429/5xx, network errors) are retried with
+    backoff and never turn batches off.
+
+    Args:
+        config: Configuration dictionary
+        employee_ids: Employee IDs (ba_id); duplicates are fetched once
+        progress_callback: Optional callback function for progress updates
+
+    Returns:
+        {employee_id: list of TrainingItem with source 'ai'} for every employee
+    """
+    employee_ids = list(dict.fromkeys(int(employee_id) for employee_id in employee_ids))
+    batch_size = config['recommender_batch_size']
+
+    # Fan-out runs share one fetch per (API URL, employee), see simulation_fanout.py
+    cache = config.get('recommendation_cache')
+    if cache is not None:
+        url = f"{config['api_base_url']}{config['api_endpoint']}"
+        uncached_config = dict(config, recommendation_cache=None)
+        cached = cache.get_or_fetch_many(
+            [(url, employee_id) for employee_id in employee_ids],
+            lambda keys: {(url, employee_id): recommendations for employee_id, recommendations in
+                          get_training_recommendations_batch(
+                              uncached_config, [employee_id for _, employee_id in keys],
+                              progress_callback).items()})
+        return {employee_id: cached[(url, employee_id)] for employee_id in employee_ids}
+
+    # Written from pool threads with RECOMMENDER_CONCURRENCY > 1
+    batches_supported = batch_size > 1
+    batches_lock = threading.Lock()
+
+    def fetch_chunk(batch: List[int]) -> Dict[int, List[TrainingItem]]:
+        nonlocal batches_supported
+
+        chunk_recommendations = {}
+        with batches_lock:
+            send_batch = batches_supported
+        if send_batch:
+            try:
+                batch_recommendations = _request_recommendation_batch(config, batch, progress_callback)
+            except Exception as e:
+                # Failed after its retries: this chunk goes one request per employee
+                increment_counter('errors.recommender')
+                if progress_callback:
+                    progress_callback(f"Error fetching recommendations for {len(batch)} employee(s): {e}")
+                batch_recommendations = {}
+
+            if batch_recommendations is None:
+                with batches_lock:
+                    first_rejection, batches_supported = batches_supported, False
+                if first_rejection:
+                    increment_counter('errors.recommender_batch_rejected')
+                    if progress_callback:
+                        progress_callback("Recommender does not accept batch requests; "
+                                          "falling back to one request per employee")
+            else:
+                chunk_recommendations.update(batch_recommendations)
+
+        for employee_id in batch:
+            if employee_id not in chunk_recommendations:
+                chunk_recommendations[employee_id] = get_training_recommendations(
+                    config, employee_id, progress_callback)
+        return chunk_recommendations
+
+    chunk_size = max(batch_size, 1)
+    chunks = [employee_ids[start:start + chunk_size] for start in range(0, len(employee_ids), chunk_size)]
+
+    # The first chunk goes alone: it finds out whether the endpoint takes batches
+    recommendations = fetch_chunk(chunks[0]) if chunks else {}
+
+    concurrency = config['recommender_concurrency']
+    if concurrency > 1 and len(chunks) > 1:
+        # Pool threads record into the caller's run metrics
+        metrics = get_run_metrics()
+
+        def fetch_chunk_in_run(batch: List[int]) -> Dict[int, List[TrainingItem]]:
+            with activate_run_metrics(metrics):
+                return fetch_chunk(batch)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for chunk_recommendations in executor.map(fetch_chunk_in_run, chunks[1:]):
+                recommendations.update(chunk_recommendations)
+    else:
+        for batch in chunks[1:]:
+            recommendations.update(fetch_chunk(batch))
+
+    return {employee_id: recommendations[employee_id] for employee_id in employee_ids}
+
+
+# HTTP statuses meaning "this endpoint does not take batch requests"
+RECOMMENDER_BATCH_REJECTED_STATUSES = (400, 404, 405, 413, 415, 422)
+
+# Throttled or transient: retried (with 5xx) after a backoff or the Retry-After delay
+RECOMMENDER_BATCH_RETRY_STATUSES = (408, 429)
+RECOMMENDER_BATCH_RETRIES = 3
+RECOMMENDER_BATCH_RETRY_DELAY_SECONDS = 1.0
+RECOMMENDER_BATCH_MAX_RETRY_DELAY_SECONDS = 60.0
+
+
+def _retry_after_seconds(response) -> Optional[float]:
+    """Delay asked for by a Retry-After header in seconds, or None (absent or an HTTP date)."""
+    try:
+        return max(float(response.headers.get('Retry-After', '')), 0.0)
+    except ValueError:
+        return None
+
+
+def _request_recommendation_batch(config: Dict, employee_ids: List[int],
+                                  progress_callback=None) -> Optional[Dict[int, List[TrainingItem]]]:
+    """
+    Send one batch request, retrying throttled and transient failures.
+
+    Returns:
+        {employee_id: recommendations} for the employees in the response, or
+        None if the endpoint rejected the batch
+        (RECOMMENDER_BATCH_REJECTED_STATUSES, or a body without a results list)
+
+    Raises:
+        Exception: If the request still fails after RECOMMENDER_BATCH_RETRIES
+                   retries (HTTP 408/429/5xx, connection error, timeout), or
+                   fails with another status (e.g. HTTP 401)
+    """
+    import requests
+
+    _disable_insecure_request_warnings()
+
+    url = f"{config['api_base_url']}{config['api_endpoint']}"
+    payload = {"data": {"ba_ids": employee_ids}}
+
+    if progress_callback:
+        progress_callback(f"Calling ML Reco API for {len(employee_ids)} employee(s)...")
+
+    for attempt in range(RECOMMENDER_BATCH_RETRIES + 1):
+        retry_after = None
+        request_start = time.perf_counter()
+        try:
+            response = requests.post(url, json=payload, timeout=config['api_timeout'], verify=False)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == RECOMMENDER_BATCH_RETRIES:
+                raise
+            error = e
+        else:
+            if response.status_code in RECOMMENDER_BATCH_REJECTED_STATUSES:
+                return None
+            if response.status_code not in RECOMMENDER_BATCH_RETRY_STATUSES and response.status_code < 500:
+                break
+            if attempt == RECOMMENDER_BATCH_RETRIES:
+                response.raise_for_status()
+            error = f"HTTP {response.status_code}"
+            retry_after = _retry_after_seconds(response)
+        finally:
+            observe_latency('recommender.batch_request', time.perf_counter() - request_start)
+
+        delay = min(retry_after if retry_after is not None
+                    else RECOMMENDER_BATCH_RETRY_DELAY_SECONDS * 2 ** attempt,
+                    RECOMMENDER_BATCH_MAX_RETRY_DELAY_SECONDS)
+        increment_counter('retries.recommender_batch')
+        if progress_callback:
+            progress_callback(f"  Batch request failed ({error}); retrying in {delay:g}s")
+        time.sleep(delay)
+
+    response.raise_for_status()
+    try:
+        data = response.json()
+    except ValueError:
+        return None
+
+    response_data = data.get("response") if isinstance(data, dict) else None
+    results = response_data.get("results") if isinstance(response_data, dict) else None
+    if not isinstance(results, list):
+        return None
+
+    requested = set(employee_ids)
+    recommendations = {}
+    for entry in results:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            employee_id = int(entry.get("ba_id"))
+        except (TypeError, ValueError):
+            continue
+        if employee_id in requested:
+            if progress_callback:
+                progress_callback(f"Employee {employee_id}:")
+            recommendations[employee_id] = _read_recommendations(
+                entry.get("ml_recommendations", []), progress_callback)
+    return recommendations
+
+
+# =============================================================================
+# RECOMMENDER PROBE
+# =============================================================================
+
+# Concurrency levels tried by probe_recommender(), up to the requested maximum
+PROBE_CONCURRENCY_LEVELS = [1, 2, 4, 8, 16, 32, 64]
+
+# A concurrency level is acceptable up to this error rate...
+PROBE_MAX_ERROR_RATE = 0.01
+
+# ...and while its p90 latency stays within this multiple of the 1-request p90
+PROBE_MAX_LATENCY_FACTOR = 2.0
+
+
+def parse_employee_id_list(text: str) -> List[int]:
+    """
+    Parse employee IDs pasted as text (separated by commas, spaces or newlines).
+
+    Raises:
+        ValueError: If an entry is not an integer
+    """
+    employee_ids = []
+    for token in re.split(r'[\s,;]+', text or ""):
+        if not token:
+            continue
+        try:
+            employee_ids.append(int(token))
+        except ValueError:
+            raise ValueError(f"Invalid employee ID: {token!r}") from None
+    return employee_ids
+
+
+def sample_probe_employee_ids(employees_file: str, count: int, seed: Optional[int] = None) -> List[int]:
+    """Draw up to count distinct employee IDs from an employees CSV file."""
+    employees_df, _ = load_and_filter_employees(employees_file)
+    employee_ids = list(dict.fromkeys(int(employee_id) for employee_id in employees_df['employee_id']))
+    if len(employee_ids) <= count:
+        return employee_ids
+    return random.Random(seed).sample(employee_ids, count)
+
+
+def _latency_percentile(sorted_ms: List[float], fraction: float) -> Optional[float]:
+    # Nearest-rank percentile of exact samples
+    if not sorted_ms:
+        return None
+    return sorted_ms[min(len(sorted_ms) - 1, max(0, int(round(fraction * len(sorted_ms))) - 1))]
+
+
+def _probe_level(config: Dict, employee_ids: List[int], request_count: int, concurrency: int) -> Dict:
+    """Send request_count requests with concurrency requests in flight."""
+    import requests
+
+    latencies_ms = []
+    errors = {}
+    lock = threading.Lock()
+
+    def send(index: int) -> None:
+        employee_id = employee_ids[index % len(employee_ids)]
+        request_start = time.perf_counter()
+        try:
+            _request_training_recommendations(config, employee_id)
+            error = None
+        except requests.HTTPError as e:
+            error = f"HTTP {e.response.status_code}" if e.response is not None else "HTTP error"
+        except Exception as e:
+            error = type(e).__name__
+        elapsed_ms = (time.perf_counter() - request_start) * 1000.0
+
+        with lock:
+            latencies_ms.append(elapsed_ms)
+            if error:
+                errors[error] = errors.get(error, 0) + 1
+
+    level_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, range(request_count)))
+    wall_seconds = time.perf_counter() - level_start
+
+    latencies_ms.sort()
+    error_count = sum(errors.values())
+    return {
+        'concurrency': concurrency,
+        'requests': request_count,
+        'errors': error_count,
+        'error_rate': error_count / request_count,
+        'error_types': errors,
+        'wall_seconds': wall_seconds,
+        'throughput_rps': request_count / wall_seconds if wall_seconds > 0 else None,
+        'mean_ms': sum(latencies_ms) / len(latencies_ms),
+        'p50_ms': _latency_percentile(latencies_ms, 0.50),
+        'p90_ms': _latency_percentile(latencies_ms, 0.90),
+        'p99_ms': _latency_percentile(latencies_ms, 0.99),
+        'max_ms': latencies_ms[-1],
+    }
+
+
+def recommend_probe_concurrency(levels: List[Dict]) -> int:
+    """
+    Pick the concurrency for the main run from probe levels: the highest
+    throughput among levels within PROBE_MAX_ERROR_RATE whose p90 latency
+    stays within PROBE_MAX_LATENCY_FACTOR of the lowest level's (1 if none).
+    """
+    if not levels:
+        return 1
+    baseline_p90 = levels[0]['p90_ms']
+    acceptable = [level for level in levels
+                  if level['error_rate'] <= PROBE_MAX_ERROR_RATE
+                  and level['p90_ms'] <= baseline_p90 * PROBE_MAX_LATENCY_FACTOR]
+    if not acceptable:
+        return 1
+    # Lower concurrency wins ties
+    return max(acceptable, key=lambda level: (level['throughput_rps'] or 0, -level['concurrency']))['concurrency']
+
+
+def probe_recommender(config: Dict, employee_ids: List[int], request_count: int = 100,
+                      max_concurrency: int = 16, progress_callback=None) -> Dict:
+    """
+    Measure whether the ML Training Recommender API keeps up with a big run.
+
+    Sends request_count single-employee requests at each concurrency level of
+    PROBE_CONCURRENCY_LEVELS up to max_concurrency (and max_concurrency
+    itself), cycling through employee_ids, and measures every request.
+
+    Args:
+        config: Configuration dictionary
+        employee_ids: Employee IDs to request (sampled from a file or pasted)
+        request_count: Requests per concurrency level
+        max_concurrency: Highest number of requests in flight
+        progress_callback: Optional callback function for progress updates
+
+    Returns:
+        Dictionary with url, employee_count, levels (per level: concurrency,
+        requests, errors, error_rate, error_types, wall_seconds,
+        throughput_rps, mean_ms, p50_ms, p90_ms, p99_ms, max_ms) and
+        recommended_concurrency (for RECOMMENDER_CONCURRENCY)
+
+    Raises:
+        ValueError: If there are no employee IDs or the counts are not positive
+    """
+    if not employee_ids:
+        raise ValueError("No employee IDs to probe with")
+    if request_count < 1 or max_concurrency < 1:
+        raise ValueError("request_count and max_concurrency must be at least 1")
+
+    concurrency_levels = [level for level in PROBE_CONCURRENCY_LEVELS if level < max_concurrency]
+    concurrency_levels.append(max_concurrency)
+
+    levels = []
+    for concurrency in concurrency_levels:
+        if progress_callback:
+            progress_callback(f"Probing: {request_count} request(s) at concurrency {concurrency}...")
+        level = _probe_level(config, employee_ids, request_count, concurrency)
+        levels.append(level)
+        if progress_callback:
+            progress_callback(f"  {level['throughput_rps']:.1f} req/s, p50 {level['p50_ms']:.0f}ms, "
+                              f"p90 {level['p90_ms']:.0f}ms, p99 {level['p99_ms']:.0f}ms, "
+                              f"{level['error_rate']:.1%} errors")
+
+    return {
+        'url': f"{config['api_base_url']}{config['api_endpoint']}",
+        'employee_count': len(employee_ids),
+        'levels': levels,
+        'recommended_concurrency': recommend_probe_concurrency(levels),
+    }
+
+
+def format_probe_report(report: Dict) -> str:
+    """Render a probe_recommender() report as a text table."""
+    lines = [
+        f"Recommender probe: {report['url']} ({report['employee_count']} employee ID(s))",
+        "",
+        f"{'concurrency':>11} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p90 ms':>8} "
+        f"{'p99 ms':>8} {'max ms':>8} {'errors':>8}",
+        "-" * 76,
+    ]
+    for level in report['levels']:
+        lines.append(f"{level['concurrency']:>11} {level['requests']:>9} {level['throughput_rps'] or 0:>8.1f} "
+                     f"{level['p50_ms']:>8.0f} {level['p90_ms']:>8.0f} {level['p99_ms']:>8.0f} "
+                     f"{level['max_ms']:>8.0f} {level['error_rate']:>8.1%}")
+        if level['error_types']:
+            lines.append(" " * 12 + ", ".join(f"{error}: {count}" for error, count
+                                              in sorted(level['error_types'].items())))
+
+    recommended = report['recommended_concurrency']
+    best = next(level for level in report['levels'] if level['concurrency'] == recommended)
+    lines.append("")
+    if best['error_rate'] > PROBE_MAX_ERROR_RATE:
+        lines.append(f"No level stayed within {PROBE_MAX_ERROR_RATE:.0%} errors; "
+                     f"fix the endpoint errors before a big run (keep RECOMMENDER_CONCURRENCY=1)")
+    else:
+        lines.append(f"Recommended RECOMMENDER_CONCURRENCY={recommended} "
+                     f"(~{best['throughput_rps'] or 0:.0f} req/s, p90 {best['p90_ms']:.0f}ms)")
+    return "\n".join(lines)
+
+
+# =============================================================================
+# EMPLOYEE PROCESSING
+# =============================================================================
+
+def process_employee(config: Dict, employee_id: int, employee_type: str,
+                    manager_assignments: List[TrainingItem], ai_recommendations: List[TrainingItem],
+                    standalone_df: pd.DataFrame, progress_callback=None,
+                    recent_completions: Optional[set] = None,
+                    now: Optional[datetime] = None,
+                    clock: Optional[RunClock] = None,
+                    catalog_index: Optional[CourseCatalogIndex] = None) -> List[CompletionRecord]:
+    """
+    Process a single employee: combine manager assignments and AI recommendations,
+    filter recent completions, then simulate completions based on employee type.
+
+    Args:
+        config: Configuration dictionary
+        employee_id: The employee's ID
+        employee_type: The employee's type (a, b, or f)
+        manager_assignments: Manager-assigned training (build_manager_training())
+        ai_recommendations: AI-recommended training (get_training_recommendations())
+        standalone_df: DataFrame containing standalone content for lookups
+        progress_callback: Optional callback function for progress updates
+        recent_completions: Content IDs completed in the last 13 days; queried
+                            from content_completion when None
+        now: Timezone-aware simulated time (default: current time)
+        clock: Run clock; takes precedence over now
+        catalog_index: CourseCatalog index; AI recommendations missing from the
+                       catalog are flagged (reported and counted, still completed)
+
+    Returns:
+        List of CompletionRecord with UTC timestamps
+    """
+    employee_type = employee_type.lower().strip()
+    if clock:
+        now = clock.now
+
+    if catalog_index is not None and ai_recommendations:
+        flag_unknown_recommendations(catalog_index, ai_recommendations, progress_callback)
+
+    # Check for recently completed training (last 13 days)
+    # This ONLY applies to AI recommendations, NOT to manager assignments
+    if recent_completions is None:
+        recent_completions = get_employee_recent_completions(config, employee_id, lookback_days=13, now=now)
+
+    filtered_ai_recommendations = []
+
+    if ai_recommendations:
+        if recent_completions:
+            filtered_ai_recommendations = [rec for rec in ai_recommendations
+                                           if rec.recommended_content_id not in recent_completions]
+        else:
+            filtered_ai_recommendations = ai_recommendations
+
+    # Combine manager assignments (unfiltered) with filtered AI recommendations
+    all_training = manager_assignments + filtered_ai_recommendations
+
+    if not all_training:
+        return []
+
+    # Determine how many courses to complete based on employee type
+    if employee_type == 'a':
+        courses_to_complete = all_training
+    elif employee_type == 'b':
+        courses_to_complete = all_training[:1]
+    else:  # Type F
+        courses_to_complete = []
+
+    # Generate completion records
+    if clock:
+        times = clock.training_times(len(courses_to_complete))
+    else:
+        times = generate_training_times(len(courses_to_complete), now)
+
+    return [CompletionRecord(employee_id, format_content_id(course.recommended_content_id),
+                             start_time, end_time, course.recommended_content, course.source)
+            for course, (start_time, end_time) in zip(courses_to_complete, times)]
+
+
+def flag_unknown_recommendations(catalog_index: CourseCatalogIndex, recommendations: List[TrainingItem],
+                                 progress_callback=None) -> List[int]:
+    """
+    Report AI recommendations whose content is not in the CourseCatalog.
+
+    Returns:
+        Unknown content IDs, in recommendation order
+    """
+    known = catalog_index.contains([rec.recommended_content_id for rec in recommendations])
+    unknown = [rec.recommended_content_id for rec, is_known in zip(recommendations, known) if not is_known]
+    if unknown:
+        increment_counter('rows.unknown_recommended_content', len(unknown))
+        if progress_callback:
+            progress_callback(f"  Warning: recommended content not in CourseCatalog: "
+                              f"{', '.join(str(content_id) for content_id in unknown)}")
+    return unknown
+
+
+def open_course_catalog_index(course_catalog_path: str, progress_callback=None) -> Optional[CourseCatalogIndex]:
+    """
+    Open (building if needed) the index of the downloaded CourseCatalog file.
+
+    Returns:
+        The index, or None if the catalog cannot be indexed (recommendations
+        then go unchecked)
+    """
+    from simulation_catalog import CourseCatalogIndex
+
+    try:
+        catalog_index = CourseCatalogIndex.open(course_catalog_path)
+    except (OSError, ValueError) as e:
+        increment_counter('errors.catalog_index')
+        if progress_callback:
+            progress_callback(f"  Warning: Could not index {os.path.basename(course_catalog_path)}: {e}")
+        return None
+
+    increment_counter('rows.catalog_content_ids', len(catalog_index))
+    if progress_callback:
+        progress_callback(f"Indexed CourseCatalog: {len(catalog_index)} content ID(s)")
+    return catalog_index
+
+
+def get_manager_assignments_for_employee(employee_id: int, assignments_path: str,
+                                        standalone_df: pd.DataFrame,
+                                        catalog_index: Optional[CourseCatalogIndex] = None) -> List[TrainingItem]:
+    """
+    Get manager assignments for a specific employee from NonCompletedAssignments file.
+
+    Args:
+        employee_id: The employee's ID
+        assignments_path: Path to the NonCompletedAssignments CSV file
+        standalone_df: DataFrame containing standalone content for content name lookups
+        catalog_index: CourseCatalog index used to name content missing from CONTENT_NAME_LOOKUP
+
+    Returns:
+        List of TrainingItem with source 'manager'
+    """
+    import pandas as pd
+
+    manager_assignments = []
+
+    if not os.path.exists(assignments_path):
+        return manager_assignments
+
+    assignments_df = pd.read_csv(assignments_path)
+    assignments_df['UserID'] = assignments_df['UserID'].astype(int)
+    employee_assignments = assignments_df[assignments_df['UserID'] == employee_id]
+
+    for content_id in parse_content_ids(employee_assignments['TrainingElementId']).tolist():
+        manager_assignments.append(build_manager_training(content_id, catalog_index))
+
+    return manager_assignments
+
+
+def build_manager_training(training_element_id,
+                           catalog_index: Optional[CourseCatalogIndex] = None) -> TrainingItem:
+    """
+    Convert an assignment's TrainingElementId into the training record used by process_employee.
+
+    Args:
+        training_element_id: Content ID, numeric or comma-formatted ("1,915,085")
+        catalog_index: CourseCatalog index used to name content missing from CONTENT_NAME_LOOKUP
+
+    Returns:
+        TrainingItem with source 'manager'
+    """
+    content_id_numeric = parse_content_id(training_element_id)
+    return TrainingItem(content_id_numeric, get_content_name(content_id_numeric, catalog_index), "manager")
+
+
+def get_content_name(content_id: int, catalog_index: Optional[CourseCatalogIndex] = None) -> str:
+    """
+    Course name of a content ID: its CONTENT_NAME_LOOKUP name, else its
+    CourseCatalog title, else "Training Content <id>".
+
+    Args:
+        content_id: Numeric content ID
+        catalog_index: CourseCatalog index (optional)
+
+    Returns:
+        Course name
+    """
+    content_id_no_commas = str(content_id)
+    content_name = CONTENT_NAME_LOOKUP.get(content_id_no_commas)
+    if content_name:
+        return content_name
+
+    if catalog_index is not None:
+        entry = catalog_index.get(content_id)
+        if entry is not None and entry.name:
+            return entry.name
+
+    return f"Training Content {content_id_no_commas}"
+
+
+# =============================================================================
+# FILE GENERATION
+# =============================================================================
+
+def write_content_user_completion_file(completions: List[Dict], output_dir: str,
+                                       now: Optional[datetime] = None, max_rows: int = 0,
+                                       max_bytes: int = 0, workers: int = 0) -> str:
+    """
+    Write ContentUserCompletion CSV file.
+
+    Args:
+        completions: List of completion records
+        output_dir: Output directory path
+        now: Timezone-aware time used for the filename (default: current time)
+        max_rows: Split into parts of at most this many rows (0 = no limit)
+        max_bytes: Split into parts of at most this many bytes (0 = no limit)
+        workers: Threads writing parts (0 = one per CPU core)
+
+    Returns:
+        Path to the generated file, or to the shard manifest if max_rows or max_bytes is set
+    """
+    import pandas as pd
+
+    output_filename = generate_output_filename(now)
+    output_path = os.path.join(output_dir, output_filename)
+
+    output_df = pd.DataFrame(completions)
+    output_df = output_df[['UserId', 'ContentId', 'DateStarted', 'DateCompleted']]
+    if max_rows > 0 or max_bytes > 0:
+        output_path = write_csv_shards(output_df, output_path, max_rows, max_bytes, workers,
+                                       file_type='ContentUserCompletion')
+    else:
+        output_df.to_csv(output_path, index=False, quoting=1)
+
+    increment_counter('rows.content_user_completion_written', len(output_df))
+    increment_counter('bytes.content_user_completion_written', get_output_size(output_path))
+
+    return output_path
+
+
+def write_non_completed_assignments_file(assignments: List[Dict], output_dir: str,
+                                         now: Optional[datetime] = None, max_rows: int = 0,
+                                         max_bytes: int = 0, workers: int = 0) -> str:
+    """
+    Write NonCompletedAssignments CSV file.
+
+    Args:
+        assignments: List of assignment records
+        output_dir: Output directory path
+        now: Timezone-aware time used for the filename (default: current time)
+        max_rows: Split into parts of at most this many rows (0 = no limit)
+        max_bytes: Split into parts of at most this many bytes (0 = no limit)
+        workers: Threads writing parts (0 = one per CPU core)
+
+    Returns:
+        Path to the generated file, or to the shard manifest if max_rows or max_bytes is set
+    """
+    import pandas as pd
+
+    assignments_filename = generate_non_completed_assignments_filename(now)
+    assignments_path = os.path.join(output_dir, assignments_filename)
+
+    assignments_df = pd.DataFrame(assignments)
+    if max_rows > 0 or max_bytes > 0:
+        assignments_path = write_csv_shards(assignments_df, assignments_path, max_rows, max_bytes, workers,
+                                            file_type='NonCompletedAssignments')
+    else:
+        assignments_df.to_csv(assignments_path, index=False, quoting=1)
+
+    increment_counter('rows.non_completed_assignments_written', len(assignments_df))
+
+    return assignments_path
+
+
+def update_non_completed_assignments_file(assignments_path: str,
+                                         completions: List[Dict]) -> Tuple[int, int]:
+    """
+    Update NonCompletedAssignments file to remove completed training.
+
+    Args:
+        assignments_path: Path to the NonCompletedAssignments CSV file
+        completions: List of completion records
+
+    Returns:
+        Tuple of (initial_count, removed_count)
+    """
+    import pandas as pd
+
+    if not os.path.exists(assignments_path):
+        return (0, 0)
+
+    assignments_df = pd.read_csv(assignments_path)
+    initial_count = len(assignments_df)
+
+    # Completed (UserID, ContentID) pairs as packed int64 keys
+    completed = PairKeyIndex.from_arrays([completion['UserId'] for completion in completions],
+                                         [completion['ContentId'] for completion in completions])
+
+    # Filter out completed assignments
+    is_completed = completed.isin(assignments_df['UserID'], assignments_df['TrainingElementId'])
+    remaining_assignments_df = assignments_df[~is_completed].copy()
+    removed_count = initial_count - len(remaining_assignments_df)
+
+    # Overwrite the file
+    remaining_assignments_df.to_csv(assignments_path, index=False, quoting=1)
+
+    increment_counter('rows.completed_assignments_removed', removed_count)
+    increment_counter('bytes.non_completed_assignments_written', os.path.getsize(assignments_path))
+
+    return (initial_count, removed_count)
+
+
+# =============================================================================
+# OUTPUT SHARDING
+# =============================================================================
+
+# A sharded output is a set of parts numbered in the file name's sequence slot
+# (..._1_<suffix>.csv, ..._2_<suffix>.csv, ...) plus <part 1 name>.manifest.json
+SHARD_MANIFEST_SUFFIX = ".manifest.json"
+
+_SEQUENCE_SLOT = re.compile(r'_1_([^_]+)\.csv$')
+
+
+def is_output_sharding_enabled(config: Dict) -> bool:
+    """True if OUTPUT_SHARD_MAX_ROWS or OUTPUT_SHARD_MAX_BYTES is set."""
+    return config.get('output_shard_max_rows', 0) > 0 or config.get('output_shard_max_bytes', 0) > 0
+
+
+def get_shard_settings(config: Dict) -> Dict:
+    """Writer keyword arguments (max_rows, max_bytes, workers) from the OUTPUT_SHARD_* settings."""
+    return {
+        'max_rows': config.get('output_shard_max_rows', 0),
+        'max_bytes': config.get('output_shard_max_bytes', 0),
+        'workers': config.get('output_shard_workers', 0),
+    }
+
+
+def is_shard_manifest(path: Optional[str]) -> bool:
+    """True if the path names a shard manifest."""
+    return bool(path) and path.endswith(SHARD_MANIFEST_SUFFIX)
+
+
+def shard_filename(filename: str, sequence: int) -> str:
+    """
+    Name of part `sequence` of an output: the file name's _1_ sequence slot is
+    replaced with the part number.
+    Example: ContentUserCompletion_V2_2025_01_14_1_131500.csv, 2 ->
+             ContentUserCompletion_V2_2025_01_14_2_131500.csv
+
+    Raises:
+        ValueError: If the file name has no _1_<suffix>.csv sequence slot
+    """
+    match = _SEQUENCE_SLOT.search(filename)
+    if not match:
+        raise ValueError(f"File name has no _1_ sequence slot: {filename}")
+    return f"{filename[:match.start()]}_{sequence}_{match.group(1)}.csv"
+
+
+def _csv_row_bytes(df: pd.DataFrame) -> np.ndarray:
+    """
+    Size in bytes of each row as to_csv(index=False, quoting=QUOTE_ALL) writes it:
+    every field quoted (embedded quotes doubled), comma-separated, one newline.
+    """
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    sizes = np.full(len(df), len(df.columns), dtype=np.int64)  # commas + newline
+    for column in df.columns:
+        values = df[column]
+        text = pa.array(values.astype(str).where(values.notna(), ''), type=pa.string())
+        sizes += pc.binary_length(text).to_numpy(zero_copy_only=False) + 2
+        sizes += pc.count_substring(text, '"').to_numpy(zero_copy_only=False)
+    return sizes
+
+
+def plan_csv_shards(df: pd.DataFrame, max_rows: int = 0, max_bytes: int = 0) -> List[Tuple[int, int]]:
+    """
+    Split a table into consecutive row ranges for the shard writer.
+
+    Each part holds at most max_rows rows and, header included, at most
+    max_bytes bytes; a single row larger than max_bytes gets a part of its own.
+
+    Args:
+        df: Table to write
+        max_rows: Maximum rows per part (0 = no limit)
+        max_bytes: Maximum bytes per part (0 = no limit)
+
+    Returns:
+        List of (start, stop) row ranges; one empty range for an empty table
+    """
+    import numpy as np
+
+    row_count = len(df)
+    if row_count == 0:
+        return [(0, 0)]
+
+    row_ends = None
+    if max_bytes > 0:
+        # Every part repeats the header
+        header_bytes = len(",".join(f'"{column}"' for column in df.columns).encode()) + 1
+        row_ends = np.cumsum(_csv_row_bytes(df))
+
+    ranges = []
+    start = 0
+    while start < row_count:
+        stop = row_count
+        if max_rows > 0:
+            stop = min(stop, start + max_rows)
+        if row_ends is not None:
+            part_start = row_ends[start - 1] if start else 0
+            fits = int(np.searchsorted(row_ends, part_start + max_bytes - header_bytes, side='right'))
+            stop = min(stop, max(fits, start + 1))
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def _file_sha256(path: str) -> str:
+    import hashlib
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(ZIP_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_csv_shards(df: pd.DataFrame, output_path: str, max_rows: int = 0, max_bytes: int = 0,
+                     workers: int = 0, file_type: str = "") -> str:
+    """
+    Write a table as numbered CSV parts, in parallel, plus a manifest.
+
+    Parts have the same layout as the single-file writers (header in every
+    part, every field quoted) and are named with shard_filename(); part 1
+    keeps output_path's name. The manifest (<part 1 name>.manifest.json) lists
+    each part's file name, sequence number, rows, bytes and SHA-256.
+
+    Args:
+        df: Table to write
+        output_path: Path the unsharded file would have (sequence slot 1)
+        max_rows: Maximum rows per part (0 = no limit)
+        max_bytes: Maximum bytes per part (0 = no limit)
+        workers: Threads writing parts (0 = one per CPU core)
+        file_type: Output name recorded in the manifest (e.g. ContentUserCompletion)
+
+    Returns:
+        Path to the manifest
+    """
+    output_dir = os.path.dirname(output_path)
+    filename = os.path.basename(output_path)
+    ranges = plan_csv_shards(df, max_rows, max_bytes)
+
+    def write_part(sequence: int, start: int, stop: int) -> Dict:
+        part_path = os.path.join(output_dir, shard_filename(filename, sequence))
+        df.iloc[start:stop].to_csv(part_path, index=False, quoting=1)
+        return {
+            'file': os.path.basename(part_path),
+            'sequence': sequence,
+            'rows': stop - start,
+            'bytes': os.path.getsize(part_path),
+            'sha256': _file_sha256(part_path),
+        }
+
+    max_workers = min(len(ranges), workers if workers > 0 else (os.cpu_count() or 1))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        parts = list(executor.map(lambda args: write_part(*args),
+                                  [(sequence, start, stop) for sequence, (start, stop)
+                                   in enumerate(ranges, start=1)]))
+
+    manifest = {
+        'file_type': file_type,
+        'part_count': len(parts),
+        'total_rows': len(df),
+        'total_bytes': sum(part['bytes'] for part in parts),
+        'parts': parts,
+    }
+    manifest_path = os.path.join(output_dir, os.path.splitext(filename)[0] + SHARD_MANIFEST_SUFFIX)
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    increment_counter('files.output_shards_written', len(parts))
+
+    return manifest_path
+
+
+def shard_csv_file(path: str, max_rows: int = 0, max_bytes: int = 0, workers: int = 0,
+                   file_type: str = "") -> str:
+    """
+    Split an already written output CSV into parts (see write_csv_shards()).
+    Values are copied as text, so the parts hold exactly the original fields.
+
+    Returns:
+        Path to the manifest
+    """
+    import pandas as pd
+
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    manifest_path = write_csv_shards(df, path, max_rows, max_bytes, workers, file_type)
+    # Part 1 has the original file's name and has already replaced it
+    return manifest_path
+
+
+def read_shard_manifest(manifest_path: str) -> Dict:
+    """Load a shard manifest."""
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def get_shard_part_paths(manifest_path: str) -> List[str]:
+    """Paths of a sharded output's parts, in sequence order."""
+    directory = os.path.dirname(manifest_path)
+    return [os.path.join(directory, part['file']) for part in read_shard_manifest(manifest_path)['parts']]
+
+
+def get_output_size(path: str) -> int:
+    """Size in bytes of an output file, or of all parts of a sharded output."""
+    if is_shard_manifest(path):
+        return read_shard_manifest(path)['total_bytes']
+    return os.path.getsize(path)
+
+
+def expand_file_sets(file_paths: List[str]) -> List[str]:
+    """
+    Replace each shard manifest in a file list with its parts followed by the manifest.
+
+    Raises:
+        FileNotFoundError: If a part listed in a manifest is missing
+    """
+    expanded = []
+    for path in file_paths:
+        if is_shard_manifest(path) and os.path.exists(path):
+            part_paths = get_shard_part_paths(path)
+            missing = [os.path.basename(part) for part in part_paths if not os.path.exists(part)]
+            if missing:
+                raise FileNotFoundError(f"Incomplete output set {os.path.basename(path)}: "
+                                        f"missing {', '.join(missing)}")
+            expanded.extend(part_paths)
+        expanded.append(path)
+    return expanded
+
+
+# =============================================================================
+# DOWNLOAD PACKAGING
+# =============================================================================
+
+ZIP_COMPRESSION_TYPES = {
+    'deflated': zipfile.ZIP_DEFLATED,
+    'stored': zipfile.ZIP_STORED,
+}
+
+# Chunk size used when streaming files into the archive
+ZIP_CHUNK_SIZE = 1024 * 1024
+
+
+def _deflate_to_tempfile(file_path: str, compresslevel: int, temp_dir: str):
+    """
+    Compress a file into a raw DEFLATE stream held in a temporary file.
+
+    The data is read and compressed in chunks, so memory use does not depend
+    on the size of the file. zlib releases the GIL while compressing, which
+    lets several files be compressed in parallel threads.
+
+    Args:
+        file_path: Path of the file to compress
+        compresslevel: zlib compression level (0-9)
+        temp_dir: Directory for the temporary file
+
+    Returns:
+        Tuple of (temp_file, crc32, file_size, compress_size)
+    """
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -15)
+    temp_file = tempfile.TemporaryFile(dir=temp_dir)
+    crc = 0
+    file_size = 0
+
+    with open(file_path, 'rb') as source:
+        while True:
+            chunk = source.read(ZIP_CHUNK_SIZE)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+            file_size += len(chunk)
+            temp_file.write(compressor.compress(chunk))
+
+    temp_file.write(compressor.flush())
+    compress_size = temp_file.tell()
+    temp_file.seek(0)
+
+    return temp_file, crc, file_size, compress_size
+
+
+def _write_precompressed_entry(zip_file: zipfile.ZipFile, file_path: str, arcname: str,
+                               compressed) -> None:
+    """
+    Append an already DEFLATE-compressed file to an open ZIP archive.
+
+    zipfile has no public API for raw entries, so the local header is written
+    with ZipInfo.FileHeader() and the entry is registered the same way
+    ZipFile.write() does it. This relies on ZipFile's fp, filelist,
+    NameToInfo and start_dir attributes; tests/test_zip_archive.py pins the
+    result with testzip() round trips for seekable and non-seekable
+    destinations, so a zipfile change that breaks it fails there first.
+
+    Args:
+        zip_file: ZipFile opened in 'w' mode
+        file_path: Original (uncompressed) file path, used for timestamps
+        arcname: Name of the entry inside the archive
+        compressed: Tuple returned by _deflate_to_tempfile()
+    """
+    temp_file, crc, file_size, compress_size = compressed
+
+    if arcname in zip_file.namelist():
+        warnings.warn(f"Duplicate name: {arcname!r}", UserWarning, stacklevel=2)
+
+    zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+    zinfo.compress_type = zipfile.ZIP_DEFLATED
+    zinfo.CRC = crc
+    zinfo.file_size = file_size
+    zinfo.compress_size = compress_size
+
+    zip64 = file_size > zipfile.ZIP64_LIMIT or compress_size > zipfile.ZIP64_LIMIT
+    zinfo.header_offset = zip_file.fp.tell()
+    zip_file.fp.write(zinfo.FileHeader(zip64))
+    shutil.copyfileobj(temp_file, zip_file.fp, ZIP_CHUNK_SIZE)
+
+    zip_file.filelist.append(zinfo)
+    zip_file.NameToInfo[zinfo.filename] = zinfo
+    zip_file.start_dir = zip_file.fp.tell()
+
+
+def write_zip_archive(file_paths: List[str], destination, compression: str = 'deflated',
+                      compresslevel: int = 1, workers: int = 0,
+                      parallel_min_bytes: int = 8 * 1024 * 1024) -> int:
     """
-    Call the ML Training Recommender API for a given employee.
+    Stream files into a ZIP archive written directly to a path or file object.
+
+    The archive is never held in memory: entries are written straight to the
+    destination, which may be a local path or any writable binary stream
+    (for example an HTTP response body). With 'deflated' compression, files of
+    at least parallel_min_bytes are compressed concurrently before being
+    appended; smaller files are compressed inline.
 
     Args:
-        config: Configuration dictionary
-        employee_id: The employee's ID (ba_id)
-        progress_callback: Optional callback function for progress updates
+        file_paths: Files to add (missing files are skipped); entries use the basename
+        destination: Output file path or writable binary file object
+        compression: 'deflated' or 'stored'
+        compresslevel: zlib compression level for 'deflated' (1 = fastest)
+        workers: Number of compression threads (0 = one per CPU core)
+        parallel_min_bytes: Minimum file size for parallel compression
 
     Returns:
-        List of recommended training courses with 'recommended_content_id',
-        'recommended_content', and 'source' fields
+        Number of files added to the archive
     """
-    url = f"{config['api_base_url']}{config['api_endpoint']}"
-    payload = {"data": {"ba_id": employee_id}}
+    if compression not in ZIP_COMPRESSION_TYPES:
+        raise ValueError(f"Unsupported ZIP compression: {compression} "
+                         f"(expected one of {', '.join(ZIP_COMPRESSION_TYPES)})")
 
-    if progress_callback:
-        progress_callback(f"Calling ML Reco API for employee {employee_id}...")
+    compress_type = ZIP_COMPRESSION_TYPES[compression]
+    existing_paths = [path for path in file_paths if path and os.path.exists(path)]
+
+    large_files = []
+    if compress_type == zipfile.ZIP_DEFLATED:
+        large_files = [path for path in existing_paths
+                       if os.path.getsize(path) >= parallel_min_bytes]
+
+    if isinstance(destination, str):
+        temp_dir = os.path.dirname(os.path.abspath(destination))
+    else:
+        temp_dir = None
+
+    max_workers = workers if workers > 0 else (os.cpu_count() or 1)
+    executor = ThreadPoolExecutor(max_workers=max_workers) if large_files else None
+    futures = {}
 
     try:
-        response = requests.post(url, json=payload, timeout=config['api_timeout'], verify=False)
-        response.raise_for_status()
-        data = response.json()
+        if executor:
+            for path in large_files:
+                futures[path] = executor.submit(_deflate_to_tempfile, path, compresslevel, temp_dir)
+
+        with zipfile.ZipFile(destination, 'w', compress_type,
+                             compresslevel=compresslevel) as zip_file:
+            # Entries keep the order of file_paths; large files are appended
+            # as soon as their compression has finished
+            for path in existing_paths:
+                arcname = os.path.basename(path)
+                if path in futures:
+                    compressed = futures[path].result()
+                    try:
+                        _write_precompressed_entry(zip_file, path, arcname, compressed)
+                    finally:
+                        compressed[0].close()
+                else:
+                    zip_file.write(path, arcname)
+    finally:
+        if executor:
+            executor.shutdown(wait=True)
+            for future in futures.values():
+                if not future.cancelled() and not future.exception():
+                    future.result()[0].close()
+
+    return len(existing_paths)
+
+
+def create_download_zip(config: Dict, file_paths: List[str], zip_path: Optional[str] = None,
+                        progress_callback=None) -> str:
+    """
+    Package run files into the download ZIP using the configured compression.
 
-        # Parse response structure
-        if isinstance(data, dict):
-            response_data = data.get("response", {})
-            if isinstance(response_data, dict):
-                recommendations = response_data.get("ml_recommendations", [])
-            else:
-                recommendations = response_data if isinstance(response_data, list) else []
-        else:
-            recommendations = []
+    Args:
+        config: Configuration dictionary
+        file_paths: Files to include (missing files are skipped); a shard
+                    manifest adds all of its parts, then the manifest
+        zip_path: Output path (default: <output_dir>/generated_files.zip)
+        progress_callback: Optional callback function for progress updates
 
-        # Tag recommendations with source
-        for rec in recommendations:
-            rec["source"] = "ai"
+    Returns:
+        Path to the generated ZIP file
 
-        # Output recommendations summary
-        if progress_callback:
-            if not recommendations:
-                progress_callback("  no ML recommendations returned")
-            else:
-                course_ids = [str(rec.get("recommended_content_id", "N/A")) for rec in recommendations]
-                course_ids_str = ", ".join(course_ids)
-                progress_callback(f"  {len(recommendations)} ML recommendation(s): {course_ids_str}")
+    Raises:
+        FileNotFoundError: If a part of a sharded output is missing
+    """
+    if zip_path is None:
+        zip_path = os.path.join(config['output_dir'], "generated_files.zip")
 
-        return recommendations if isinstance(recommendations, list) else []
+    file_count = write_zip_archive(
+        expand_file_sets(file_paths), zip_path,
+        compression=config['zip_compression'],
+        compresslevel=config['zip_compresslevel'],
+        workers=config['zip_workers'],
+        parallel_min_bytes=config['zip_parallel_min_bytes'])
 
-    except Exception as e:
-        if progress_callback:
-            progress_callback(f"Error fetching recommendations for employee {employee_id}: {e}")
-        return []
+    if progress_callback:
+        progress_callback(f"Packaged {file_count} file(s) into {os.path.basename(zip_path)} "
+                          f"({config['zip_compression']})")
+
+    return zip_path
 
 
 # =============================================================================
-# EMPLOYEE PROCESSING
+# SIMULATION PIPELINE
 # =============================================================================
 
-def process_employee(config: Dict, employee_id: int, employee_type: str,
-                    manager_assignments: List[Dict], ai_recommendations: List[Dict],
-                    standalone_df: pd.DataFrame, progress_callback=None) -> List[Dict]:
+# Inbound files parsed while they downloaded: {absolute path: (size, mtime_ns, DataFrame)}
+_parsed_inbound_files = {}
+_parsed_inbound_files_lock = threading.Lock()
+
+
+def remember_parsed_inbound_file(path: str, df: pd.DataFrame) -> None:
     """
-    Process a single employee: combine manager assignments and AI recommendations,
-    filter recent completions, then simulate completions based on employee type.
+    Keep the DataFrame parsed during a download for load_standalone_content().
+
+    Entries of files that were since removed or replaced are dropped.
+    """
+    stat = os.stat(path)
+    with _parsed_inbound_files_lock:
+        for known_path, (size, mtime_ns, _) in list(_parsed_inbound_files.items()):
+            try:
+                known_stat = os.stat(known_path)
+            except OSError:
+                known_stat = None
+            if known_stat is None or (known_stat.st_size, known_stat.st_mtime_ns) != (size, mtime_ns):
+                del _parsed_inbound_files[known_path]
+        _parsed_inbound_files[os.path.abspath(path)] = (stat.st_size, stat.st_mtime_ns, df)
+
+
+def load_standalone_content(standalone_content_path: str) -> pd.DataFrame:
+    """
+    Load the downloaded StandAloneContent file for content lookups.
+
+    A file parsed while it downloaded (SFTP_STREAM_PARSE) is not read again;
+    the DataFrame is shared with other runs of the same download and must not
+    be modified.
+
+    Args:
+        standalone_content_path: Path to the StandAloneContent CSV file
+
+    Returns:
+        DataFrame with the standalone content rows
+    """
+    import pandas as pd
+
+    stat = os.stat(standalone_content_path)
+    with _parsed_inbound_files_lock:
+        parsed = _parsed_inbound_files.get(os.path.abspath(standalone_content_path))
+    if parsed is not None and parsed[:2] == (stat.st_size, stat.st_mtime_ns):
+        increment_counter('cache.stream_parsed_hits')
+        return parsed[2]
+
+    return pd.read_csv(standalone_content_path)
+
+
+def download_inbound_files(config: Dict, progress_callback=None) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Download the most recent CourseCatalog and StandAloneContent files from SFTP.
 
     Args:
         config: Configuration dictionary
-        employee_id: The employee's ID
-        employee_type: The employee's type (a, b, or f)
-        manager_assignments: List of manager-assigned training
-        ai_recommendations: List of AI-recommended training
+        progress_callback: Optional callback function for progress updates
+
+    Returns:
+        Tuple of (course_catalog_path, standalone_content_path); either may be None
+    """
+    # Fan-out runs download once for all environments, see simulation_fanout.py
+    if config.get('shared_inbound_files'):
+        return config['shared_inbound_files']
+
+    course_catalog_path = download_most_recent_file_from_sftp(
+        config, 'course_catalog', progress_callback)
+    standalone_content_path = download_most_recent_file_from_sftp(
+        config, 'standalone_content', progress_callback)
+
+    return course_catalog_path, standalone_content_path
+
+
+def build_assignments(config: Dict, employees_df: pd.DataFrame, progress_callback=None,
+                      clock: Optional[RunClock] = None) -> Tuple[str, List[Dict], List[Dict]]:
+    """
+    Combine open Databricks assignments with new manager assignments and write
+    the NonCompletedAssignments file.
+
+    Args:
+        config: Configuration dictionary
+        employees_df: DataFrame with employee_id column
+        progress_callback: Optional callback function for progress updates
+        clock: Run clock (default: RunClock.from_config(config))
+
+    Returns:
+        Tuple of (assignments_path, all_assignments, new_manager_assignments)
+    """
+    clock = clock or RunClock.from_config(config)
+    employee_ids_list = employees_df['employee_id'].tolist()
+
+    # Bring the local state mirror up to date (small delta per run)
+    if config['state_store_path']:
+        with stage_timer('state_sync'):
+            sync_local_state_store(config, progress_callback=progress_callback)
+
+    # Query Databricks for open assignments
+    with stage_timer('databricks_open_assignments'):
+        open_assignments_df = get_open_assignments_from_databricks(
+            config, employee_ids_list, progress_callback)
+
+    # Convert Databricks assignments to output format
+    databricks_assignments = convert_databricks_assignments_to_output_format(
+        open_assignments_df, clock)
+
+    if progress_callback:
+        progress_callback(f"Loaded {len(databricks_assignments)} open assignments from Databricks")
+
+    # Create new manager assignments
+    new_manager_assignments = create_manager_assignments(employees_df, progress_callback, clock=clock)
+
+    # Combine all assignments
+    all_assignments = databricks_assignments + new_manager_assignments
+    if progress_callback:
+        progress_callback(f"Total assignments: {len(all_assignments)}")
+
+    # Write NonCompletedAssignments file
+    with stage_timer('write_non_completed_assignments'):
+        assignments_path = write_non_completed_assignments_file(all_assignments, config['output_dir'], clock.now)
+    if progress_callback:
+        progress_callback(f"Generated: {os.path.basename(assignments_path)}")
+
+    return assignments_path, all_assignments, new_manager_assignments
+
+
+def simulate_completions(config: Dict, employees_df: pd.DataFrame, assignments_path: str,
+                         standalone_df: pd.DataFrame, progress_callback=None,
+                         clock: Optional[RunClock] = None,
+                         catalog_index: Optional[CourseCatalogIndex] = None) -> List[Dict]:
+    """
+    Simulate training completions for every employee.
+
+    Args:
+        config: Configuration dictionary
+        employees_df: DataFrame with employee_id and employee_edu_type columns
+        assignments_path: Path to the NonCompletedAssignments CSV file
         standalone_df: DataFrame containing standalone content for lookups
         progress_callback: Optional callback function for progress updates
+        clock: Run clock (default: RunClock.from_config(config))
+        catalog_index: CourseCatalog index used to flag unknown recommended content
+                       and to name assigned content missing from CONTENT_NAME_LOOKUP
 
     Returns:
-        List of completed training records with UTC timestamps
+        List of completion records for all employees
     """
-    employee_type = employee_type.lower().strip()
+    clock = clock or RunClock.from_config(config)
 
-    # Check for recently completed training (last 13 days)
-    # This ONLY applies to AI recommendations, NOT to manager assignments
-    recent_completions = get_employee_recent_completions(config, employee_id, lookback_days=13)
+    if config['completion_engine'] == 'vectorized':
+        return _simulate_completions_vectorized(
+            config, employees_df, assignments_path, progress_callback, clock, catalog_index)
 
-    filtered_ai_recommendations = []
+    all_completions = []
 
-    if ai_recommendations:
-        if recent_completions:
-            for rec in ai_recommendations:
-                content_id = rec["recommended_content_id"]
+    # Batched / concurrent recommender calls: fetch everyone's recommendations up front
+    prefetched = None
+    if is_recommender_prefetch_enabled(config):
+        with stage_timer('recommender'):
+            prefetched = get_training_recommendations_batch(
+                config, employees_df['employee_id'].tolist(), progress_callback)
 
-                if content_id not in recent_completions:
-                    filtered_ai_recommendations.append(rec)
+    for employee in employees_df.itertuples():
+        employee_id = employee.employee_id
+        employee_type = employee.employee_edu_type
+
+        if progress_callback:
+            progress_callback(f"Processing employee {employee_id} (type {employee_type})...")
+
+        # Get AI recommendations
+        if prefetched is not None:
+            ai_recommendations = prefetched[int(employee_id)]
         else:
-            filtered_ai_recommendations = ai_recommendations
+            with stage_timer('recommender'):
+                ai_recommendations = get_training_recommendations(config, employee_id, progress_callback)
 
-    # Combine manager assignments (unfiltered) with filtered AI recommendations
-    all_training = manager_assignments + filtered_ai_recommendations
+        # Get manager assignments
+        with stage_timer('manager_assignments_lookup'):
+            manager_assignments = get_manager_assignments_for_employee(
+                employee_id, assignments_path, standalone_df, catalog_index)
 
-    if not all_training:
-        return []
+        # Process employee
+        with stage_timer('process_employee'):
+            completions = process_employee(
+                config, employee_id, employee_type,
+                manager_assignments, ai_recommendations,
+                standalone_df, progress_callback, clock=clock, catalog_index=catalog_index)
 
-    # Determine how many courses to complete based on employee type
-    if employee_type == 'a':
-        courses_to_complete = all_training
-    elif employee_type == 'b':
-        courses_to_complete = all_training[:1]
-    else:  # Type F
-        courses_to_complete = []
+        all_completions.extend(completions)
 
-    # Generate completion records
-    completions = []
-    times = generate_training_times(len(courses_to_complete))
+        if completions and progress_callback:
+            progress_callback(f"  Completed {len(completions)} training(s)")
 
-    for i, course in enumerate(courses_to_complete):
-        try:
-            if not isinstance(course, dict):
-                if progress_callback:
-                    progress_callback(f"  Warning: Skipping non-dict course at index {i}")
-                continue
+    increment_counter('rows.completions', len(all_completions))
 
-            start_time, end_time = times[i]
-            source = course.get("source", "unknown")
+    if progress_callback:
+        progress_callback(f"Total completions: {len(all_completions)}")
 
-            # Validate required fields
-            if "recommended_content_id" not in course:
-                if progress_callback:
-                    progress_callback(f"  Warning: Course missing 'recommended_content_id': {course}")
-                continue
+    return all_completions
 
-            completions.append({
-                "UserId": employee_id,
-                "ContentId": format_content_id(course["recommended_content_id"]),
-                "DateStarted": start_time,
-                "DateCompleted": end_time,
-                "CourseName": course.get("recommended_content", "Unknown"),
-                "Source": source
-            })
-        except (KeyError, Exception) as e:
+
+def _simulate_completions_vectorized(config: Dict, employees_df: pd.DataFrame, assignments_path: str,
+                                     progress_callback=None,
+                                     clock: Optional[RunClock] = None,
+                                     catalog_index: Optional[CourseCatalogIndex] = None) -> List[Dict]:
+    """
+    simulate_completions() with the population-level engine (simulation_population.py):
+    the NonCompletedAssignments file is read once and recent completions are
+    fetched with bulk queries, then all completions are decided in one pass.
+    Unknown recommended content is flagged with one catalog lookup for everyone.
+    """
+    import pandas as pd
+    from simulation_population import (build_manager_assignments_table, build_training_table,
+                                       completions_to_records, simulate_population_completions)
+
+    employee_ids = employees_df['employee_id'].tolist()
+
+    if is_recommender_prefetch_enabled(config):
+        with stage_timer('recommender'):
+            recommendations = get_training_recommendations_batch(config, employee_ids, progress_callback)
+    else:
+        recommendations = {}
+        for employee_id in employee_ids:
+            with stage_timer('recommender'):
+                recommendations[employee_id] = get_training_recommendations(config, employee_id, progress_callback)
+
+    with stage_timer('manager_assignments_lookup'):
+        assignments_df = pd.read_csv(assignments_path) if os.path.exists(assignments_path) else pd.DataFrame()
+        manager_df = build_manager_assignments_table(assignments_df, catalog_index)
+
+    with stage_timer('recent_completions_lookup'):
+        recent_df = get_recent_completions_for_employees(config, employee_ids, lookback_days=13, now=clock.now)
+
+    recommendations_df = build_training_table(recommendations)
+    if catalog_index is not None and len(recommendations_df):
+        with stage_timer('catalog_lookup'):
+            unknown = ~catalog_index.contains(recommendations_df['content_id'].to_numpy())
+        unknown_count = int(unknown.sum())
+        if unknown_count:
+            increment_counter('rows.unknown_recommended_content', unknown_count)
             if progress_callback:
-                progress_callback(f"  Warning: Error processing course {i}: {e}")
-            continue
+                unknown_ids = recommendations_df['content_id'][unknown].unique()
+                progress_callback(f"Warning: {unknown_count} recommendation(s) of {len(unknown_ids)} content "
+                                  f"ID(s) not in CourseCatalog: "
+                                  f"{', '.join(str(content_id) for content_id in unknown_ids[:20])}"
+                                  + (", ..." if len(unknown_ids) > 20 else ""))
 
-    return completions
+    with stage_timer('population_completions'):
+        completions_df = simulate_population_completions(
+            employees_df, manager_df, recommendations_df, recent_df, clock=clock)
+        all_completions = completions_to_records(completions_df)
 
+    increment_counter('rows.completions', len(all_completions))
 
-def get_manager_assignments_for_employee(employee_id: int, assignments_path: str,
-                                        standalone_df: pd.DataFrame) -> List[Dict]:
+    if progress_callback:
+        progress_callback(f"Total completions: {len(all_completions)}")
+
+    return all_completions
+
+
+def write_completion_outputs(config: Dict, all_completions: List[Dict], assignments_path: str,
+                             progress_callback=None,
+                             clock: Optional[RunClock] = None) -> Tuple[Optional[str], Optional[str], str]:
     """
-    Get manager assignments for a specific employee from NonCompletedAssignments file.
+    Write the ContentUserCompletion file, remove completed assignments from the
+    NonCompletedAssignments file and generate the UserCompletion file.
+
+    With OUTPUT_SHARD_MAX_ROWS / OUTPUT_SHARD_MAX_BYTES set, the
+    ContentUserCompletion and NonCompletedAssignments outputs are written as
+    numbered parts and the returned paths are their shard manifests.
 
     Args:
-        employee_id: The employee's ID
+        config: Configuration dictionary
+        all_completions: List of completion records
         assignments_path: Path to the NonCompletedAssignments CSV file
-        standalone_df: DataFrame containing standalone content for content name lookups
+        progress_callback: Optional callback function for progress updates
+        clock: Run clock for the file names (default: current time)
 
     Returns:
-        List of manager-assigned training with 'recommended_content_id',
-        'recommended_content', and 'source' fields
+        Tuple of (output_path, user_completion_path, assignments_path); the
+        first two may be None
     """
-    manager_assignments = []
+    now = clock.now if clock else None
+    shard_settings = get_shard_settings(config)
 
-    if not os.path.exists(assignments_path):
-        return manager_assignments
+    if all_completions:
+        output_path = write_content_user_completion_file(all_completions, config['output_dir'], now,
+                                                         **shard_settings)
+        if progress_callback:
+            progress_callback(f"Generated: {os.path.basename(output_path)}")
 
-    assignments_df = pd.read_csv(assignments_path)
-    assignments_df['UserID'] = assignments_df['UserID'].astype(int)
-    employee_assignments = assignments_df[assignments_df['UserID'] == employee_id]
+        # Update NonCompletedAssignments file
+        initial_count, removed_count = update_non_completed_assignments_file(
+            assignments_path, all_completions)
+        if progress_callback:
+            progress_callback(f"Updated NonCompletedAssignments: removed {removed_count} completed assignments")
+    else:
+        if progress_callback:
+            progress_callback("No completions to write")
+        output_path = None
 
-    for _, assignment in employee_assignments.iterrows():
-        content_id = assignment['TrainingElementId']
+    # The working file is complete only now, so it is split last
+    if is_output_sharding_enabled(config) and os.path.exists(assignments_path):
+        assignments_path = shard_csv_file(assignments_path, file_type='NonCompletedAssignments',
+                                          **shard_settings)
+        if progress_callback:
+            progress_callback(f"Split NonCompletedAssignments into "
+                              f"{read_shard_manifest(assignments_path)['part_count']} part(s)")
 
-        if isinstance(content_id, str):
-            content_id_numeric = int(content_id.replace(',', ''))
-        else:
-            content_id_numeric = int(content_id)
+    # Generate UserCompletion file (dummy file)
+    user_completion_path = generate_user_completion_file_from_template(config, progress_callback, now)
 
-        # Look up content name
-        content_id_no_commas = str(content_id_numeric)
-        content_name = CONTENT_NAME_LOOKUP.get(content_id_no_commas,
-                                               f"Training Content {content_id_no_commas}")
+    return output_path, user_completion_path, assignments_path
 
-        manager_assignments.append({
-            "recommended_content_id": content_id_numeric,
-            "recommended_content": content_name,
-            "source": "manager"
-        })
 
-    return manager_assignments
+def get_run_files(result: Dict) -> List[str]:
+    """
+    List the files produced by a run, generated files first, then downloaded files.
 
+    Args:
+        result: Dictionary returned by run_simulation()
 
-# =============================================================================
-# FILE GENERATION
-# =============================================================================
+    Returns:
+        List of existing file paths
+    """
+    candidates = [result.get('output_path'), result.get('assignments_path'),
+                  result.get('user_completion_path'), result.get('course_catalog_path'),
+                  result.get('standalone_content_path')]
+    return [path for path in candidates if path and os.path.exists(path)]
 
-def write_content_user_completion_file(completions: List[Dict], output_dir: str) -> str:
+
+def get_run_artifacts(result: Dict) -> List[str]:
     """
-    Write ContentUserCompletion CSV file.
+    List the diagnostic files of a run (metrics, trace, profile). These are included in
+    the download ZIP but are never published to SFTP.
 
     Args:
-        completions: List of completion records
-        output_dir: Output directory path
+        result: Dictionary returned by run_simulation()
 
     Returns:
-        Path to the generated file
+        List of existing file paths
     """
-    output_filename = generate_output_filename()
-    output_path = os.path.join(output_dir, output_filename)
+    candidates = [result.get('metrics_path'), result.get('trace_path')] + result.get('profile_paths', [])
+    return [path for path in candidates if path and os.path.exists(path)]
 
-    output_df = pd.DataFrame(completions)
-    output_df = output_df[['UserId', 'ContentId', 'DateStarted', 'DateCompleted']]
-    output_df.to_csv(output_path, index=False, quoting=1)
 
-    return output_path
+# run_simulation() pipelines: this process, or Spark (simulation_spark.py)
+EXECUTION_BACKENDS = ('local', 'spark')
 
 
-def write_non_completed_assignments_file(assignments: List[Dict], output_dir: str) -> str:
+def run_simulation(config: Dict, employees_file: str, publish_enabled: bool = False,
+                   progress_callback=None) -> Dict:
     """
-    Write NonCompletedAssignments CSV file.
+    Run the complete BTC training simulation pipeline.
+
+    Steps: cleanup, load employees, download inbound files, manager assignments,
+    employee completions, output files, (optionally) write-back to the state
+    tables and (optionally) SFTP publishing. The run ID is config['run_id'] if
+    set, so a retried run can reuse it for an idempotent write-back.
+    When METRICS_ENABLED is set, stage timings, latencies and counters are
+    written to run_metrics.json (and run_trace.json with METRICS_TRACE_ENABLED)
+    in the output directory, even if the run fails. With PROFILE_RUN the run
+    is also profiled (see simulation_profiling.py) and the profile artifacts
+    are written next to the metrics.
 
     Args:
-        assignments: List of assignment records
-        output_dir: Output directory path
+        config: Configuration dictionary
+        employees_file: Path to the employees CSV file
+        publish_enabled: Whether to publish files to SFTP outbound
+        progress_callback: Optional callback function for progress updates
 
     Returns:
-        Path to the generated file
+        Dictionary with output_path, assignments_path, user_completion_path,
+        course_catalog_path, standalone_content_path, completions, completion_count,
+        published, metrics_path, trace_path, profile_paths, run_id and state_writeback
+        (with EXECUTION_BACKEND=spark the completions stay distributed: completions
+        is empty and completion_count holds the number written)
+
+    Raises:
+        RuntimeError: If the inbound SFTP files cannot be downloaded
+        ValueError: If EXECUTION_BACKEND is unknown
     """
-    assignments_filename = generate_non_completed_assignments_filename()
-    assignments_path = os.path.join(output_dir, assignments_filename)
+    result = {
+        'output_path': None,
+        'assignments_path': None,
+        'user_completion_path': None,
+        'course_catalog_path': None,
+        'standalone_content_path': None,
+        'completions': [],
+        'completion_count': 0,
+        'published': None,
+        'metrics_path': None,
+        'trace_path': None,
+        'profile_paths': [],
+        'run_id': config.get('run_id') or generate_run_id(),
+        'state_writeback': None,
+    }
 
-    assignments_df = pd.DataFrame(assignments)
-    assignments_df.to_csv(assignments_path, index=False, quoting=1)
+    # Profiling needs the stage hooks, so it always collects metrics
+    metrics = None
+    if config['metrics_enabled'] or config['profile_enabled']:
+        metrics = RunMetrics(trace=config['metrics_trace_enabled'])
 
-    return assignments_path
+    profiler = None
+    if config['profile_enabled']:
+        from simulation_profiling import RunProfiler
 
+        profiler = RunProfiler(sample_interval=config['profile_sample_interval_ms'] / 1000.0)
+        metrics.add_stage_listener(profiler.on_stage_enter, profiler.on_stage_exit)
+        profiler.start()
 
-def update_non_completed_assignments_file(assignments_path: str,
-                                         completions: List[Dict]) -> Tuple[int, int]:
+    if config['execution_backend'] not in EXECUTION_BACKENDS:
+        raise ValueError(f"Unknown execution backend: {config['execution_backend']} "
+                         f"(expected one of {', '.join(EXECUTION_BACKENDS)})")
+    if config['execution_backend'] == 'spark':
+        from simulation_spark import run_spark_pipeline as run_pipeline
+    else:
+        run_pipeline = _run_pipeline
+
+    with activate_run_metrics(metrics):
+        try:
+            with stage_timer('run'):
+                run_pipeline(config, employees_file, publish_enabled, result, progress_callback)
+        except Exception:
+            increment_counter('errors.run')
+            raise
+        finally:
+            if profiler:
+                profiler.stop()
+                result['profile_paths'] = _export_run_profile(
+                    profiler, config['output_dir'], progress_callback)
+            if config['metrics_enabled']:
+                result['metrics_path'], result['trace_path'] = export_run_metrics(
+                    metrics, config['output_dir'], progress_callback)
+
+    return result
+
+
+def _export_run_profile(profiler, output_dir: str, progress_callback=None) -> List[str]:
+    """Write the profiler artifacts into the run directory."""
+    try:
+        profile_paths = profiler.write_artifacts(output_dir)
+    except Exception as e:
+        if progress_callback:
+            progress_callback(f"  Warning: Could not write profile: {e}")
+        return []
+
+    if progress_callback:
+        progress_callback("Profile written: " + ", ".join(os.path.basename(p) for p in profile_paths))
+
+    return profile_paths
+
+
+def _run_pipeline(config: Dict, employees_file: str, publish_enabled: bool,
+                  result: Dict, progress_callback=None) -> None:
+    """Run the pipeline steps of run_simulation(), filling in result as it goes."""
+    def progress(msg):
+        if progress_callback:
+            progress_callback(msg)
+
+    # One clock for the whole run: every file name and timestamp agrees
+    clock = RunClock.from_config(config)
+    if config['run_clock_now']:
+        progress(f"Run clock frozen at {clock.now.isoformat()}")
+
+    # Step 0: Cleanup - Remove old files from previous runs
+    progress("STEP 0: Cleanup")
+    progress("-" * 80)
+    with stage_timer('cleanup'):
+        cleanup_output_directory(config, progress_callback)
+    progress("")
+
+    # Step 1: Load employee file
+    progress("STEP 1: Loading Employee Data")
+    progress("-" * 80)
+    with stage_timer('load_employees'):
+        employees_df, filtered_count = load_and_filter_employees(employees_file, progress_callback)
+    progress("")
+
+    # Step 2: Download files from SFTP
+    progress("STEP 2: Downloading Files from SFTP")
+    progress("-" * 80)
+    with stage_timer('sftp_download'):
+        course_catalog_path, standalone_content_path = download_inbound_files(config, progress_callback)
+    result['course_catalog_path'] = course_catalog_path
+    result['standalone_content_path'] = standalone_content_path
+
+    if not course_catalog_path or not standalone_content_path:
+        raise RuntimeError("Failed to download required files")
+
+    progress(f"Downloaded course catalog: {os.path.basename(course_catalog_path)}")
+    progress(f"Downloaded standalone content: {os.path.basename(standalone_content_path)}")
+    progress("")
+
+    # Load standalone content for lookups
+    with stage_timer('load_standalone_content'):
+        standalone_df = load_standalone_content(standalone_content_path)
+
+    # Step 3: Manager Assignments
+    progress("STEP 3: Creating Manager Assignments")
+    progress("-" * 80)
+    with stage_timer('assignments'):
+        assignments_path, all_assignments, new_manager_assignments = build_assignments(
+            config, employees_df, progress_callback, clock)
+    result['assignments_path'] = assignments_path
+    progress("")
+
+    # Step 4: Employee Training Simulation
+    progress("STEP 4: Simulating Employee Training Completions")
+    progress("-" * 80)
+    with stage_timer('catalog_index'):
+        catalog_index = open_course_catalog_index(course_catalog_path, progress_callback)
+    try:
+        with stage_timer('simulate_completions'):
+            all_completions = simulate_completions(
+                config, employees_df, assignments_path, standalone_df, progress_callback, clock,
+                catalog_index)
+    finally:
+        if catalog_index is not None:
+            catalog_index.close()
+    result['completions'] = all_completions
+    result['completion_count'] = len(all_completions)
+    progress("")
+
+    # Step 5: Generate Output Files
+    progress("STEP 5: Generating Output Files")
+    progress("-" * 80)
+    with stage_timer('write_outputs'):
+        output_path, user_completion_path, assignments_path = write_completion_outputs(
+            config, all_completions, assignments_path, progress_callback, clock)
+    result['assignments_path'] = assignments_path
+    result['output_path'] = output_path
+    result['user_completion_path'] = user_completion_path
+
+    # Write the run back to the state tables so the next run sees it
+    if config['state_writeback_enabled']:
+        progress(f"Writing run {result['run_id']} back to the state tables")
+        try:
+            with stage_timer('state_writeback'):
+                result['state_writeback'] = write_back_run_state(
+                    config, result['run_id'], all_completions, new_manager_assignments, progress_callback, clock)
+        except RuntimeError as e:
+            progress(f"⚠ {e}")
+    progress("")
+
+    # Step 6: Publish to SFTP (if enabled)
+    if publish_enabled:
+        publish_run(config, result, progress_callback)
+
+
+def publish_run(config: Dict, result: Dict, progress_callback=None) -> bool:
     """
-    Update NonCompletedAssignments file to remove completed training.
+    Publish a run's files to SFTP outbound (pipeline step 6), even if
+    SFTP_PUBLISH_ENABLED is off, and record the outcome in result['published'].
 
     Args:
-        assignments_path: Path to the NonCompletedAssignments CSV file
-        completions: List of completion records
+        config: Configuration dictionary
+        result: Run result dictionary (see run_simulation())
+        progress_callback: Optional callback function for progress updates
 
     Returns:
-        Tuple of (initial_count, removed_count)
+        True if all files were published
     """
-    if not os.path.exists(assignments_path):
-        return (0, 0)
+    def progress(msg):
+        if progress_callback:
+            progress_callback(msg)
 
-    assignments_df = pd.read_csv(assignments_path)
-    initial_count = len(assignments_df)
+    progress("STEP 6: Publishing Files to SFTP Outbound")
+    progress("-" * 80)
 
-    # Build set of completed (UserID, ContentID) pairs
-    completed_set = set()
-    for completion in completions:
-        user_id = completion['UserId']
-        content_id = completion['ContentId']
-        if isinstance(content_id, str):
-            content_id_numeric = int(content_id.replace(',', ''))
-        else:
-            content_id_numeric = int(content_id)
-        completed_set.add((user_id, content_id_numeric))
+    # Override config for this run
+    publish_config = config.copy()
+    publish_config['sftp_publish_enabled'] = True
 
-    # Filter out completed assignments
-    def is_not_completed(row):
-        user_id = int(row['UserID'])
-        training_id = row['TrainingElementId']
+    with stage_timer('publish'):
+        success = publish_files_to_sftp_outbound(
+            publish_config, get_run_files(result), progress_callback)
 
-        if isinstance(training_id, str):
-            training_id_numeric = int(training_id.replace(',', ''))
-        else:
-            training_id_numeric = int(training_id)
+    if success:
+        progress("✓ All files published successfully")
+    else:
+        progress("⚠ Some files failed to publish")
 
-        is_completed = (user_id, training_id_numeric) in completed_set
-        return not is_completed
+    result['published'] = success
+    progress("")
+    return success
 
-    remaining_assignments_df = assignments_df[assignments_df.apply(is_not_completed, axis=1)].copy()
-    removed_count = initial_count - len(remaining_assignments_df)
 
-    # Overwrite the file
-    remaining_assignments_df.to_csv(assignments_path, index=False, quoting=1)
+# =============================================================================
+# RUN ESTIMATE
+# =============================================================================
 
-    return (initial_count, removed_count)
+# Employees sampled by estimate_run() unless told otherwise
+ESTIMATE_SAMPLE_SIZE = 50
+
+# Stages whose time does not grow with the population
+ESTIMATE_FIXED_STAGES = ('cleanup', 'sftp_download', 'load_standalone_content', 'state_sync',
+                         'catalog_index')
+
+# Output files whose size does not grow with the population (template copies)
+ESTIMATE_FIXED_OUTPUTS = ('UserCompletion',)
+
+# Manager assignment lookups timed against a full-size NonCompletedAssignments file
+ESTIMATE_LOOKUP_SAMPLES = 3
+
+# Recommender concurrency levels compared in the estimate
+ESTIMATE_CONCURRENCY_LEVELS = [1, 2, 4, 8, 16, 32]
+
+
+def _estimate_recommender_seconds(request_count: int, latency_seconds: float, concurrency: int) -> float:
+    """Wall time of request_count requests of the given latency, concurrency at a time."""
+    return -(-request_count // max(1, concurrency)) * latency_seconds
+
+
+def _time_full_size_lookups(assignments_path: str, scale: float, employee_ids: List[int],
+                            temp_dir: str) -> Optional[float]:
+    """
+    Seconds per get_manager_assignments_for_employee() call on a
+    NonCompletedAssignments file the size of the full run's (the sampled
+    file repeated), or None if the sample wrote no assignments.
+    """
+    import pandas as pd
+
+    part_paths = [path for path in expand_file_sets([assignments_path]) if not is_shard_manifest(path)]
+    if not part_paths or not all(os.path.exists(path) for path in part_paths):
+        return None
+    sample_assignments = pd.concat([pd.read_csv(path, dtype=str) for path in part_paths], ignore_index=True)
+    if sample_assignments.empty:
+        return None
+
+    full_size_path = os.path.join(temp_dir, "assignments_full_size.csv")
+    pd.concat([sample_assignments] * max(1, int(round(scale))), ignore_index=True).to_csv(
+        full_size_path, index=False)
+
+    lookup_ids = employee_ids[:ESTIMATE_LOOKUP_SAMPLES]
+    lookup_start = time.perf_counter()
+    for employee_id in lookup_ids:
+        get_manager_assignments_for_employee(int(employee_id), full_size_path, None)
+    return (time.perf_counter() - lookup_start) / len(lookup_ids)
+
+
+def estimate_run(config: Dict, employees_file: str, sample_size: int = ESTIMATE_SAMPLE_SIZE,
+                 seed: Optional[int] = None, progress_callback=None) -> Dict:
+    """
+    Estimate the wall-clock time, API calls, warehouse queries and output sizes
+    of a full run before launching it.
+
+    Runs the pipeline for a random sample of the employees, with the real
+    SFTP download, Databricks queries and recommender calls, into a temporary
+    directory that is removed afterwards, then extrapolates to the whole
+    population. Nothing outside the temporary directory is written: no
+    publishing, no state write-back, and the local state mirror
+    (STATE_STORE_PATH) is read as-is instead of synced, so its sync time is
+    not part of the estimate.
+
+    Extrapolation:
+
+    - fixed stages (ESTIMATE_FIXED_STAGES) are counted once
+    - recommender time is the measured request latency times the number of
+      requests the full run sends, RECOMMENDER_CONCURRENCY at a time (batch
+      latency is scaled linearly with the ba_ids per request)
+    - with the per_employee engine every employee reads the whole
+      NonCompletedAssignments file, so manager assignment lookups are timed
+      against a full-size copy of the sampled file
+    - the UserCompletion file is a copy of its template (ESTIMATE_FIXED_OUTPUTS)
+      and keeps its sampled size
+    - all other stages, row counts and output sizes scale with the population
+
+    Args:
+        config: Configuration dictionary (current batch size and concurrency apply)
+        employees_file: Path to the employees CSV file
+        sample_size: Number of employees sampled
+        seed: Random seed for the sample
+        progress_callback: Optional callback function for progress updates
+
+    Returns:
+        Dictionary with employee_count, sample_count, sample_seconds,
+        estimated_seconds, fixed_seconds, recommender_seconds, other_seconds,
+        recommender_requests, recommender_latency_ms, recommender_batched,
+        recommender_seconds_by_concurrency ({concurrency: seconds}),
+        warehouse_queries, completions, output_bytes ({file type: bytes}) and
+        recommender_concurrency / recommender_batch_size
+
+    Raises:
+        ValueError: If the employees file has no employees or sample_size < 1
+        RuntimeError: If the sample run fails (e.g. inbound files cannot be downloaded)
+    """
+    import pandas as pd
+
+    def progress(msg):
+        if progress_callback:
+            progress_callback(msg)
+
+    if sample_size < 1:
+        raise ValueError("sample_size must be at least 1")
+
+    employees_df, _ = load_and_filter_employees(employees_file)
+    employee_count = len(employees_df)
+    if employee_count == 0:
+        raise ValueError(f"No employees in {employees_file}")
+
+    sample_df = employees_df.sample(n=min(sample_size, employee_count), random_state=seed)
+    sample_count = len(sample_df)
+    scale = employee_count / sample_count
+
+    with tempfile.TemporaryDirectory(prefix="btc_estimate_") as temp_dir:
+        sample_file = os.path.join(temp_dir, "employees_sample.csv")
+        sample_df.to_csv(sample_file, index=False)
+
+        sample_config = dict(config)
+        sample_config['output_dir'] = sample_config['sftp_local_dir'] = os.path.join(temp_dir, "run")
+        sample_config['metrics_enabled'] = True
+        sample_config['metrics_trace_enabled'] = False
+        sample_config['profile_enabled'] = False
+        sample_config['state_writeback_enabled'] = False
+        sample_config['state_store_sync_enabled'] = False
+        sample_config['run_id'] = None
+        sample_config.pop('recommendation_cache', None)
+        os.makedirs(sample_config['output_dir'], exist_ok=True)
+
+        progress(f"Sample run: {sample_count} of {employee_count:,} employee(s)")
+        try:
+            result = run_simulation(sample_config, sample_file, publish_enabled=False)
+        except Exception as e:
+            raise RuntimeError(f"Sample run failed: {e}") from e
+
+        if not result['metrics_path']:
+            raise RuntimeError("Sample run metrics could not be written")
+        with open(result['metrics_path']) as f:
+            metrics = json.load(f)
+        output_bytes = {
+            'ContentUserCompletion': get_output_size(result['output_path']) if result['output_path'] else 0,
+            'NonCompletedAssignments': get_output_size(result['assignments_path']),
+            'UserCompletion': get_output_size(result['user_completion_path'])
+            if result['user_completion_path'] else 0,
+        }
+
+        lookup_seconds = None
+        if config['completion_engine'] == 'per_employee' and config['execution_backend'] == 'local':
+            lookup_seconds = _time_full_size_lookups(result['assignments_path'], scale,
+                                                     sample_df['employee_id'].tolist(), temp_dir)
+
+    stages = metrics['stages']
+    latencies = metrics['latencies']
+
+    def stage_seconds(name: str) -> float:
+        return stages.get(name, {}).get('total_seconds', 0.0)
+
+    sample_seconds = stage_seconds('run')
+    fixed_seconds = sum(stage_seconds(name) for name in ESTIMATE_FIXED_STAGES)
+    sample_recommender_seconds = stage_seconds('recommender')
+    other_seconds = max(0.0, sample_seconds - fixed_seconds - sample_recommender_seconds) * scale
+    if lookup_seconds is not None:
+        other_seconds += (lookup_seconds - stage_seconds('manager_assignments_lookup') / sample_count) * employee_count
+        other_seconds = max(0.0, other_seconds)
+
+    # Recommender: requests of the full run, at the sampled latency
+    batch_size = max(1, config['recommender_batch_size'])
+    concurrency = max(1, config['recommender_concurrency'])
+    batch_stats = latencies.get('recommender.batch_request')
+    single_stats = latencies.get('recommender.request')
+    recommender_batched = bool(batch_stats and batch_stats['count'])
+    if recommender_batched:
+        # Sampled batches hold fewer ba_ids than full-size ones
+        sample_batch_ids = sample_count / batch_stats['count']
+        full_batch_ids = min(batch_size, employee_count)
+        recommender_latency = batch_stats['mean_ms'] / 1000.0 * max(1.0, full_batch_ids / sample_batch_ids)
+        recommender_requests = -(-employee_count // batch_size)
+    else:
+        recommender_latency = (single_stats['mean_ms'] / 1000.0 if single_stats and single_stats['count']
+                               else sample_recommender_seconds / sample_count)
+        recommender_requests = employee_count
+
+    recommender_seconds = _estimate_recommender_seconds(recommender_requests, recommender_latency, concurrency)
+    levels = sorted(set(level for level in ESTIMATE_CONCURRENCY_LEVELS if level <= recommender_requests)
+                    | {concurrency})
+    recommender_seconds_by_concurrency = {
+        level: _estimate_recommender_seconds(recommender_requests, recommender_latency, level)
+        for level in levels
+    }
+
+    # Warehouse queries: the open assignments query covers everyone, recent
+    # completions are one query per employee or per RECENT_COMPLETIONS_QUERY_CHUNK
+    warehouse_queries = 0
+    if latencies.get('databricks.open_assignments'):
+        warehouse_queries += latencies['databricks.open_assignments']['count']
+    if latencies.get('databricks.recent_completions'):
+        warehouse_queries += round(latencies['databricks.recent_completions']['count'] * scale)
+    if latencies.get('databricks.recent_completions_bulk'):
+        warehouse_queries += -(-employee_count // RECENT_COMPLETIONS_QUERY_CHUNK)
+
+    estimate = {
+        'employee_count': employee_count,
+        'sample_count': sample_count,
+        'sample_seconds': sample_seconds,
+        'estimated_seconds': fixed_seconds + recommender_seconds + other_seconds,
+        'fixed_seconds': fixed_seconds,
+        'recommender_seconds': recommender_seconds,
+        'other_seconds': other_seconds,
+        'recommender_requests': recommender_requests,
+        'recommender_latency_ms': recommender_latency * 1000.0,
+        'recommender_batched': recommender_batched,
+        'recommender_concurrency': concurrency,
+        'recommender_batch_size': batch_size,
+        'recommender_seconds_by_concurrency': recommender_seconds_by_concurrency,
+        'warehouse_queries': warehouse_queries,
+        'completions': round(result['completion_count'] * scale),
+        'output_bytes': {file_type: size if file_type in ESTIMATE_FIXED_OUTPUTS else round(size * scale)
+                         for file_type, size in output_bytes.items()},
+    }
+    progress(f"Estimated full run: {_format_duration(estimate['estimated_seconds'])}")
+    return estimate
+
+
+def _format_duration(seconds: float) -> str:
+    """Format seconds as 1h 02m 03s / 2m 03s / 4.5s."""
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m {seconds:02d}s" if hours else f"{minutes}m {seconds:02d}s"
+
+
+def format_run_estimate(estimate: Dict) -> str:
+    """Render an estimate_run() result as text."""
+    lines = [
+        f"Run estimate for {estimate['employee_count']:,} employee(s) "
+        f"(sampled {estimate['sample_count']} in {_format_duration(estimate['sample_seconds'])})",
+        "",
+        f"Estimated wall-clock time:  {_format_duration(estimate['estimated_seconds'])}",
+        f"  fixed (cleanup, SFTP download, state sync):  {_format_duration(estimate['fixed_seconds'])}",
+        f"  recommender API:                            {_format_duration(estimate['recommender_seconds'])}",
+        f"  assignments, completions, output files:     {_format_duration(estimate['other_seconds'])}",
+        "",
+        f"Recommender requests:  {estimate['recommender_requests']:,} "
+        + (f"(batches of {estimate['recommender_batch_size']})" if estimate['recommender_batched']
+           else "(one per employee)")
+        + f", ~{estimate['recommender_latency_ms']:.0f}ms each, "
+        f"RECOMMENDER_CONCURRENCY={estimate['recommender_concurrency']}",
+        f"Warehouse queries:     {estimate['warehouse_queries']:,}",
+        f"Completions:           ~{estimate['completions']:,}",
+        "",
+        "Output sizes:",
+    ]
+    for file_type, size in estimate['output_bytes'].items():
+        lines.append(f"  {file_type + ':':<26} ~{size / (1024 * 1024):,.1f} MB")
+
+    lines += ["", "Recommender time by concurrency (same latency assumed; check with the probe):"]
+    for level, seconds in estimate['recommender_seconds_by_concurrency'].items():
+        marker = "  <- current" if level == estimate['recommender_concurrency'] else ""
+        lines.append(f"  {level:>3}: {_format_duration(seconds)}{marker}")
+
+    lines += ["", "Not included: ZIP packaging, SFTP publishing and state write-back."]
+    return "\n".join(lines)
@@ -0,0 +1,374 @@
+"""
+BTC Fake - Multi-Environment Fan-Out
+
+Refreshes several environments (DEV2, QA1, ...) in one run instead of one
+pipeline run per .env file:
+
+    python -m simulation_cli fanout --profile dev=.env.dev --profile qa=.env.qa --publish
+
+Each profile is an .env file layered over the current environment. Inputs the
+environments have in common are fetched once:
+
+- the inbound CourseCatalog / StandAloneContent files are downloaded once per
+  distinct SFTP inbound server and path, into <OUTPUT_DIR>/_shared/
+- recommendations are fetched once per employee and recommender URL; profiles
+  pointing at the same recommender reuse each other's responses (also with
+  RECOMMENDER_BATCH_SIZE batch requests)
+
+The per-environment work (Databricks queries, output files, state write-back,
+publishing to the profile's own SFTP outbound target) runs concurrently, one
+thread per environment, with each environment's files and run metrics in
+<OUTPUT_DIR>/<profile name>/.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+import simulation_core as core
+
+# Subdirectory of OUTPUT_DIR holding the downloads shared by all environments
+SHARED_DIR_NAME = "_shared"
+
+# Settings that identify an SFTP inbound source; profiles that agree on all of
+# them share one download
+INBOUND_SOURCE_KEYS = ('sftp_inbound_host', 'sftp_inbound_port', 'sftp_inbound_user',
+                       'sftp_inbound_remote_path')
+
+# Settings that identify an SFTP outbound target; no two published profiles may share one
+OUTBOUND_TARGET_KEYS = ('sftp_outbound_host', 'sftp_outbound_port', 'sftp_outbound_remote_path')
+
+
+# =============================================================================
+# PROFILES
+# =============================================================================
+
+def parse_profile_spec(spec: str) -> Tuple[str, str]:
+    """
+    Parse a profile given as NAME=ENV_FILE or ENV_FILE.
+
+    Without a name, the name comes from the file: .env.dev -> dev, qa.env -> qa.
+
+    Raises:
+        ValueError: If the name is empty or not usable as a directory name
+    """
+    name, separator, env_file = spec.partition('=')
+    if not separator:
+        env_file = spec
+        basename = os.path.basename(spec)
+        if basename.startswith('.env.'):
+            name = basename[len('.env.'):]
+        else:
+            name = os.path.splitext(basename)[0].lstrip('.')
+
+    name = name.strip()
+    if not name or name == SHARED_DIR_NAME or os.sep in name or name in ('.', '..'):
+        raise ValueError(f"Invalid profile name in {spec!r}")
+    return name, env_file.strip()
+
+
+@contextmanager
+def _environ(overrides: Dict[str, str]):
+    """Apply environment variable overrides for the duration of the block."""
+    previous = {key: os.environ.get(key) for key in overrides}
+    os.environ.update(overrides)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def load_profile_config(env_file: str) -> Dict:
+    """
+    Build the configuration of one environment: the current environment with
+    the profile's .env file layered on top (the process environment itself is
+    left unchanged).
+
+    Raises:
+        RuntimeError: If the file does not exist or python-dotenv is missing
+    """
+    try:
+        from dotenv import dotenv_values
+    except ImportError:
+        raise RuntimeError("python-dotenv is required for environment profiles") from None
+
+    if not os.path.exists(env_file):
+        raise RuntimeError(f"Environment file not found: {env_file}")
+
+    overrides = {key: value for key, value in dotenv_values(env_file).items() if value is not None}
+    with _environ(overrides):
+        return core.load_config()
+
+
+# =============================================================================
+# SHARED INPUTS
+# =============================================================================
+
+class SharedRecommendations:
+    """
+    Recommendations shared by concurrent runs (config['recommendation_cache']).
+
+    Each (API URL, employee) is fetched once: a run asking for a key another
+    run is already fetching waits for that result. Failed fetches are not
+    kept, so the next run asking retries the call.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._results = {}
+        self._pending = {}
+        self.fetches = 0
+        self.hits = 0
+
+    def get_or_fetch(self, key, fetch) -> List:
+        """
+        Return the result for key, calling fetch() if no run has fetched it yet.
+
+        Raises:
+            Exception: Whatever fetch() raised, if this call fetched and failed
+        """
+        while True:
+            with self._lock:
+                if key in self._results:
+                    self.hits += 1
+                    core.increment_counter('cache.recommendation_hits')
+                    return list(self._results[key])
+                event = self._pending.get(key)
+                if event is None:
+                    event = self._pending[key] = threading.Event()
+                    break
+            event.wait()
+
+        try:
+            result = fetch()
+            with self._lock:
+                self._results[key] = list(result)
+                self.fetches += 1
+            return result
+        finally:
+            with self._lock:
+                del self._pending[key]
+            event.set()
+
+    def get_or_fetch_many(self, keys: List, fetch_many) -> Dict:
+        """
+        Return the results for keys, calling fetch_many(missing keys) once for
+        the keys no run has fetched or is fetching (batch recommender requests).
+
+        fetch_many returns {key: result}; keys it leaves out are fetched again
+        one at a time with fetch_many([key]).
+        """
+        results = {}
+        claimed, waiting = [], []
+        with self._lock:
+            for key in keys:
+                if key in self._results:
+                    self.hits += 1
+                    core.increment_counter('cache.recommendation_hits')
+                    results[key] = list(self._results[key])
+                elif key in self._pending:
+                    waiting.append(key)
+                else:
+                    self._pending[key] = threading.Event()
+                    claimed.append(key)
+
+        if claimed:
+            try:
+                fetched = fetch_many(claimed)
+                with self._lock:
+                    for key in claimed:
+                        if key in fetched:
+                            self._results[key] = list(fetched[key])
+                            self.fetches += 1
+                results.update((key, fetched[key]) for key in claimed if key in fetched)
+            finally:
+                with self._lock:
+                    events = [self._pending.pop(key) for key in claimed]
+                for event in events:
+                    event.set()
+
+        for key in waiting + [key for key in claimed if key not in results]:
+            results[key] = self.get_or_fetch(key, lambda key=key: fetch_many([key])[key])
+        return results
+
+
+def download_shared_inbound_files(configs: Dict[str, Dict], shared_dir: str,
+                                  progress_callback=None) -> Dict[str, Tuple[str, str]]:
+    """
+    Download the inbound files once per distinct SFTP inbound source.
+
+    Args:
+        configs: {profile name: configuration}
+        shared_dir: Directory for the downloads (one subdirectory per source,
+                    named after the first profile using it)
+        progress_callback: Optional callback function for progress updates
+
+    Returns:
+        {profile name: (course_catalog_path, standalone_content_path)}
+
+    Raises:
+        RuntimeError: If a source's files cannot be downloaded
+    """
+    sources = {}
+    for name, config in configs.items():
+        sources.setdefault(tuple(config[key] for key in INBOUND_SOURCE_KEYS), []).append(name)
+
+    inbound_files = {}
+    for profile_names in sources.values():
+        download_config = dict(configs[profile_names[0]])
+        download_config['output_dir'] = download_config['sftp_local_dir'] = os.path.join(
+            shared_dir, profile_names[0])
+        os.makedirs(download_config['output_dir'], exist_ok=True)
+        core.cleanup_output_directory(download_config)
+
+        if progress_callback:
+            progress_callback(f"Downloading inbound files for {', '.join(profile_names)}")
+        paths = core.download_inbound_files(download_config, progress_callback)
+        if not all(paths):
+            raise RuntimeError(f"Failed to download required files for {', '.join(profile_names)}")
+
+        for name in profile_names:
+            inbound_files[name] = paths
+
+    return inbound_files
+
+
+# =============================================================================
+# FAN-OUT RUN
+# =============================================================================
+
+def run_fanout_simulation(config: Dict, profiles: List[Tuple[str, str]], employees_file: str,
+                          publish_enabled: bool = False, zip_enabled: bool = False,
+                          max_workers: int = 0, progress_callback=None) -> Dict:
+    """
+    Run the pipeline for several environments at once, sharing common inputs.
+
+    Args:
+        config: Base configuration; its OUTPUT_DIR holds _shared/ and one
+                directory per profile (a profile's own OUTPUT_DIR is ignored)
+        profiles: [(name, env_file), ...]
+        employees_file: Path to the employees CSV file (same for all environments)
+        publish_enabled: Publish each environment's files to its own SFTP outbound target
+        zip_enabled: Package each environment's files into <its directory>/generated_files.zip
+        max_workers: Environments run at the same time (0 = all)
+        progress_callback: Optional callback function for progress updates;
+                           messages are prefixed with [profile name]
+
+    Returns:
+        Dictionary with environments ({name: run_simulation() result or None}),
+        errors ({name: message} for failed environments), zip_paths ({name: path}),
+        published (None unless publishing was enabled, then True if every
+        environment published), shared_dir, recommendation_fetches and
+        recommendation_hits
+
+    Raises:
+        ValueError: If no profiles are given, a name is used twice, or two
+                    profiles would publish to the same SFTP outbound target
+        RuntimeError: If a profile cannot be loaded or the inbound files cannot be downloaded
+    """
+    def progress(msg):
+        if progress_callback:
+            progress_callback(msg)
+
+    names = [name for name, _ in profiles]
+    if not names:
+        raise ValueError("At least one environment profile is required")
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate profile names: {', '.join(names)}")
+
+    shared_dir = os.path.join(config['output_dir'], SHARED_DIR_NAME)
+    recommendations = SharedRecommendations()
+
+    configs = {}
+    for name, env_file in profiles:
+        profile_config = load_profile_config(env_file)
+        profile_config['output_dir'] = os.path.join(config['output_dir'], name)
+        profile_config['sftp_local_dir'] = profile_config['output_dir']
+        # cProfile supports one active profiler per process
+        profile_config['profile_enabled'] = False
+        # Spark ships the config to executors, so only the local backend shares responses
+        if profile_config['execution_backend'] == 'local':
+            profile_config['recommendation_cache'] = recommendations
+        os.makedirs(profile_config['output_dir'], exist_ok=True)
+        configs[name] = profile_config
+        progress(f"Profile {name}: {env_file} -> {profile_config['output_dir']} "
+                 f"(catalog {profile_config['databricks_catalog']})")
+
+    # Environments run at the same time and name their files alike, so uploads
+    # to a shared target would overwrite each other
+    if publish_enabled:
+        targets = {}
+        for name, profile_config in configs.items():
+            target = tuple(profile_config[key] for key in OUTBOUND_TARGET_KEYS)
+            if target in targets:
+                raise ValueError(f"Profiles {targets[target]} and {name} publish to the same SFTP outbound "
+                                 f"target ({target[0]}:{target[1]}{target[2]})")
+            targets[target] = name
+
+    progress("")
+    progress("Downloading shared inbound files")
+    progress("-" * 80)
+    inbound_files = download_shared_inbound_files(configs, shared_dir, progress_callback)
+    for name, profile_config in configs.items():
+        profile_config['shared_inbound_files'] = inbound_files[name]
+    progress("")
+
+    def run_environment(name: str) -> Dict:
+        def environment_progress(msg):
+            progress(f"[{name}] {msg}")
+
+        environment = core.run_simulation(configs[name], employees_file, publish_enabled, environment_progress)
+        if zip_enabled:
+            result['zip_paths'][name] = core.create_download_zip(
+                configs[name], core.get_run_files(environment) + core.get_run_artifacts(environment),
+                progress_callback=environment_progress)
+        return environment
+
+    result = {
+        'environments': {},
+        'errors': {},
+        'zip_paths': {},
+        'published': None,
+        'shared_dir': shared_dir,
+        'recommendation_fetches': 0,
+        'recommendation_hits': 0,
+    }
+
+    workers = min(len(configs), max_workers) if max_workers > 0 else len(configs)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fanout") as executor:
+        futures = {name: executor.submit(run_environment, name) for name in configs}
+
+        # One failed environment does not stop the others
+        for name, future in futures.items():
+            try:
+                result['environments'][name] = future.result()
+            except Exception as e:
+                result['environments'][name] = None
+                result['errors'][name] = str(e)
+                progress(f"[{name}] ERROR: {e}")
+
+    result['recommendation_fetches'] = recommendations.fetches
+    result['recommendation_hits'] = recommendations.hits
+    if publish_enabled:
+        result['published'] = all(environment is not None and environment['published']
+                                  for environment in result['environments'].values())
+
+    for name, environment in result['environments'].items():
+        if environment is None:
+            progress(f"{name}: failed")
+        else:
+            progress(f"{name}: {environment['completion_count']} completion(s)"
+                     + ("" if environment['published'] is None
+                        else ", published" if environment['published'] else ", publish failed"))
+    progress(f"Recommendations: {recommendations.fetches} fetched, {recommendations.hits} reused")
+
+    return result
+
@@ -0,0 +1,170 @@
+"""
+BTC Fake - Packed (ba_id, content_id) Key Index
+
+Membership checks on (employee, content) pairs - completed assignments,
+recently completed recommendations - pack each pair into one int64
+(ba_id in the high 32 bits, content_id in the low 32 bits) and keep the keys
+in a sorted, de-duplicated NumPy array: 8 bytes per pair instead of a Python
+set of tuples (~150 bytes per pair). Lookups hash the packed keys in C
+(pandas' isin), so there is no per-row interpreter work either.
+
+    completed = PairKeyIndex.from_arrays(completion_user_ids, completion_content_ids)
+    is_completed = completed.isin(assignment_user_ids, assignment_content_ids)
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterable, Tuple
+
+from simulation_content_ids import parse_content_ids
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+# ba_id and content_id must each fit in 32 bits (IDs are 5-10 digit integers)
+KEY_SHIFT = 32
+MAX_BA_ID = 2 ** 31 - 1
+MAX_CONTENT_ID = 2 ** 32 - 1
+
+
+def to_id_array(values) -> np.ndarray:
+    """
+    Convert IDs to an int64 array.
+
+    Accepts integers, numeric strings and comma-formatted strings
+    ("1,234,567", as written to the CSV files).
+
+    Raises:
+        ValueError: If a value is not an integer ID
+    """
+    return parse_content_ids(values)
+
+
+def pack_keys(ba_ids, content_ids) -> np.ndarray:
+    """
+    Pack (ba_id, content_id) pairs into int64 keys.
+
+    Args:
+        ba_ids: Employee IDs (array-like)
+        content_ids: Content IDs (array-like, same length)
+
+    Returns:
+        int64 array of keys, in input order
+
+    Raises:
+        ValueError: If the lengths differ or an ID is out of range
+    """
+    ba_ids = to_id_array(ba_ids)
+    content_ids = to_id_array(content_ids)
+
+    if len(ba_ids) != len(content_ids):
+        raise ValueError(f"Got {len(ba_ids)} ba_ids but {len(content_ids)} content_ids")
+    if len(ba_ids) and (ba_ids.min() < 0 or ba_ids.max() > MAX_BA_ID):
+        raise ValueError(f"ba_id out of range (0..{MAX_BA_ID})")
+    if len(content_ids) and (content_ids.min() < 0 or content_ids.max() > MAX_CONTENT_ID):
+        raise ValueError(f"content_id out of range (0..{MAX_CONTENT_ID})")
+
+    return (ba_ids << KEY_SHIFT) | content_ids
+
+
+def unpack_keys(keys) -> Tuple[np.ndarray, np.ndarray]:
+    """Split int64 keys back into (ba_ids, content_ids) arrays."""
+    import numpy as np
+
+    keys = np.asarray(keys, dtype=np.int64)
+    return keys >> KEY_SHIFT, keys & MAX_CONTENT_ID
+
+
+def _sorted_unique(keys) -> np.ndarray:
+    # np.sort + adjacent compare; np.unique is several times slower on int64
+    import numpy as np
+
+    keys = np.sort(np.asarray(keys, dtype=np.int64))
+    if len(keys) < 2:
+        return keys
+    distinct = np.empty(len(keys), dtype=bool)
+    distinct[0] = True
+    np.not_equal(keys[1:], keys[:-1], out=distinct[1:])
+    return keys[distinct]
+
+
+class PairKeyIndex:
+    """
+    Immutable set of (ba_id, content_id) pairs stored as sorted int64 keys.
+
+    Build it with from_pairs(), from_arrays() or from_frame(); combine with
+    union() / difference(); query with isin() (vectorized) or `in` (one pair).
+    """
+
+    __slots__ = ('keys',)
+
+    def __init__(self, keys=None):
+        self.keys = _sorted_unique(keys if keys is not None else [])
+
+    @classmethod
+    def from_arrays(cls, ba_ids, content_ids) -> PairKeyIndex:
+        """Build the index from parallel ID arrays."""
+        return cls(pack_keys(ba_ids, content_ids))
+
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[Tuple[int, int]]) -> PairKeyIndex:
+        """Build the index from (ba_id, content_id) tuples."""
+        pairs = list(pairs)
+        if not pairs:
+            return cls()
+        ba_ids, content_ids = zip(*pairs)
+        return cls.from_arrays(list(ba_ids), list(content_ids))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, ba_column: str = 'ba_id',
+                   content_column: str = 'content_id') -> PairKeyIndex:
+        """Build the index from two columns of a DataFrame."""
+        return cls.from_arrays(df[ba_column], df[content_column])
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, pair) -> bool:
+        ba_id, content_id = pair
+        return bool(self.isin([ba_id], [content_id])[0])
+
+    def __repr__(self) -> str:
+        return f"PairKeyIndex({len(self)} pairs)"
+
+    def isin(self, ba_ids, content_ids) -> np.ndarray:
+        """
+        Vectorized membership test.
+
+        Args:
+            ba_ids: Employee IDs (array-like)
+            content_ids: Content IDs (array-like, same length)
+
+        Returns:
+            Boolean array, True where the pair is in the index
+        """
+        return self.contains_keys(pack_keys(ba_ids, content_ids))
+
+    def contains_keys(self, keys) -> np.ndarray:
+        """Vectorized membership test for already packed keys."""
+        import numpy as np
+        import pandas as pd
+
+        keys = np.asarray(keys, dtype=np.int64)
+        if not len(self.keys):
+            return np.zeros(len(keys), dtype=bool)
+        return pd.Series(keys, copy=False).isin(self.keys).to_numpy()
+
+    def union(self, other: PairKeyIndex) -> PairKeyIndex:
+        """Pairs in either index."""
+        import numpy as np
+
+        return PairKeyIndex(np.concatenate([self.keys, other.keys]))
+
+    def difference(self, other: PairKeyIndex) -> PairKeyIndex:
+        """Pairs in this index but not in other."""
+        return PairKeyIndex(self.keys[~other.contains_keys(self.keys)])
+
+    def to_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the pairs as sorted (ba_ids, content_ids) arrays."""
+        return unpack_keys(self.keys)
@@ -0,0 +1,214 @@
+"""
+BTC Fake - Population-Level Completion Engine
+
+Vectorized equivalent of calling simulation_core.process_employee() for every
+employee. The decision logic runs once over three tables:
+
+- manager assignments:   ba_id, content_id, course_name, source
+- AI recommendations:    ba_id, content_id, course_name, source
+- recent completions:    ba_id, content_id (last 13 days)
+
+Rows keep the order of each employee's list, so type 'b' "takes the first"
+entry exactly as the per-employee code does.
+
+Used by simulate_completions() when COMPLETION_ENGINE=vectorized.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import simulation_core as core
+from simulation_keys import PairKeyIndex
+from simulation_records import CompletionRecord, TrainingItem
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from simulation_catalog import CourseCatalogIndex
+
+TRAINING_COLUMNS = ['ba_id', 'content_id', 'course_name', 'source']
+RECENT_COMPLETION_COLUMNS = ['ba_id', 'content_id']
+COMPLETION_COLUMNS = list(CompletionRecord._fields)
+
+
+# =============================================================================
+# INPUT TABLES
+# =============================================================================
+
+def build_training_table(training: Dict[int, List[TrainingItem]]) -> pd.DataFrame:
+    """
+    Flatten per-employee training lists (as passed to process_employee) into a table.
+
+    Args:
+        training: {employee_id: [TrainingItem, ...]} for manager assignments or
+                  AI recommendations
+
+    Returns:
+        DataFrame with TRAINING_COLUMNS, in list order per employee
+    """
+    import pandas as pd
+
+    ba_ids = [employee_id for employee_id, courses in training.items() for _ in courses]
+    courses = [course for courses in training.values() for course in courses]
+    content_ids, course_names, sources = zip(*courses) if courses else ((), (), ())
+
+    return pd.DataFrame({
+        'ba_id': pd.array(ba_ids, dtype='int64'),
+        'content_id': pd.array(content_ids, dtype='int64'),
+        'course_name': list(course_names),
+        'source': list(sources),
+    }, columns=TRAINING_COLUMNS)
+
+
+def build_manager_assignments_table(assignments_df: pd.DataFrame,
+                                    catalog_index: Optional[CourseCatalogIndex] = None) -> pd.DataFrame:
+    """
+    Build the manager assignments table from NonCompletedAssignments rows.
+
+    Same content IDs, names and order as calling
+    simulation_core.get_manager_assignments_for_employee() for every employee.
+
+    Args:
+        assignments_df: DataFrame with UserID and TrainingElementId columns
+        catalog_index: CourseCatalog index used to name content missing from
+                       CONTENT_NAME_LOOKUP
+
+    Returns:
+        DataFrame with TRAINING_COLUMNS
+    """
+    import pandas as pd
+
+    if assignments_df.empty:
+        return pd.DataFrame({column: [] for column in TRAINING_COLUMNS}).astype(
+            {'ba_id': 'int64', 'content_id': 'int64'})
+
+    content_ids = pd.Series(core.parse_content_ids(assignments_df['TrainingElementId']),
+                            index=assignments_df.index)
+    content_keys = content_ids.astype(str)
+    course_names = content_keys.map(core.CONTENT_NAME_LOOKUP)
+    missing = course_names.isna()
+    if missing.any():
+        # A run assigns a few hundred distinct content IDs: name each one once
+        names = {content_id: core.get_content_name(content_id, catalog_index)
+                 for content_id in content_ids[missing].unique().tolist()}
+        course_names[missing] = content_ids[missing].map(names)
+
+    return pd.DataFrame({
+        'ba_id': assignments_df['UserID'].astype('int64').to_numpy(),
+        'content_id': content_ids.to_numpy(),
+        'course_name': course_names.to_numpy(),
+        'source': "manager",
+    }, columns=TRAINING_COLUMNS)
+
+
+def build_recent_completions_table(recent_completions: Dict[int, set]) -> pd.DataFrame:
+    """
+    Build the recent completions table from {employee_id: set of content IDs}.
+
+    Returns:
+        DataFrame with RECENT_COMPLETION_COLUMNS
+    """
+    import pandas as pd
+
+    rows = [(employee_id, content_id)
+            for employee_id, content_ids in recent_completions.items()
+            for content_id in content_ids]
+    return pd.DataFrame(rows, columns=RECENT_COMPLETION_COLUMNS, dtype='int64')
+
+
+# =============================================================================
+# ENGINE
+# =============================================================================
+
+def simulate_population_completions(employees_df: pd.DataFrame, manager_df: pd.DataFrame,
+                                    recommendations_df: pd.DataFrame,
+                                    recent_completions_df: pd.DataFrame,
+                                    now: Optional[datetime] = None,
+                                    clock: Optional[core.RunClock] = None) -> pd.DataFrame:
+    """
+    Decide the completions of a whole population in one pass.
+
+    Applies the process_employee() rules with table operations:
+    AI recommendations completed in the last 13 days are dropped (manager
+    assignments never are), each employee's training is manager assignments
+    followed by the remaining recommendations, type 'a' completes all of it,
+    type 'b' the first entry and any other type nothing.
+
+    Args:
+        employees_df: DataFrame with employee_id and employee_edu_type columns
+                      (output order follows its rows)
+        manager_df: Manager assignments table (TRAINING_COLUMNS)
+        recommendations_df: AI recommendations table (TRAINING_COLUMNS)
+        recent_completions_df: Recent completions table (RECENT_COMPLETION_COLUMNS)
+        now: Timezone-aware simulated time (default: current time)
+        clock: Run clock; takes precedence over now
+
+    Returns:
+        DataFrame with COMPLETION_COLUMNS, row-for-row identical to the
+        concatenated process_employee() results
+    """
+    import numpy as np
+    import pandas as pd
+
+    # Recent-completion anti-join, AI recommendations only
+    if len(recent_completions_df) and len(recommendations_df):
+        recent = PairKeyIndex.from_frame(recent_completions_df)
+        recommendations_df = recommendations_df[
+            ~recent.isin(recommendations_df['ba_id'], recommendations_df['content_id'])]
+
+    # Manager assignments first, then recommendations, each in list order:
+    # within an employee, the row position in this table is the training order
+    training = pd.concat([manager_df[TRAINING_COLUMNS], recommendations_df[TRAINING_COLUMNS]],
+                         ignore_index=True)
+
+    employee_ids = employees_df['employee_id'].to_numpy()
+    employee_types = employees_df['employee_edu_type'].astype(str).str.lower().str.strip().to_numpy()
+
+    # (employee row, training row) pairs
+    employee_index = pd.Index(employee_ids)
+    if employee_index.is_unique:
+        employee_pos = employee_index.get_indexer(training['ba_id'].to_numpy())
+        training_idx = np.flatnonzero(employee_pos >= 0)
+        employee_pos = employee_pos[training_idx]
+    else:
+        pairs = pd.DataFrame({'ba_id': employee_ids, 'employee_pos': np.arange(len(employee_ids))}).merge(
+            pd.DataFrame({'ba_id': training['ba_id'].to_numpy(), 'training_idx': np.arange(len(training))}),
+            on='ba_id', sort=False)
+        employee_pos = pairs['employee_pos'].to_numpy()
+        training_idx = pairs['training_idx'].to_numpy()
+
+    order = np.lexsort((training_idx, employee_pos))
+    employee_pos = employee_pos[order]
+    training_idx = training_idx[order]
+
+    # Type a takes everything, type b takes the first entry
+    is_first = np.ones(len(employee_pos), dtype=bool)
+    is_first[1:] = employee_pos[1:] != employee_pos[:-1]
+    employee_type = employee_types[employee_pos]
+    keep = (employee_type == 'a') | ((employee_type == 'b') & is_first)
+    employee_pos = employee_pos[keep]
+    training_idx = training_idx[keep]
+
+    clock = clock or core.RunClock(now)
+    if clock.training_time_distribution == 'fixed':
+        # Same times for every row: broadcast the scalars
+        start_times, end_times = clock.training_time
+    else:
+        start_times, end_times = clock.training_time_arrays(len(employee_pos))
+
+    return pd.DataFrame({
+        'UserId': employee_ids[employee_pos],
+        'ContentId': core.format_content_ids(training['content_id'].to_numpy()[training_idx]),
+        'DateStarted': start_times,
+        'DateCompleted': end_times,
+        'CourseName': training['course_name'].to_numpy()[training_idx],
+        'Source': training['source'].to_numpy()[training_idx],
+    }, columns=COMPLETION_COLUMNS)
+
+
+def completions_to_records(completions_df: pd.DataFrame) -> List[CompletionRecord]:
+    """Convert the completion table to the CompletionRecord list process_employee() returns."""
+    return [CompletionRecord._make(row)
+            for row in completions_df[COMPLETION_COLUMNS].itertuples(index=False, name=None)]
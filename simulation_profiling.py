@@ -0,0 +1,226 @@
+"""
+BTC Fake - Run Profiling
+
+Opt-in profiling for simulation runs (PROFILE_RUN=true, the "Enable Profiling"
+checkbox in app.py, or `python -m simulation_cli run --profile`).
+
+While a run is profiled:
+- cProfile records deterministic per-function timings (profile.pstats)
+- a sampling thread records the main thread's call stacks in collapsed-stack
+  format, ready for flamegraph.pl / speedscope (profile_collapsed.txt)
+- tracemalloc records the peak memory of every pipeline stage and the top
+  allocation sites (profile_memory.txt)
+
+Only the Python standard library is used.
+"""
+
+import cProfile
+import os
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from typing import Dict, List
+
+PSTATS_FILENAME = "profile.pstats"
+COLLAPSED_STACKS_FILENAME = "profile_collapsed.txt"
+MEMORY_REPORT_FILENAME = "profile_memory.txt"
+
+# Stages nested deeper than this (e.g. per-employee stages) only update peaks;
+# they do not trigger tracemalloc snapshots, which are expensive
+SNAPSHOT_MAX_STAGE_DEPTH = 2
+
+TOP_ALLOCATION_SITES = 25
+
+
+class RunProfiler:
+    """
+    Profiles the calling thread between start() and stop().
+
+    Register on_stage_enter / on_stage_exit as RunMetrics stage listeners to
+    get peak memory per stage.
+    """
+
+    def __init__(self, sample_interval: float = 0.005, tracemalloc_frames: int = 10):
+        self.sample_interval = sample_interval
+        self.tracemalloc_frames = tracemalloc_frames
+
+        self._profile = cProfile.Profile()
+        self._stacks = Counter()
+        self._stop_event = threading.Event()
+        self._sampler = None
+        self._target_thread_id = None
+        self._started_tracemalloc = False
+
+        # Stack of [stage_name, peak_bytes] for stages in progress
+        self._stage_stack = []
+        self._stage_peaks = {}
+        self._snapshot = None
+        self._snapshot_stage = None
+        self._snapshot_bytes = -1
+
+    # -------------------------------------------------------------------------
+    # Lifecycle
+    # -------------------------------------------------------------------------
+
+    def start(self) -> None:
+        """Start cProfile, the stack sampler and tracemalloc for the calling thread."""
+        self._target_thread_id = threading.get_ident()
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.tracemalloc_frames)
+            self._started_tracemalloc = True
+
+        self._sampler = threading.Thread(target=self._sample_loop, name="run-profiler-sampler",
+                                         daemon=True)
+        self._sampler.start()
+        self._profile.enable()
+
+    def stop(self) -> None:
+        """Stop profiling. Collected data is kept for write_artifacts()."""
+        self._profile.disable()
+
+        self._stop_event.set()
+        if self._sampler:
+            self._sampler.join()
+
+        if self._snapshot is None and tracemalloc.is_tracing():
+            self._snapshot = tracemalloc.take_snapshot()
+            self._snapshot_stage = "end of run"
+
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+    # -------------------------------------------------------------------------
+    # Stage hooks (RunMetrics listeners)
+    # -------------------------------------------------------------------------
+
+    def on_stage_enter(self, name: str) -> None:
+        """Start measuring peak memory for a stage."""
+        if not tracemalloc.is_tracing():
+            return
+
+        # Fold the current peak into the enclosing stage before resetting it
+        current_peak = tracemalloc.get_traced_memory()[1]
+        if self._stage_stack:
+            self._stage_stack[-1][1] = max(self._stage_stack[-1][1], current_peak)
+
+        tracemalloc.reset_peak()
+        self._stage_stack.append([name, 0])
+
+    def on_stage_exit(self, name: str) -> None:
+        """Record the peak memory of a finished stage."""
+        if not tracemalloc.is_tracing() or not self._stage_stack:
+            return
+
+        stage_name, stage_peak = self._stage_stack.pop()
+        current, peak = tracemalloc.get_traced_memory()
+        stage_peak = max(stage_peak, peak)
+
+        stats = self._stage_peaks.setdefault(stage_name, {'count': 0, 'peak_bytes': 0})
+        stats['count'] += 1
+        stats['peak_bytes'] = max(stats['peak_bytes'], stage_peak)
+
+        if self._stage_stack:
+            self._stage_stack[-1][1] = max(self._stage_stack[-1][1], stage_peak)
+
+        # Keep a snapshot from the point where the most memory was still live
+        if len(self._stage_stack) < SNAPSHOT_MAX_STAGE_DEPTH and current > self._snapshot_bytes:
+            self._snapshot = tracemalloc.take_snapshot()
+            self._snapshot_stage = stage_name
+            self._snapshot_bytes = current
+
+    # -------------------------------------------------------------------------
+    # Sampling
+    # -------------------------------------------------------------------------
+
+    def _sample_loop(self) -> None:
+        while not self._stop_event.wait(self.sample_interval):
+            frame = sys._current_frames().get(self._target_thread_id)
+            if frame is None:
+                continue
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+
+            self._stacks[";".join(reversed(stack))] += 1
+
+    # -------------------------------------------------------------------------
+    # Reports
+    # -------------------------------------------------------------------------
+
+    def get_stage_peaks(self) -> Dict:
+        """Return {stage_name: {'count', 'peak_bytes'}} for all profiled stages."""
+        return {name: dict(stats) for name, stats in self._stage_peaks.items()}
+
+    def write_artifacts(self, output_dir: str) -> List[str]:
+        """
+        Write the pstats dump, collapsed stacks and memory report.
+
+        Args:
+            output_dir: Run output directory
+
+        Returns:
+            List of written file paths
+        """
+        os.makedirs(output_dir, exist_ok=True)
+
+        pstats_path = os.path.join(output_dir, PSTATS_FILENAME)
+        self._profile.dump_stats(pstats_path)
+
+        collapsed_path = os.path.join(output_dir, COLLAPSED_STACKS_FILENAME)
+        with open(collapsed_path, 'w') as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        memory_path = os.path.join(output_dir, MEMORY_REPORT_FILENAME)
+        with open(memory_path, 'w') as f:
+            f.write("Peak traced memory per stage\n")
+            f.write("=" * 80 + "\n")
+            for name, stats in sorted(self._stage_peaks.items(),
+                                      key=lambda item: item[1]['peak_bytes'], reverse=True):
+                f.write(f"{name:<40} {stats['peak_bytes'] / 1024 / 1024:>10.2f} MiB"
+                        f"   ({stats['count']} call(s))\n")
+
+            f.write("\n")
+            f.write(f"Top {TOP_ALLOCATION_SITES} allocation sites (snapshot after: {self._snapshot_stage})\n")
+            f.write("=" * 80 + "\n")
+            if self._snapshot is not None:
+                snapshot = self._snapshot.filter_traces([
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+                ])
+                for stat in snapshot.statistics('lineno')[:TOP_ALLOCATION_SITES]:
+                    frame = stat.traceback[0]
+                    f.write(f"{frame.filename}:{frame.lineno}: "
+                            f"{stat.size / 1024:.1f} KiB in {stat.count} block(s)\n")
+
+        return [pstats_path, collapsed_path, memory_path]
+
+
+def profile_call(output_dir: str, func, *args, **kwargs):
+    """
+    Run func(*args, **kwargs) under a RunProfiler and write the artifacts.
+
+    Convenience wrapper for notebooks and ad-hoc scripts. Per-stage memory
+    peaks are only recorded for simulation_core runs (see run_simulation).
+
+    Args:
+        output_dir: Directory for the profile artifacts
+        func: Callable to profile
+
+    Returns:
+        Tuple of (func result, list of artifact paths)
+    """
+    profiler = RunProfiler()
+    profiler.start()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        profiler.stop()
+
+    return result, profiler.write_artifacts(output_dir)
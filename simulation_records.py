@@ -0,0 +1,130 @@
+"""
+BTC Fake - Record Types
+
+Fixed-layout, immutable records for the rows that flow through the pipeline:
+
+- TrainingItem:      a manager assignment or AI recommendation, as passed to
+                     process_employee()
+- CompletionRecord:  a ContentUserCompletion row produced by process_employee()
+- AssignmentRecord:  a NonCompletedAssignments row
+
+Records are validated once where data enters the pipeline (recommender
+response, NonCompletedAssignments CSV, Databricks rows), so the per-employee
+loops work on known-good values without re-checking types and keys. They are
+named tuples (no per-instance __dict__), roughly a third of the size of the
+equivalent dicts, and field names match the CSV columns, so a list of records
+converts straight to a DataFrame.
+
+Records also keep dict-style read access (record['UserId'],
+record.get('source')) for code written against the earlier dict rows.
+"""
+
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+from simulation_content_ids import parse_content_id
+
+
+class _FieldAccess:
+    """Read-only access to a named tuple's fields by name, like a dict."""
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key not in self._fields:
+                raise KeyError(key)
+            return getattr(self, key)
+        return super().__getitem__(key)
+
+    def get(self, key: str, default=None):
+        """Return a field's value, or default if there is no such field."""
+        return getattr(self, key) if key in self._fields else default
+
+    def to_dict(self) -> Dict:
+        """Return the record as a plain dict."""
+        return dict(zip(self._fields, self))
+
+
+class _TrainingItem(NamedTuple):
+    recommended_content_id: int
+    recommended_content: str
+    source: str
+
+
+class _CompletionRecord(NamedTuple):
+    UserId: int
+    ContentId: str
+    DateStarted: str
+    DateCompleted: str
+    CourseName: str
+    Source: str
+
+
+class _AssignmentRecord(NamedTuple):
+    UserID: int
+    CreateDate_text: str
+    RequestId: str
+    TrainingElementId: str
+    Start_Date_text: str
+    DueDate_text: str
+    ContentType: str
+
+
+class TrainingItem(_FieldAccess, _TrainingItem):
+    """A training an employee can complete: content ID, content name and source ('manager' or 'ai')."""
+
+    __slots__ = ()
+
+
+class CompletionRecord(_FieldAccess, _CompletionRecord):
+    """A completed training (ContentUserCompletion columns plus CourseName and Source)."""
+
+    __slots__ = ()
+
+
+class AssignmentRecord(_FieldAccess, _AssignmentRecord):
+    """An open assignment (NonCompletedAssignments columns)."""
+
+    __slots__ = ()
+
+
+# =============================================================================
+# BOUNDARY PARSING
+# =============================================================================
+
+def parse_recommendation(item) -> TrainingItem:
+    """
+    Validate one ML Training Recommender API entry.
+
+    Args:
+        item: Entry of the response's ml_recommendations list
+
+    Returns:
+        TrainingItem with source 'ai'
+
+    Raises:
+        ValueError: If the entry is not an object with a recommended_content_id
+    """
+    if not isinstance(item, dict):
+        raise ValueError(f"Recommendation is not an object: {item!r}")
+    if "recommended_content_id" not in item:
+        raise ValueError(f"Recommendation missing 'recommended_content_id': {item!r}")
+
+    return TrainingItem(parse_content_id(item["recommended_content_id"]),
+                        item.get("recommended_content", "Unknown"), "ai")
+
+
+def parse_recommendations(items: Iterable) -> Tuple[List[TrainingItem], List[str]]:
+    """
+    Validate a list of ML Training Recommender API entries.
+
+    Returns:
+        Tuple of (valid items in response order, error messages for skipped entries)
+    """
+    recommendations, errors = [], []
+    for item in items:
+        try:
+            recommendations.append(parse_recommendation(item))
+        except ValueError as e:
+            errors.append(str(e))
+    return recommendations, errors
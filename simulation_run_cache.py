@@ -0,0 +1,287 @@
+"""
+BTC Fake - Run Result Cache
+
+Testers often re-run the same employees file against unchanged inbound files
+within minutes. The Gradio app keeps each run's download ZIP and summary under
+a fingerprint of its inputs and, when the same inputs come back, returns them
+instead of running the pipeline again (a "Force rerun" option bypasses it):
+
+- the employees file contents (SHA-256, so re-uploads of the same file match)
+- the CourseCatalog and StandAloneContent file names the run would download
+  (one SFTP inbound directory listing)
+- the configuration (every setting, secrets included; only the digest is kept)
+- the PT date of the run
+- the state tables: row count and latest update_date / completion_date of
+  content_assignments and content_completion (warehouse, or the local mirror
+  for offline runs), so a write-back or ingest since the cached run is a miss.
+  Changes that keep both the same (a deletion matched by an insertion on the
+  same day) go unnoticed; tick "Force rerun" after such edits
+
+Runs that publish or write back state always run, so their side effects happen.
+
+Entries live in RUN_CACHE_DIR (default <OUTPUT_DIR>/_run_cache, which the
+output cleanup leaves alone), one directory per fingerprint. They expire after
+RUN_CACHE_TTL_MINUTES, and the least recently used entries are evicted while
+the cache is larger than RUN_CACHE_MAX_BYTES.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+import simulation_core as core
+
+ENTRY_FILENAME = "entry.json"
+ZIP_FILENAME = "generated_files.zip"
+
+# Default subdirectory of OUTPUT_DIR holding the cache
+CACHE_DIR_NAME = "_run_cache"
+
+# Bump when the fingerprint inputs change, so old entries stop matching
+FINGERPRINT_VERSION = 2
+
+# State tables and the date column whose maximum marks their last change
+STATE_WATERMARK_COLUMNS = (('content_assignments', 'update_date'), ('content_completion', 'completion_date'))
+
+# Settings that do not change a run's files
+_UNHASHED_CONFIG_KEYS = ('run_cache_enabled', 'run_cache_dir', 'run_cache_ttl_minutes',
+                         'run_cache_max_bytes', 'recommendation_cache', 'shared_inbound_files',
+                         'sftp_transfer_retries', 'sftp_retry_delay_seconds', 'sftp_verify_checksum',
+                         'sftp_stream_parse')
+
+
+# =============================================================================
+# FINGERPRINT
+# =============================================================================
+
+def get_run_cache_dir(config: Dict) -> str:
+    """Return the cache directory (RUN_CACHE_DIR, default <OUTPUT_DIR>/_run_cache)."""
+    return config.get('run_cache_dir') or os.path.join(config['output_dir'], CACHE_DIR_NAME)
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_config(config: Dict) -> str:
+    """Return the SHA-256 hex digest of the settings that shape a run's files."""
+    settings = {key: value for key, value in config.items() if key not in _UNHASHED_CONFIG_KEYS}
+    encoded = json.dumps(settings, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def get_state_watermark(config: Dict) -> Optional[str]:
+    """
+    Summarize the state tables a run reads: row count and latest date column
+    value of each, from the warehouse (or DATABRICKS_SQLITE_PATH stand-in), else
+    from the local mirror (STATE_STORE_PATH).
+
+    Returns:
+        Watermark text, or None if no state source is configured
+
+    Raises:
+        Exception: If the state source cannot be queried
+    """
+    target_config = config
+    if not core.is_databricks_configured(config):
+        if not (config['state_store_path'] and os.path.exists(config['state_store_path'])):
+            return None
+        target_config = dict(config, databricks_sqlite_path=config['state_store_path'])
+
+    connection = core.connect_databricks(target_config)
+    try:
+        cursor = connection.cursor()
+        parts = []
+        for table, column in STATE_WATERMARK_COLUMNS:
+            cursor.execute(f"SELECT COUNT(*), MAX({column}) "
+                           f"FROM {core.get_state_table_name(target_config, table)}")
+            count, latest = cursor.fetchone()
+            parts.append(f"{table}:{count}:{latest}")
+        cursor.close()
+    finally:
+        connection.close()
+    return ";".join(parts)
+
+
+def compute_run_fingerprint(config: Dict, employees_file: str, course_catalog_filename: Optional[str],
+                            standalone_content_filename: Optional[str],
+                            now: Optional[datetime] = None, state_watermark: Optional[str] = None) -> str:
+    """
+    Fingerprint the inputs of a run.
+
+    Args:
+        config: Configuration dictionary (as passed to run_simulation)
+        employees_file: Path to the employees CSV file
+        course_catalog_filename: CourseCatalog file the run would download
+        standalone_content_filename: StandAloneContent file the run would download
+        now: Timezone-aware run time (default: RUN_CLOCK_NOW, else the current time)
+        state_watermark: get_state_watermark() before the run
+
+    Returns:
+        Hex digest identifying the run's inputs
+    """
+    run_now = core.RunClock.from_config(config, now).now
+
+    parts = {
+        'version': FINGERPRINT_VERSION,
+        'employees': hash_file(employees_file),
+        'course_catalog': course_catalog_filename,
+        'standalone_content': standalone_content_filename,
+        'config': hash_config(config),
+        'pt_date': run_now.date().isoformat(),
+        'state': state_watermark,
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+# =============================================================================
+# CACHE
+# =============================================================================
+
+class RunCache:
+    """
+    Download ZIPs and summaries of past runs, keyed by run fingerprint.
+
+    Each entry is a directory <fingerprint>/ with the ZIP and an entry.json
+    (summary, created_at, last_used_at, bytes). Entries are written to a
+    temporary directory and renamed into place, so readers never see a
+    partial entry.
+    """
+
+    def __init__(self, directory: str, ttl_seconds: float, max_bytes: int):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict) -> RunCache:
+        """Build the cache from the RUN_CACHE_* settings."""
+        return cls(get_run_cache_dir(config), config['run_cache_ttl_minutes'] * 60,
+                   config['run_cache_max_bytes'])
+
+    def _entry_dir(self, fingerprint: str) -> str:
+        return os.path.join(self.directory, fingerprint)
+
+    def _read_entry(self, fingerprint: str) -> Optional[Dict]:
+        try:
+            with open(os.path.join(self._entry_dir(fingerprint), ENTRY_FILENAME)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_entry(self, fingerprint: str, entry: Dict):
+        path = os.path.join(self._entry_dir(fingerprint), ENTRY_FILENAME)
+        with open(path + ".tmp", 'w') as f:
+            json.dump(entry, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def _remove(self, fingerprint: str):
+        shutil.rmtree(self._entry_dir(fingerprint), ignore_errors=True)
+
+    def _is_expired(self, entry: Dict, now: float) -> bool:
+        return now - entry['created_at'] > self.ttl_seconds
+
+    def get(self, fingerprint: str) -> Optional[Dict]:
+        """
+        Look up a run.
+
+        Returns:
+            Dictionary with zip_path, summary and created_at (epoch seconds),
+            or None if there is no unexpired entry
+        """
+        with self._lock:
+            entry = self._read_entry(fingerprint)
+            if entry is None:
+                return None
+            now = time.time()
+            zip_path = os.path.join(self._entry_dir(fingerprint), ZIP_FILENAME)
+            if self._is_expired(entry, now) or not os.path.exists(zip_path):
+                self._remove(fingerprint)
+                return None
+
+            entry['last_used_at'] = now
+            self._write_entry(fingerprint, entry)
+            return {'zip_path': zip_path, 'summary': entry['summary'], 'created_at': entry['created_at']}
+
+    def put(self, fingerprint: str, zip_path: str, summary: str) -> Optional[str]:
+        """
+        Store a run's ZIP (copied) and summary, then evict.
+
+        Returns:
+            Path of the cached ZIP, or None if the ZIP alone exceeds RUN_CACHE_MAX_BYTES
+        """
+        size = os.path.getsize(zip_path)
+        if size > self.max_bytes:
+            return None
+
+        os.makedirs(self.directory, exist_ok=True)
+        staging_dir = tempfile.mkdtemp(prefix=".staging-", dir=self.directory)
+        try:
+            shutil.copyfile(zip_path, os.path.join(staging_dir, ZIP_FILENAME))
+            now = time.time()
+            with open(os.path.join(staging_dir, ENTRY_FILENAME), 'w') as f:
+                json.dump({'summary': summary, 'created_at': now, 'last_used_at': now, 'bytes': size},
+                          f, indent=2)
+
+            with self._lock:
+                self._remove(fingerprint)
+                os.replace(staging_dir, self._entry_dir(fingerprint))
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+        self.evict(keep=fingerprint)
+        return os.path.join(self._entry_dir(fingerprint), ZIP_FILENAME)
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """
+        Remove expired entries, then the least recently used ones until the
+        cache fits in max_bytes.
+
+        Args:
+            keep: Fingerprint never evicted for size (the entry just stored)
+
+        Returns:
+            Number of entries removed
+        """
+        if not os.path.isdir(self.directory):
+            return 0
+
+        with self._lock:
+            now = time.time()
+            removed = 0
+            entries = []
+            for fingerprint in os.listdir(self.directory):
+                if fingerprint.startswith('.'):
+                    continue
+                entry = self._read_entry(fingerprint)
+                if entry is None or self._is_expired(entry, now):
+                    self._remove(fingerprint)
+                    removed += 1
+                else:
+                    entries.append((entry['last_used_at'], fingerprint, entry['bytes']))
+
+            total = sum(size for _, _, size in entries)
+            for _, fingerprint, size in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if fingerprint == keep:
+                    continue
+                self._remove(fingerprint)
+                total -= size
+                removed += 1
+
+        return removed
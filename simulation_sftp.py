@@ -0,0 +1,486 @@
+"""
+BTC Fake - Resumable SFTP Transfers
+
+Downloads from SFTP inbound and uploads to SFTP outbound survive dropped
+links instead of starting over:
+
+- the file is transferred in chunks to a temporary name (<name>.part) and
+  renamed to its real name only after the size, and the checksum where the
+  server supports it, match; a partial file is never taken for a complete one
+- when the link drops, the session is reopened and the transfer resumes from
+  the last confirmed offset (the bytes on disk for downloads, the size of the
+  remote .part file for uploads), up to SFTP_TRANSFER_RETRIES times with an
+  exponential backoff starting at SFTP_RETRY_DELAY_SECONDS
+- an interrupted download is kept across runs (cleanup_output_directory()
+  leaves .part files alone for PARTIAL_MAX_AGE_SECONDS) and resumed by the
+  next run, as long as the remote file's size and modification time are
+  unchanged
+
+A download can also feed its bytes, in order, to a CsvStreamParser, so the
+file is parsed while it arrives instead of being read again afterwards.
+
+Checksums use the "check-file" SFTP extension (SHA-1 per 64 KB block,
+compared with the same hashes of the local file). OpenSSH does not
+implement it; there the size check, and for downloads an unchanged remote
+size and modification time, is what is verified.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+import queue
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Optional
+
+from simulation_core import increment_counter
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+PARTIAL_SUFFIX = ".part"
+
+# Remote size/mtime an interrupted download belongs to
+PARTIAL_STATE_SUFFIX = ".part.json"
+
+# Interrupted downloads older than this are removed by the output cleanup
+PARTIAL_MAX_AGE_SECONDS = 7 * 24 * 3600
+
+# Bytes read or written per chunk (the largest SFTP request paramiko sends)
+CHUNK_SIZE = 32768
+
+# check-file hash and block size; paramiko-based servers hash blocks over
+# 64 KB incorrectly, so hashes are taken per 64 KB block
+CHECKSUM_ALGORITHM = "sha1"
+CHECKSUM_BLOCK_SIZE = 65536
+
+
+def is_partial_transfer(path: str) -> bool:
+    """True for the temporary files of an unfinished transfer."""
+    return path.endswith(PARTIAL_SUFFIX) or path.endswith(PARTIAL_STATE_SUFFIX)
+
+
+class SftpConnection:
+    """
+    An SFTP session in a remote directory that can be reopened after the
+    link drops.
+    """
+
+    def __init__(self, host: str, port: int, username: str, password: str, remote_path: str):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.remote_path = remote_path
+        self._transport = None
+        self._sftp = None
+
+    @classmethod
+    def from_config(cls, config: Dict, direction: str) -> SftpConnection:
+        """Build the connection to the SFTP 'inbound' or 'outbound' server."""
+        prefix = f"sftp_{direction}_"
+        return cls(config[prefix + 'host'], config[prefix + 'port'], config[prefix + 'user'],
+                   config[prefix + 'password'], config[prefix + 'remote_path'])
+
+    @property
+    def sftp(self):
+        """The open paramiko SFTPClient (connecting first if needed)."""
+        if self._sftp is None:
+            self.open()
+        return self._sftp
+
+    def open(self):
+        """Connect, log in and change to the remote directory."""
+        import paramiko
+
+        self.close()
+        transport = paramiko.Transport((self.host, self.port))
+        try:
+            transport.connect(username=self.username, password=self.password)
+            sftp = paramiko.SFTPClient.from_transport(transport)
+            sftp.chdir(self.remote_path)
+        except BaseException:
+            transport.close()
+            raise
+        self._transport, self._sftp = transport, sftp
+        return sftp
+
+    def close(self) -> None:
+        """Close the session (it is reopened on next use)."""
+        if self._sftp is not None:
+            try:
+                self._sftp.close()
+            except Exception:
+                pass
+        if self._transport is not None:
+            self._transport.close()
+        self._transport = self._sftp = None
+
+    def __enter__(self) -> SftpConnection:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+# =============================================================================
+# CHECKSUMS
+# =============================================================================
+
+def local_checksum(path: str) -> bytes:
+    """SHA-1 of every CHECKSUM_BLOCK_SIZE block of a local file, concatenated."""
+    digest = b''
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHECKSUM_BLOCK_SIZE), b''):
+            digest += hashlib.new(CHECKSUM_ALGORITHM, block).digest()
+    return digest
+
+
+def remote_checksum(sftp, remote_name: str) -> Optional[bytes]:
+    """
+    The server's hashes of a remote file, in local_checksum() form, or None
+    if the server does not support the check-file extension.
+    """
+    try:
+        with sftp.open(remote_name, 'rb') as remote_file:
+            return remote_file.check(CHECKSUM_ALGORITHM, 0, 0, CHECKSUM_BLOCK_SIZE)
+    except IOError:
+        return None
+
+
+# =============================================================================
+# STREAM PARSING
+# =============================================================================
+
+# Queue markers: end of the file, parse abandoned
+_END = b''
+_ABORT = None
+
+
+class _QueueReader(io.RawIOBase):
+    """Readable stream over the chunks put on a queue, blocking until they arrive."""
+
+    def __init__(self, chunks: queue.Queue):
+        self._chunks = chunks
+        self._buffer = memoryview(b'')
+        self._ended = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        if not self._buffer:
+            if self._ended:
+                return 0
+            chunk = self._chunks.get()
+            if chunk is _ABORT:
+                raise OSError("Stream parse abandoned")
+            if chunk == _END:
+                self._ended = True
+                return 0
+            self._buffer = memoryview(chunk)
+        count = min(len(b), len(self._buffer))
+        b[:count] = self._buffer[:count]
+        self._buffer = self._buffer[count:]
+        return count
+
+
+class CsvStreamParser:
+    """
+    pandas.read_csv() over bytes fed while a file downloads.
+
+    The parse runs in a background thread reading from the fed chunks, so it
+    overlaps the transfer, and gives the same DataFrame as pd.read_csv() of
+    the finished file. position is the number of bytes fed so far; reset()
+    starts over (the download restarted from byte 0).
+    """
+
+    def __init__(self, **read_csv_kwargs):
+        self.read_csv_kwargs = read_csv_kwargs
+        self.position = 0
+        self._start()
+
+    def _start(self) -> None:
+        self._chunks = queue.Queue()
+        self._result = self._error = None
+        self._thread = threading.Thread(target=self._parse, name="csv-stream-parse", daemon=True)
+        self._thread.start()
+
+    def _parse(self) -> None:
+        import pandas as pd
+
+        try:
+            self._result = pd.read_csv(io.BufferedReader(_QueueReader(self._chunks)), **self.read_csv_kwargs)
+        except BaseException as e:
+            self._error = e
+
+    def feed(self, data: bytes) -> None:
+        """Append the next bytes of the file."""
+        if data:
+            self._chunks.put(bytes(data))
+            self.position += len(data)
+
+    def reset(self) -> None:
+        """Abandon the bytes fed so far."""
+        self.abort()
+        self.position = 0
+        self._start()
+
+    def abort(self) -> None:
+        """Abandon the parse."""
+        self._chunks.put(_ABORT)
+        self._thread.join()
+
+    def finish(self) -> pd.DataFrame:
+        """
+        Mark the end of the file and wait for the parse.
+
+        Raises:
+            Exception: Whatever pd.read_csv() raised on the fed bytes
+        """
+        self._chunks.put(_END)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+def _catch_up(parser: CsvStreamParser, partial_path: str, offset: int) -> None:
+    """Bring a parser to `offset`, feeding it the bytes already downloaded."""
+    if parser.position > offset:
+        parser.reset()
+    if parser.position < offset:
+        with open(partial_path, 'rb') as f:
+            f.seek(parser.position)
+            while parser.position < offset:
+                parser.feed(f.read(min(CHUNK_SIZE, offset - parser.position)))
+
+
+# =============================================================================
+# TRANSFERS
+# =============================================================================
+
+def _transfer_errors():
+    import paramiko
+
+    return (OSError, EOFError, paramiko.SSHException)
+
+
+def _describe(error: BaseException) -> str:
+    # Dropped links often raise with an empty message
+    return str(error).strip(': ') or type(error).__name__
+
+
+def _retry(connection: SftpConnection, attempt: int, retry_delay: float, message: str,
+           progress_callback=None) -> None:
+    """Report a failed attempt, wait and reopen the session."""
+    delay = retry_delay * 2 ** (attempt - 1)
+    if progress_callback:
+        progress_callback(f"  {message}; retrying in {delay:g}s (attempt {attempt + 1})")
+    time.sleep(delay)
+    connection.close()
+
+
+def _read_partial_state(state_path: str) -> Optional[Dict]:
+    try:
+        with open(state_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _discard_partial_download(partial_path: str, state_path: str) -> None:
+    for path in (partial_path, state_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def download_file(connection: SftpConnection, remote_name: str, local_path: str,
+                  retries: int = 3, retry_delay: float = 2.0, verify_checksum: bool = True,
+                  parser: Optional[CsvStreamParser] = None, progress_callback=None) -> Dict:
+    """
+    Download a file through <local_path>.part, resuming after dropped links.
+
+    With a parser, every byte of the file is fed to it exactly once and in
+    order, including the bytes of a resumed partial file; call
+    parser.finish() after a successful download.
+
+    Args:
+        connection: Session in the remote directory
+        remote_name: Remote file name
+        local_path: Destination; only written (renamed into place) once verified
+        retries: Attempts after the first one
+        retry_delay: Seconds before the first retry (doubles every retry)
+        verify_checksum: Compare checksums when the server supports check-file
+        parser: Optional CsvStreamParser fed the file's bytes as they arrive
+        progress_callback: Optional callback function for progress updates
+
+    Returns:
+        Dictionary with bytes (file size), resumed_from (offset the first
+        attempt started at), attempts and checksum_verified
+
+    Raises:
+        OSError: If the file could not be downloaded and verified within the retries
+    """
+    partial_path = local_path + PARTIAL_SUFFIX
+    state_path = local_path + PARTIAL_STATE_SUFFIX
+    resumed_from = None
+    attempt = 0
+
+    while True:
+        attempt += 1
+        try:
+            attrs = connection.sftp.stat(remote_name)
+            remote_state = {'name': remote_name, 'size': attrs.st_size, 'mtime': attrs.st_mtime}
+
+            # Resume only a partial file of this very remote file
+            offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+            if _read_partial_state(state_path) != remote_state or offset > remote_state['size']:
+                offset = 0
+            if offset == 0:
+                with open(state_path, 'w') as f:
+                    json.dump(remote_state, f)
+                open(partial_path, 'wb').close()
+            if resumed_from is None:
+                resumed_from = offset
+                if offset and progress_callback:
+                    progress_callback(f"  Resuming {remote_name} at {offset:,} of {remote_state['size']:,} bytes")
+            if parser is not None:
+                _catch_up(parser, partial_path, offset)
+
+            with connection.sftp.open(remote_name, 'rb') as remote_file, open(partial_path, 'ab') as local_file:
+                remote_file.seek(offset)
+                remote_file.prefetch(remote_state['size'])
+                while offset < remote_state['size']:
+                    chunk = remote_file.read(min(CHUNK_SIZE, remote_state['size'] - offset))
+                    if not chunk:
+                        raise EOFError(f"{remote_name} ended at {offset:,} of {remote_state['size']:,} bytes")
+                    local_file.write(chunk)
+                    if parser is not None:
+                        parser.feed(chunk)
+                    offset += len(chunk)
+
+            # The remote file must not have changed during the transfer
+            attrs = connection.sftp.stat(remote_name)
+            if (attrs.st_size, attrs.st_mtime) != (remote_state['size'], remote_state['mtime']):
+                _discard_partial_download(partial_path, state_path)
+                raise OSError(f"{remote_name} changed during the download")
+
+            size = os.path.getsize(partial_path)
+            if size != remote_state['size']:
+                _discard_partial_download(partial_path, state_path)
+                raise OSError(f"Size mismatch for {remote_name}: {size:,} bytes, expected {remote_state['size']:,}")
+
+            checksum_verified = False
+            if verify_checksum:
+                expected = remote_checksum(connection.sftp, remote_name)
+                if expected is not None:
+                    if expected != local_checksum(partial_path):
+                        increment_counter('errors.sftp_checksum')
+                        _discard_partial_download(partial_path, state_path)
+                        raise OSError(f"Checksum mismatch for {remote_name}")
+                    checksum_verified = True
+
+            os.replace(partial_path, local_path)
+            os.remove(state_path)
+            return {'bytes': size, 'resumed_from': resumed_from, 'attempts': attempt,
+                    'checksum_verified': checksum_verified}
+
+        except _transfer_errors() as e:
+            if attempt > retries:
+                raise OSError(f"Download of {remote_name} failed after {attempt} attempt(s): {_describe(e)}") from e
+            increment_counter('retries.sftp_download')
+            confirmed = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+            _retry(connection, attempt, retry_delay,
+                   f"Download of {remote_name} interrupted at {confirmed:,} bytes ({_describe(e)})", progress_callback)
+
+
+def upload_file(connection: SftpConnection, local_path: str, remote_name: str,
+                retries: int = 3, retry_delay: float = 2.0, verify_checksum: bool = True,
+                progress_callback=None) -> Dict:
+    """
+    Upload a file through <remote_name>.part, resuming after dropped links,
+    and rename it into place once verified.
+
+    Args:
+        connection: Session in the remote directory
+        local_path: File to upload
+        remote_name: Remote file name (replaced if it exists)
+        retries: Attempts after the first one
+        retry_delay: Seconds before the first retry (doubles every retry)
+        verify_checksum: Compare checksums when the server supports check-file
+        progress_callback: Optional callback function for progress updates
+
+    Returns:
+        Dictionary with bytes, attempts and checksum_verified
+
+    Raises:
+        OSError: If the file could not be uploaded and verified within the retries
+    """
+    partial_name = remote_name + PARTIAL_SUFFIX
+    size = os.path.getsize(local_path)
+    attempt = 0
+    resume = False
+
+    while True:
+        attempt += 1
+        try:
+            sftp = connection.sftp
+
+            # Resume from what the server confirms it has, on retries only:
+            # a .part left by an earlier run may hold other contents
+            offset = 0
+            if resume:
+                try:
+                    offset = sftp.stat(partial_name).st_size
+                except IOError:
+                    offset = 0
+                if offset > size:
+                    offset = 0
+
+            with open(local_path, 'rb') as local_file, \
+                    sftp.open(partial_name, 'r+b' if offset else 'wb') as remote_file:
+                remote_file.set_pipelined(True)
+                remote_file.seek(offset)
+                local_file.seek(offset)
+                for chunk in iter(lambda: local_file.read(CHUNK_SIZE), b''):
+                    remote_file.write(chunk)
+
+            remote_size = sftp.stat(partial_name).st_size
+            if remote_size != size:
+                sftp.remove(partial_name)
+                raise OSError(f"Size mismatch for {remote_name}: {remote_size:,} bytes on the server, "
+                              f"expected {size:,}")
+
+            checksum_verified = False
+            if verify_checksum:
+                actual = remote_checksum(sftp, partial_name)
+                if actual is not None:
+                    if actual != local_checksum(local_path):
+                        increment_counter('errors.sftp_checksum')
+                        sftp.remove(partial_name)
+                        raise OSError(f"Checksum mismatch for {remote_name}")
+                    checksum_verified = True
+
+            try:
+                sftp.posix_rename(partial_name, remote_name)
+            except IOError:
+                # Servers without the posix-rename extension do not replace
+                try:
+                    sftp.remove(remote_name)
+                except IOError:
+                    pass
+                sftp.rename(partial_name, remote_name)
+
+            return {'bytes': size, 'attempts': attempt, 'checksum_verified': checksum_verified}
+
+        except _transfer_errors() as e:
+            if attempt > retries:
+                raise OSError(f"Upload of {remote_name} failed after {attempt} attempt(s): {_describe(e)}") from e
+            increment_counter('retries.sftp_upload')
+            resume = True
+            _retry(connection, attempt, retry_delay, f"Upload of {remote_name} interrupted ({_describe(e)})",
+                   progress_callback)
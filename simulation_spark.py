@@ -0,0 +1,590 @@
+"""
+BTC Fake - PySpark Execution Backend
+
+Runs the pipeline with the population kept in Spark DataFrames
+(EXECUTION_BACKEND=spark), so a run scales across executors when it runs as a
+Databricks job instead of collecting everything to one process:
+
+- employees, the state tables and the assignments stay distributed; the
+  open-assignment (content_assignments - content_completion) and
+  recent-completion anti-joins are Spark joins
+- recommender calls and the completion decisions run in mapInPandas, one
+  employee partition at a time; the decisions are the
+  simulate_population_completions() rules used by COMPLETION_ENGINE=vectorized
+- every output is written by Spark as one part file per partition, then the
+  parts are concatenated into the spec'd file name on the driver
+
+Cleanup, the inbound download, the UserCompletion file and publishing are the
+driver-side steps of simulation_core.
+
+Without a cluster it runs in local-mode PySpark (SPARK_MASTER=local[*]); the
+state tables are then read from the DATABRICKS_SQLITE_PATH stand-in or the
+STATE_STORE_PATH mirror. On Databricks the active session is used and the
+state tables are read from the catalog.
+"""
+
+from __future__ import annotations
+
+import glob
+import os
+import shutil
+from datetime import timedelta
+from typing import TYPE_CHECKING, Dict, Optional
+
+import simulation_core as core
+from simulation_population import RECENT_COMPLETION_COLUMNS, TRAINING_COLUMNS
+from simulation_records import AssignmentRecord
+
+if TYPE_CHECKING:
+    from pyspark.sql import DataFrame, SparkSession
+
+    from simulation_catalog import CourseCatalogIndex
+
+EMPLOYEES_SCHEMA = "employee_id STRING, employee_edu_type STRING"
+
+STATE_TABLE_SCHEMAS = {
+    'content_assignments': "ba_id BIGINT, content_id BIGINT, assignment_date STRING, update_date STRING, "
+                           "assignment_begin_date STRING, assignment_due_date STRING, content_type STRING",
+    'content_completion': "ba_id BIGINT, content_id BIGINT, completion_date STRING",
+}
+
+# TRAINING_COLUMNS plus the entry's position in the employee's list
+TRAINING_SCHEMA = "ba_id BIGINT, content_id BIGINT, course_name STRING, source STRING, position INT"
+
+# CompletionRecord fields plus the numeric content ID (join key)
+COMPLETION_SCHEMA = ("UserId BIGINT, ContentId STRING, DateStarted STRING, DateCompleted STRING, "
+                     "CourseName STRING, Source STRING, content_id BIGINT")
+
+ASSIGNMENT_COLUMNS = list(AssignmentRecord._fields)
+CONTENT_USER_COMPLETION_COLUMNS = ['UserId', 'ContentId', 'DateStarted', 'DateCompleted']
+
+
+# =============================================================================
+# SESSION AND PATHS
+# =============================================================================
+
+def get_spark_session(config: Dict) -> SparkSession:
+    """
+    Return the active Spark session (Databricks jobs and notebooks), or start
+    one on SPARK_MASTER (default local[*]: local mode, no cluster).
+
+    Args:
+        config: Configuration dictionary
+
+    Returns:
+        SparkSession
+    """
+    from pyspark.sql import SparkSession
+
+    spark = SparkSession.getActiveSession()
+    if spark is not None:
+        return spark
+
+    # Python workers import simulation_* from the project directory
+    project_dir = os.path.dirname(os.path.abspath(__file__))
+    return (SparkSession.builder
+            .master(config['spark_master'])
+            .appName("btc-fake-simulation")
+            .config("spark.executorEnv.PYTHONPATH", project_dir)
+            .getOrCreate())
+
+
+def to_spark_path(path: str) -> str:
+    """
+    Spark URI for a path the driver sees as a local file.
+
+    /dbfs/... becomes dbfs:/..., other local paths file://<absolute path>;
+    URIs are returned unchanged.
+    """
+    if '://' in path or path.startswith('dbfs:'):
+        return path
+    absolute = os.path.abspath(path)
+    if absolute.startswith('/dbfs/'):
+        return 'dbfs:' + absolute[len('/dbfs'):]
+    return 'file://' + absolute
+
+
+# =============================================================================
+# INPUTS
+# =============================================================================
+
+def read_employees(spark: SparkSession, employees_file: str) -> DataFrame:
+    """
+    Read the employees CSV, dropping comment rows (employee_id starting with #).
+
+    Returns:
+        DataFrame with ba_id and employee_edu_type (lower case) columns
+    """
+    from pyspark.sql import functions as F
+
+    employees = spark.read.csv(to_spark_path(employees_file), header=True, schema=EMPLOYEES_SCHEMA)
+    return (employees
+            .where(~F.trim('employee_id').startswith('#'))
+            .select(F.trim('employee_id').cast('long').alias('ba_id'),
+                    F.lower(F.trim('employee_edu_type')).alias('employee_edu_type'))
+            .where(F.col('ba_id').isNotNull()))
+
+
+def read_state_table(spark: SparkSession, config: Dict, table: str, progress_callback=None) -> DataFrame:
+    """
+    Read a state table (content_assignments, content_completion).
+
+    Source: the local mirror (STATE_STORE_PATH) or the SQLite stand-in
+    (DATABRICKS_SQLITE_PATH) if set, otherwise the table in the Spark catalog
+    (core.get_state_table_name()). Dates are ISO-8601 text, as in the
+    other backends.
+
+    Returns:
+        DataFrame with the STATE_TABLE_SCHEMAS columns; empty if the table is not available
+    """
+    from pyspark.sql import functions as F
+    from pyspark.sql.utils import AnalysisException
+
+    schema = STATE_TABLE_SCHEMAS[table]
+    sqlite_path = config['state_store_path'] or config.get('databricks_sqlite_path')
+    if sqlite_path:
+        return _read_sqlite_table(spark, sqlite_path, table)
+
+    table_name = core.get_state_table_name(config, table)
+    try:
+        df = spark.table(table_name)
+    except AnalysisException:
+        if progress_callback:
+            progress_callback(f"State table {table_name} not found. Treating it as empty.")
+        return spark.createDataFrame([], schema)
+
+    columns = []
+    for field in spark.createDataFrame([], schema).schema.fields:
+        data_type = df.schema[field.name].dataType.typeName()
+        if data_type == 'timestamp':
+            column = F.date_format(field.name, "yyyy-MM-dd'T'HH:mm:ss")
+        elif data_type == 'date':
+            column = F.date_format(field.name, "yyyy-MM-dd")
+        else:
+            column = F.col(field.name)
+        columns.append(column.cast(field.dataType).alias(field.name))
+    return df.select(*columns)
+
+
+def _read_sqlite_table(spark: SparkSession, path: str, table: str) -> DataFrame:
+    """Load a state table from a SQLite file into Spark (local mode)."""
+    import sqlite3
+
+    import pandas as pd
+
+    schema = STATE_TABLE_SCHEMAS[table]
+    columns = [column.split()[0] for column in schema.split(', ')]
+    connection = sqlite3.connect(path)
+    try:
+        df = pd.read_sql_query(f"SELECT {', '.join(columns)} FROM {table}", connection)
+    finally:
+        connection.close()
+
+    if df.empty:
+        return spark.createDataFrame([], schema)
+    df = df.astype({'ba_id': 'int64', 'content_id': 'int64'})
+    return spark.createDataFrame(df, schema)
+
+
+# =============================================================================
+# ASSIGNMENTS
+# =============================================================================
+
+def find_open_assignments(employees: DataFrame, assignments: DataFrame, completions: DataFrame) -> DataFrame:
+    """
+    Open assignments of the run's employees: content_assignments rows without a
+    content_completion row for the same (ba_id, content_id).
+    """
+    return (assignments
+            .join(employees.select('ba_id'), 'ba_id', 'left_semi')
+            .join(completions.select('ba_id', 'content_id'), ['ba_id', 'content_id'], 'left_anti'))
+
+
+def build_assignment_rows(spark: SparkSession, employees: DataFrame, open_assignments: DataFrame,
+                          clock: core.RunClock) -> DataFrame:
+    """
+    NonCompletedAssignments rows: the open assignments (as
+    core.convert_databricks_assignments_to_output_format() converts them)
+    followed by this week's manager assignments (Daily Dose + one non-DD
+    content, as core.create_manager_assignments() creates them).
+
+    The non-DD content is chosen by hashing (ba_id, RequestId) rather than
+    with rand(), so a recomputed partition makes the same choice.
+
+    Returns:
+        DataFrame with the AssignmentRecord columns plus content_id (numeric)
+        and position (the entry's place in the employee's manager training list)
+    """
+    from pyspark.sql import Window
+    from pyspark.sql import functions as F
+
+    daily_dose = [int(content['id']) for content in core.DAILY_DOSE_CONTENT]
+    non_daily_dose = [int(content['id']) for content in core.NON_DAILY_DOSE_CONTENT]
+
+    open_rows = open_assignments.select(
+        F.col('ba_id').alias('UserID'),
+        F.col('assignment_date').alias('CreateDate_text'),
+        F.col('assignment_begin_date').alias('Start_Date_text'),
+        F.col('assignment_due_date').alias('DueDate_text'),
+        F.col('content_type').alias('ContentType'),
+        'content_id',
+        F.lit(0).alias('batch'),
+        F.lit(0).alias('slot'))
+
+    daily_dose_df = spark.createDataFrame(list(enumerate(daily_dose)), "slot INT, content_id BIGINT")
+    manager_content = employees.select('ba_id').crossJoin(F.broadcast(daily_dose_df)).unionByName(
+        employees.select(
+            'ba_id',
+            F.lit(len(daily_dose)).alias('slot'),
+            F.element_at(F.array(*[F.lit(content_id) for content_id in non_daily_dose]),
+                         (F.pmod(F.xxhash64('ba_id', F.lit(clock.request_id)), F.lit(len(non_daily_dose)))
+                          + 1).cast('int')).cast('long').alias('content_id')))
+    new_rows = manager_content.select(
+        F.col('ba_id').alias('UserID'),
+        F.lit(clock.created_date).alias('CreateDate_text'),
+        F.lit(clock.assignment_start_date).alias('Start_Date_text'),
+        F.lit(clock.assignment_due_date).alias('DueDate_text'),
+        F.lit("Media").alias('ContentType'),
+        'content_id',
+        F.lit(1).alias('batch'),
+        'slot')
+
+    # Same per-employee order as the NonCompletedAssignments file of the local backend
+    order = Window.partitionBy('UserID').orderBy('batch', 'DueDate_text', 'slot', 'content_id')
+    return (open_rows.unionByName(new_rows)
+            .withColumn('RequestId', F.lit(clock.request_id))
+            .withColumn('TrainingElementId', F.format_number('content_id', 0))
+            .withColumn('position', F.row_number().over(order))
+            .select(*ASSIGNMENT_COLUMNS, 'content_id', 'position'))
+
+
+def build_manager_training(assignment_rows: DataFrame,
+                           catalog_index: Optional[CourseCatalogIndex] = None) -> DataFrame:
+    """
+    Manager training table (TRAINING_SCHEMA) from the NonCompletedAssignments
+    rows, with the course names of core.build_manager_training().
+
+    With a catalog index, the distinct assigned content IDs missing from
+    CONTENT_NAME_LOOKUP (a few hundred at most) are collected and named on
+    the driver.
+    """
+    from pyspark.sql import functions as F
+
+    content_names = dict(core.CONTENT_NAME_LOOKUP)
+    if catalog_index is not None:
+        known = [int(content_id) for content_id in content_names]
+        for row in (assignment_rows.select('content_id').distinct()
+                    .where(~F.col('content_id').isin(known)).collect()):
+            content_names[str(row.content_id)] = core.get_content_name(row.content_id, catalog_index)
+
+    names = F.create_map(*[F.lit(value) for item in content_names.items() for value in item])
+    content_key = F.col('content_id').cast('string')
+    return assignment_rows.select(
+        F.col('UserID').alias('ba_id'),
+        'content_id',
+        F.coalesce(names[content_key], F.concat(F.lit("Training Content "), content_key)).alias('course_name'),
+        F.lit("manager").alias('source'),
+        F.col('position').cast('int').alias('position'))
+
+
+# =============================================================================
+# RECOMMENDATIONS AND COMPLETIONS
+# =============================================================================
+
+def find_recent_completions(employees: DataFrame, completions: DataFrame, clock: core.RunClock,
+                            lookback_days: int = 13) -> DataFrame:
+    """
+    (ba_id, content_id) pairs the run's employees completed in the last
+    lookback_days days (same window as core.get_recent_completions_for_employees()).
+    """
+    from pyspark.sql import functions as F
+
+    start_date = (clock.now - timedelta(days=lookback_days - 1)).date().isoformat()
+    end_date = clock.now.date().isoformat()
+    return (completions
+            .where((F.col('completion_date') >= start_date) & (F.col('completion_date') <= end_date))
+            .join(employees.select('ba_id'), 'ba_id', 'left_semi')
+            .select(*RECENT_COMPLETION_COLUMNS)
+            .distinct())
+
+
+def fetch_recommendations(employees: DataFrame, config: Dict, partitions: int = 0) -> DataFrame:
+    """
+    Call the ML Training Recommender API for every employee, inside the
+    executors (mapInPandas over the employee partitions).
+
+    Args:
+        employees: ba_id column
+        config: Configuration dictionary (shipped to the executors)
+        partitions: Spread the employees over this many partitions first
+                    (0 = keep the input partitioning)
+
+    Returns:
+        AI recommendations table (TRAINING_SCHEMA)
+    """
+    def fetch_partition(batches):
+        import pandas as pd
+
+        for batch in batches:
+            # RECOMMENDER_BATCH_SIZE ba_ids per request (one request per employee by default)
+            recommendations = core.get_training_recommendations_batch(config, batch['ba_id'].tolist())
+            rows = [(employee_id, item.recommended_content_id, item.recommended_content, item.source, position)
+                    for employee_id, items in recommendations.items()
+                    for position, item in enumerate(items)]
+            yield pd.DataFrame(rows, columns=TRAINING_COLUMNS + ['position']).astype(
+                {'ba_id': 'int64', 'content_id': 'int64', 'position': 'int32'})
+
+    employee_ids = employees.select('ba_id')
+    if partitions:
+        employee_ids = employee_ids.repartition(partitions)
+    return employee_ids.mapInPandas(fetch_partition, TRAINING_SCHEMA)
+
+
+def decide_completions(employees: DataFrame, manager_training: DataFrame, recommendations: DataFrame,
+                       recent_completions: DataFrame, clock: core.RunClock,
+                       partitions: int = 0) -> DataFrame:
+    """
+    Decide the completions of the whole population.
+
+    AI recommendations completed recently are removed with an anti-join, then
+    each employee's training (manager assignments first, then recommendations,
+    each in list order) is co-located in one partition and decided with
+    simulate_population_completions().
+
+    Args:
+        employees: ba_id, employee_edu_type
+        manager_training: Manager training table (TRAINING_SCHEMA)
+        recommendations: AI recommendations table (TRAINING_SCHEMA)
+        recent_completions: ba_id, content_id
+        clock: Run clock; each partition draws training times from its own stream
+        partitions: Shuffle partitions (0 = spark.sql.shuffle.partitions)
+
+    Returns:
+        DataFrame with COMPLETION_SCHEMA
+    """
+    from pyspark.sql import functions as F
+
+    recommendations = recommendations.join(recent_completions, ['ba_id', 'content_id'], 'left_anti')
+    training = (manager_training.withColumn('source_rank', F.lit(0))
+                .unionByName(recommendations.withColumn('source_rank', F.lit(1)))
+                .join(employees, 'ba_id'))
+    training = training.repartition(partitions, 'ba_id') if partitions else training.repartition('ba_id')
+    training = training.sortWithinPartitions('ba_id', 'source_rank', 'position')
+
+    def decide_partition(batches):
+        import pandas as pd
+        from pyspark import TaskContext
+        from simulation_population import simulate_population_completions
+
+        # Arrow batches can split an employee's rows: decide the partition as a whole
+        batches = [batch for batch in batches if len(batch)]
+        if not batches:
+            return
+        partition = pd.concat(batches, ignore_index=True)
+
+        employees_df = (partition.drop_duplicates('ba_id')[['ba_id', 'employee_edu_type']]
+                        .rename(columns={'ba_id': 'employee_id'}))
+        is_manager = partition['source_rank'].to_numpy() == 0
+        recent_df = pd.DataFrame(columns=RECENT_COMPLETION_COLUMNS, dtype='int64')
+
+        completions = simulate_population_completions(
+            employees_df, partition[is_manager], partition[~is_manager], recent_df,
+            clock=clock.for_stream(TaskContext.get().partitionId() + 1))
+        completions['content_id'] = core.parse_content_ids(completions['ContentId'])
+        yield completions
+
+    return training.mapInPandas(decide_partition, COMPLETION_SCHEMA)
+
+
+# =============================================================================
+# OUTPUTS
+# =============================================================================
+
+def write_merged_csv(df: DataFrame, columns, output_path: str, staging_dir: str) -> str:
+    """
+    Write a DataFrame as one CSV file with the pandas writers' layout (header,
+    every field quoted).
+
+    Spark writes one part file per partition under staging_dir; the driver
+    then concatenates the parts, in partition order, below the header.
+
+    Args:
+        df: DataFrame to write
+        columns: Columns to write, in order
+        output_path: Final file path (driver-local)
+        staging_dir: Directory for the part files (driver-local, shared with the executors)
+
+    Returns:
+        output_path
+    """
+    parts_dir = os.path.join(staging_dir, os.path.basename(output_path) + ".parts")
+    (df.select(*columns).write.mode('overwrite')
+     .option('header', False)
+     .option('quoteAll', True)
+     .option('escape', '"')
+     .csv(to_spark_path(parts_dir)))
+
+    with open(output_path, 'wb') as output:
+        output.write((",".join(f'"{column}"' for column in columns) + "\n").encode())
+        for part_path in sorted(glob.glob(os.path.join(parts_dir, "part-*"))):
+            with open(part_path, 'rb') as part:
+                shutil.copyfileobj(part, output, core.ZIP_CHUNK_SIZE)
+    shutil.rmtree(parts_dir, ignore_errors=True)
+
+    return output_path
+
+
+# =============================================================================
+# PIPELINE
+# =============================================================================
+
+def run_spark_pipeline(config: Dict, employees_file: str, publish_enabled: bool,
+                       result: Dict, progress_callback=None) -> None:
+    """
+    The run_simulation() pipeline on Spark (EXECUTION_BACKEND=spark).
+
+    Same steps, file names and file layouts as core._run_pipeline(). The
+    completions are not collected: result['completions'] stays empty and
+    result['completion_count'] holds the number written. The state
+    write-back is not supported on this backend.
+    """
+    from pyspark import StorageLevel
+
+    def progress(msg):
+        if progress_callback:
+            progress_callback(msg)
+
+    clock = core.RunClock.from_config(config)
+    if config['run_clock_now']:
+        progress(f"Run clock frozen at {clock.now.isoformat()}")
+
+    spark = get_spark_session(config)
+    progress(f"Spark backend: master {spark.sparkContext.master}, "
+             f"{config['spark_partitions'] or 'default'} partitions")
+
+    staging_dir = config['spark_staging_dir'] or os.path.join(config['output_dir'], "_spark_staging")
+    persisted = []
+    catalog_index = None
+
+    def persist(df):
+        df = df.persist(StorageLevel.MEMORY_AND_DISK)
+        persisted.append(df)
+        return df
+
+    try:
+        # Step 0: Cleanup
+        progress("STEP 0: Cleanup")
+        progress("-" * 80)
+        with core.stage_timer('cleanup'):
+            core.cleanup_output_directory(config, progress_callback)
+        progress("")
+
+        # Step 1: Load employee file
+        progress("STEP 1: Loading Employee Data")
+        progress("-" * 80)
+        with core.stage_timer('load_employees'):
+            employees = persist(read_employees(spark, employees_file))
+            employee_count = employees.count()
+        core.increment_counter('rows.employees_loaded', employee_count)
+        core.increment_counter('bytes.employees_file', os.path.getsize(employees_file))
+        progress(f"Loaded {employee_count} employee(s)")
+        progress("")
+
+        # Step 2: Download files from SFTP
+        progress("STEP 2: Downloading Files from SFTP")
+        progress("-" * 80)
+        with core.stage_timer('sftp_download'):
+            course_catalog_path, standalone_content_path = core.download_inbound_files(config, progress_callback)
+        result['course_catalog_path'] = course_catalog_path
+        result['standalone_content_path'] = standalone_content_path
+
+        if not course_catalog_path or not standalone_content_path:
+            raise RuntimeError("Failed to download required files")
+
+        progress(f"Downloaded course catalog: {os.path.basename(course_catalog_path)}")
+        progress(f"Downloaded standalone content: {os.path.basename(standalone_content_path)}")
+        progress("")
+
+        # Step 3: Manager Assignments
+        progress("STEP 3: Creating Manager Assignments")
+        progress("-" * 80)
+        with core.stage_timer('assignments'):
+            if config['state_store_path']:
+                with core.stage_timer('state_sync'):
+                    core.sync_local_state_store(config, progress_callback=progress_callback)
+
+            state_assignments = read_state_table(spark, config, 'content_assignments', progress_callback)
+            state_completions = persist(read_state_table(spark, config, 'content_completion', progress_callback))
+
+            assignment_rows = persist(build_assignment_rows(
+                spark, employees, find_open_assignments(employees, state_assignments, state_completions), clock))
+            assignment_count = assignment_rows.count()
+        progress(f"Total assignments: {assignment_count}")
+        progress("")
+
+        # Step 4: Employee Training Simulation
+        progress("STEP 4: Simulating Employee Training Completions")
+        progress("-" * 80)
+        with core.stage_timer('catalog_index'):
+            catalog_index = core.open_course_catalog_index(course_catalog_path, progress_callback)
+        with core.stage_timer('simulate_completions'):
+            completions = persist(decide_completions(
+                employees, build_manager_training(assignment_rows, catalog_index),
+                fetch_recommendations(employees, config, config['spark_partitions']),
+                find_recent_completions(employees, state_completions, clock), clock,
+                config['spark_partitions']))
+            completion_count = completions.count()
+        core.increment_counter('rows.completions', completion_count)
+        result['completion_count'] = completion_count
+        progress(f"Total completions: {completion_count}")
+        progress("")
+
+        # Step 5: Generate Output Files
+        progress("STEP 5: Generating Output Files")
+        progress("-" * 80)
+        with core.stage_timer('write_outputs'):
+            if completion_count:
+                result['output_path'] = write_merged_csv(
+                    completions, CONTENT_USER_COMPLETION_COLUMNS,
+                    os.path.join(config['output_dir'], core.generate_output_filename(clock.now)), staging_dir)
+                core.increment_counter('rows.content_user_completion_written', completion_count)
+                progress(f"Generated: {os.path.basename(result['output_path'])}")
+            else:
+                progress("No completions to write")
+
+            # Completed assignments are dropped before writing, not rewritten afterwards
+            remaining = assignment_rows.join(
+                completions.select(completions['UserId'].alias('UserID'), 'content_id'),
+                ['UserID', 'content_id'], 'left_anti')
+            result['assignments_path'] = write_merged_csv(
+                remaining, ASSIGNMENT_COLUMNS,
+                os.path.join(config['output_dir'], core.generate_non_completed_assignments_filename(clock.now)),
+                staging_dir)
+            progress(f"Generated: {os.path.basename(result['assignments_path'])}")
+
+            # Parts are cut from the merged files, so they match the local backend's
+            if core.is_output_sharding_enabled(config):
+                shard_settings = core.get_shard_settings(config)
+                for key, file_type in (('output_path', 'ContentUserCompletion'),
+                                       ('assignments_path', 'NonCompletedAssignments')):
+                    if result[key]:
+                        result[key] = core.shard_csv_file(result[key], file_type=file_type, **shard_settings)
+
+            result['user_completion_path'] = core.generate_user_completion_file_from_template(
+                config, progress_callback, clock.now)
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+        if config['state_writeback_enabled']:
+            progress("⚠ State write-back is not supported with EXECUTION_BACKEND=spark; skipped")
+        progress("")
+
+    finally:
+        if catalog_index is not None:
+            catalog_index.close()
+        for df in persisted:
+            df.unpersist()
+
+    # Step 6: Publish to SFTP (if enabled)
+    if publish_enabled:
+        core.publish_run(config, result, progress_callback)
+
@@ -0,0 +1,377 @@
+"""
+BTC Fake - Local State Store
+
+Optional local SQLite mirror of the Databricks state tables
+(content_assignments and content_completion, see docs/state/*.md).
+
+When STATE_STORE_PATH is set, every run first pulls only the rows that changed
+since the previous sync (update_date / completion_date watermarks) and then
+answers the open-assignments anti-join and the 13-day recent-completion
+lookups from the mirror. With the warehouse unreachable or not configured the
+existing mirror is used as-is, which makes offline development runs possible.
+
+Rows deleted in the warehouse are not seen by an incremental sync; run a full
+sync (`python -m simulation_cli sync-state --full`) to rebuild the mirror.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import simulation_core as core
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+LOCAL_STATE_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS content_assignments (
+        ba_id INTEGER NOT NULL,
+        content_id INTEGER NOT NULL,
+        assignment_date TEXT,
+        update_date TEXT,
+        assignment_begin_date TEXT,
+        assignment_due_date TEXT,
+        content_type TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS content_completion (
+        ba_id INTEGER NOT NULL,
+        content_id INTEGER NOT NULL,
+        completion_date TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sync_watermarks (
+        table_name TEXT PRIMARY KEY,
+        watermark TEXT,
+        synced_at TEXT,
+        rows_synced INTEGER
+    )
+    """,
+    # Re-syncing the watermark day replaces rows instead of duplicating them
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_assignments_key "
+    "ON content_assignments (ba_id, content_id, IFNULL(assignment_date, ''))",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_completion_key "
+    "ON content_completion (ba_id, content_id, IFNULL(completion_date, ''))",
+    # Recent-completion lookups: ba_id equality + completion_date range
+    "CREATE INDEX IF NOT EXISTS idx_completion_ba_date ON content_completion (ba_id, completion_date)",
+]
+
+# Mirrored tables: (table, columns, watermark column)
+MIRRORED_TABLES = [
+    ('content_assignments',
+     ['ba_id', 'content_id', 'assignment_date', 'update_date', 'assignment_begin_date',
+      'assignment_due_date', 'content_type'],
+     'update_date'),
+    ('content_completion',
+     ['ba_id', 'content_id', 'completion_date'],
+     'completion_date'),
+]
+
+# Rows fetched from the warehouse and written locally per batch
+SYNC_FETCH_SIZE = 10000
+
+
+def _to_text(value) -> Optional[str]:
+    """Store dates and timestamps as ISO-8601 text (what the output files use)."""
+    if value is None:
+        return None
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def _to_row(columns: List[str], values) -> tuple:
+    return tuple(int(value) if column in ('ba_id', 'content_id') else _to_text(value)
+                 for column, value in zip(columns, values))
+
+
+class LocalStateStore:
+    """
+    SQLite database holding the mirrored state tables.
+
+    Use as a context manager:
+
+        with LocalStateStore(config['state_store_path']) as store:
+            recent = store.get_recent_completions(88563, '2025-01-01', '2025-01-13')
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        for statement in LOCAL_STATE_DDL:
+            self.connection.execute(statement)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self) -> None:
+        """Commit pending changes and close the database."""
+        if self.connection:
+            self.connection.commit()
+            self.connection.close()
+            self.connection = None
+
+    # -------------------------------------------------------------------------
+    # Watermarks
+    # -------------------------------------------------------------------------
+
+    def get_watermark(self, table: str) -> Optional[str]:
+        """Return the highest watermark value synced for a table, or None before the first sync."""
+        row = self.connection.execute(
+            "SELECT watermark FROM sync_watermarks WHERE table_name = ?", (table,)).fetchone()
+        return row[0] if row else None
+
+    def set_watermark(self, table: str, watermark: Optional[str], rows_synced: int) -> None:
+        """Record a completed sync of a table."""
+        self.connection.execute(
+            "INSERT OR REPLACE INTO sync_watermarks (table_name, watermark, synced_at, rows_synced) "
+            "VALUES (?, ?, ?, ?)",
+            (table, watermark, datetime.now(timezone.utc).isoformat(), rows_synced))
+
+    def clear(self) -> None:
+        """Delete all mirrored rows and watermarks (the next sync is a full sync)."""
+        for table, _, _ in MIRRORED_TABLES:
+            self.connection.execute(f"DELETE FROM {table}")
+        self.connection.execute("DELETE FROM sync_watermarks")
+
+    # -------------------------------------------------------------------------
+    # Writes
+    # -------------------------------------------------------------------------
+
+    def upsert_rows(self, table: str, columns: List[str], rows: List[tuple]) -> None:
+        """Insert rows, replacing rows with the same key."""
+        placeholders = ", ".join("?" for _ in columns)
+        self.connection.executemany(
+            f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+
+    # -------------------------------------------------------------------------
+    # Lookups
+    # -------------------------------------------------------------------------
+
+    def get_open_assignments(self, employee_ids: List[int]) -> pd.DataFrame:
+        """
+        Open (non-completed) assignments for the given employees.
+
+        Same result as the content_assignments - content_completion anti-join
+        in simulation_core.get_open_assignments_from_databricks().
+
+        Args:
+            employee_ids: Employee IDs (ba_id)
+
+        Returns:
+            DataFrame with columns: ba_id, content_id, assignment_date, assignment_begin_date,
+                                   assignment_due_date, content_type
+        """
+        import pandas as pd
+
+        self._load_run_employees(employee_ids)
+
+        cursor = self.connection.execute("""
+            SELECT
+                a.ba_id,
+                a.content_id,
+                a.assignment_date,
+                a.assignment_begin_date,
+                a.assignment_due_date,
+                a.content_type
+            FROM run_employees e
+            JOIN content_assignments a ON a.ba_id = e.ba_id
+            WHERE NOT EXISTS (
+                SELECT 1 FROM content_completion c
+                WHERE c.ba_id = a.ba_id AND c.content_id = a.content_id
+            )
+            ORDER BY a.ba_id, a.assignment_due_date
+        """)
+
+        columns = [desc[0] for desc in cursor.description]
+        return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+    def get_recent_completions_table(self, employee_ids: List[int], start_date: str,
+                                     end_date: str) -> pd.DataFrame:
+        """
+        (ba_id, content_id) pairs completed between start_date and end_date
+        (inclusive) for a whole population, in one query.
+
+        Args:
+            employee_ids: Employee IDs (ba_id)
+            start_date: First date, YYYY-MM-DD
+            end_date: Last date, YYYY-MM-DD
+
+        Returns:
+            DataFrame with columns: ba_id, content_id
+        """
+        import pandas as pd
+
+        self._load_run_employees(employee_ids)
+
+        rows = self.connection.execute("""
+            SELECT DISTINCT c.ba_id, c.content_id
+            FROM run_employees e
+            JOIN content_completion c ON c.ba_id = e.ba_id
+            WHERE c.completion_date >= ? AND c.completion_date <= ?
+        """, (str(start_date), str(end_date))).fetchall()
+        return pd.DataFrame(rows, columns=['ba_id', 'content_id'], dtype='int64')
+
+    def get_completion_dates_table(self, employee_ids: List[int], start_date: str,
+                                   end_date: str) -> pd.DataFrame:
+        """
+        Latest completion date of each (ba_id, content_id) pair completed
+        between start_date and end_date (inclusive) for a whole population,
+        in one query.
+
+        Args:
+            employee_ids: Employee IDs (ba_id)
+            start_date: First date, YYYY-MM-DD
+            end_date: Last date, YYYY-MM-DD
+
+        Returns:
+            DataFrame with columns: ba_id, content_id, completion_date (YYYY-MM-DD)
+        """
+        import pandas as pd
+
+        self._load_run_employees(employee_ids)
+
+        rows = self.connection.execute("""
+            SELECT c.ba_id, c.content_id, MAX(c.completion_date)
+            FROM run_employees e
+            JOIN content_completion c ON c.ba_id = e.ba_id
+            WHERE c.completion_date >= ? AND c.completion_date <= ?
+            GROUP BY c.ba_id, c.content_id
+        """, (str(start_date), str(end_date))).fetchall()
+        return pd.DataFrame(rows, columns=['ba_id', 'content_id', 'completion_date'])
+
+    def _load_run_employees(self, employee_ids: List[int]) -> None:
+        # A temp table avoids SQLite's bound-parameter limit for large populations
+        self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS run_employees (ba_id INTEGER PRIMARY KEY)")
+        self.connection.execute("DELETE FROM run_employees")
+        self.connection.executemany("INSERT OR IGNORE INTO run_employees (ba_id) VALUES (?)",
+                                    ((int(employee_id),) for employee_id in employee_ids))
+
+    def get_recent_completions(self, employee_id: int, start_date: str, end_date: str) -> set:
+        """
+        Content IDs an employee completed between start_date and end_date (inclusive).
+
+        Args:
+            employee_id: The employee's ID (ba_id)
+            start_date: First date, YYYY-MM-DD
+            end_date: Last date, YYYY-MM-DD
+
+        Returns:
+            Set of content IDs
+        """
+        return set(self.get_completion_dates(employee_id, start_date, end_date))
+
+    def get_completion_dates(self, employee_id: int, start_date: str, end_date: str) -> Dict[int, str]:
+        """
+        Latest completion date of each content an employee completed between
+        start_date and end_date (inclusive).
+
+        Args:
+            employee_id: The employee's ID (ba_id)
+            start_date: First date, YYYY-MM-DD
+            end_date: Last date, YYYY-MM-DD
+
+        Returns:
+            Dictionary of {content_id: YYYY-MM-DD}
+        """
+        rows = self.connection.execute(
+            "SELECT content_id, MAX(completion_date) FROM content_completion "
+            "WHERE ba_id = ? AND completion_date >= ? AND completion_date <= ? "
+            "GROUP BY content_id",
+            (int(employee_id), str(start_date), str(end_date))).fetchall()
+        return {int(content_id): completion_date for content_id, completion_date in rows}
+
+
+def sync_state_store(config: Dict, full: bool = False, progress_callback=None) -> Dict:
+    """
+    Pull changed state-table rows from the warehouse into the local mirror.
+
+    Only rows whose watermark column (update_date / completion_date) is on or
+    after the previous sync's watermark are fetched; the watermark day itself
+    is re-read because DATE watermarks cannot tell which rows of that day were
+    already seen. The unique keys make that re-read idempotent.
+
+    Args:
+        config: Configuration dictionary
+        full: Discard the mirror and fetch everything
+        progress_callback: Optional callback function for progress updates
+
+    Returns:
+        Dictionary of {table: rows fetched}; empty if the sync was skipped
+    """
+    if not config['state_store_sync_enabled']:
+        if progress_callback:
+            progress_callback("State store sync disabled. Using local mirror as-is.")
+        return {}
+
+    if not core.is_databricks_configured(config):
+        if progress_callback:
+            progress_callback("Databricks not configured. Using local state mirror as-is (offline).")
+        return {}
+
+    synced = {}
+    with LocalStateStore(config['state_store_path']) as store:
+        if full:
+            store.clear()
+
+        connection = core.connect_databricks(config)
+        try:
+            for table, columns, watermark_column in MIRRORED_TABLES:
+                synced[table] = _sync_table(config, store, connection, table, columns, watermark_column)
+                # Commit per table so a failure keeps the tables that did sync
+                store.connection.commit()
+        finally:
+            connection.close()
+
+    if progress_callback:
+        progress_callback("Synced local state mirror: " +
+                          ", ".join(f"{count} {table} row(s)" for table, count in synced.items()) +
+                          (" (full)" if full else ""))
+
+    return synced
+
+
+def _sync_table(config: Dict, store: LocalStateStore, connection, table: str,
+                columns: List[str], watermark_column: str) -> int:
+    """Fetch one table's delta in batches and upsert it into the mirror."""
+    watermark = store.get_watermark(table)
+    watermark_index = columns.index(watermark_column)
+
+    query = f"SELECT {', '.join(columns)} FROM {core.get_state_table_name(config, table)}"
+    if watermark:
+        query += f" WHERE {watermark_column} >= '{watermark}'"
+
+    query_start = time.perf_counter()
+    cursor = connection.cursor()
+    cursor.execute(query)
+
+    row_count = 0
+    new_watermark = watermark
+    while True:
+        batch = cursor.fetchmany(SYNC_FETCH_SIZE)
+        if not batch:
+            break
+
+        rows = [_to_row(columns, values) for values in batch]
+        store.upsert_rows(table, columns, rows)
+        row_count += len(rows)
+
+        batch_watermarks = [row[watermark_index] for row in rows if row[watermark_index] is not None]
+        if batch_watermarks:
+            new_watermark = max(batch_watermarks + ([new_watermark] if new_watermark else []))
+
+    cursor.close()
+    core.observe_latency(f"databricks.state_sync.{table}", time.perf_counter() - query_start)
+    core.increment_counter(f"rows.state_sync_{table}", row_count)
+
+    store.set_watermark(table, new_watermark, row_count)
+    return row_count
@@ -0,0 +1,232 @@
+"""
+BTC Fake - Synthetic Population Generator
+
+Streams employees files of any size (the hand-maintained input/employees.csv
+has ~1,800 rows) for load tests of the simulator and of the systems that read
+its files:
+
+    python -m simulation_cli generate-employees --size 10000000 --output input/employees_10m.csv \\
+        --mix a=0.3,b=0.5,f=0.2 --comment-rate 0.001 --seed-state state.db
+
+Rows are generated and written chunk by chunk, so memory use does not grow
+with the population size. Employee IDs are unique without keeping the IDs
+seen so far: row i gets id_start + (offset + i * stride) mod span, with stride
+coprime to span, which is a permutation of the ID range.
+
+The same seed always gives the same employees, so the matching
+content_assignments / content_completion rows can be seeded afterwards by
+generating the chunks again (load_harness.sql_standin.seed_state_chunks).
+"""
+
+from __future__ import annotations
+
+import math
+import os
+from typing import TYPE_CHECKING, Dict, Iterator, Optional
+
+from simulation_keys import MAX_BA_ID
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+EMPLOYEE_TYPES = ('a', 'b', 'f')
+
+# Same mix as the load harness used so far ('aabbf')
+DEFAULT_TYPE_MIX = {'a': 0.4, 'b': 0.4, 'f': 0.2}
+
+DEFAULT_ID_START = 100_000
+
+# Default ID range: 20 IDs per employee, so IDs look sparse like the real ones
+DEFAULT_ID_SPREAD = 20
+
+# Rows generated and written per chunk
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+def parse_type_mix(value: str) -> Dict[str, float]:
+    """
+    Parse an employee type mix such as "a=0.3,b=0.5,f=0.2".
+
+    Weights are normalized, so "a=3,b=5,f=2" is the same mix. Types left out
+    get weight 0.
+
+    Raises:
+        ValueError: If a type is unknown or the weights are not positive numbers
+    """
+    mix = {}
+    for part in value.split(','):
+        if not part.strip():
+            continue
+        employee_type, _, weight = part.partition('=')
+        employee_type = employee_type.strip().lower()
+        if employee_type not in EMPLOYEE_TYPES:
+            raise ValueError(f"Unknown employee type {employee_type!r} (expected one of {EMPLOYEE_TYPES})")
+        try:
+            mix[employee_type] = float(weight)
+        except ValueError:
+            raise ValueError(f"Invalid weight for type {employee_type!r}: {weight!r}") from None
+    return normalize_type_mix(mix)
+
+
+def normalize_type_mix(mix: Dict[str, float]) -> Dict[str, float]:
+    """Scale type weights to sum to 1, in EMPLOYEE_TYPES order."""
+    if any(employee_type not in EMPLOYEE_TYPES for employee_type in mix):
+        raise ValueError(f"Employee types must be among {EMPLOYEE_TYPES}: {sorted(mix)}")
+    if any(weight < 0 or not math.isfinite(weight) for weight in mix.values()):
+        raise ValueError(f"Type weights must be non-negative numbers: {mix}")
+    total = sum(mix.values())
+    if total <= 0:
+        raise ValueError("At least one employee type needs a positive weight")
+    return {employee_type: mix.get(employee_type, 0.0) / total for employee_type in EMPLOYEE_TYPES}
+
+
+def _id_permutation(size: int, id_start: int, id_end: int, seed: int):
+    """Pick (span, stride, offset) for the ID permutation."""
+    import numpy as np
+
+    if id_start < 0 or id_end > MAX_BA_ID:
+        raise ValueError(f"Employee IDs must be within 0..{MAX_BA_ID}")
+    span = id_end - id_start + 1
+    if span < size:
+        raise ValueError(f"ID range {id_start}..{id_end} holds {max(span, 0)} IDs, "
+                         f"fewer than {size} employees")
+
+    rng = np.random.default_rng([seed, 0])
+    offset = int(rng.integers(span))
+    if span == 1:
+        return span, 1, offset
+    # A stride near the golden ratio of the span scatters neighbouring rows
+    stride = int(span * 0.6180339887) + int(rng.integers(span // 100 + 1))
+    stride = min(max(stride, 1), span - 1)
+    while math.gcd(stride, span) != 1:
+        stride += 1
+        if stride >= span:
+            stride = 1
+    return span, stride, offset
+
+
+def generate_employee_chunks(size: int, type_mix: Optional[Dict[str, float]] = None,
+                             id_start: int = DEFAULT_ID_START, id_end: Optional[int] = None,
+                             chunk_size: int = DEFAULT_CHUNK_SIZE,
+                             seed: int = 42) -> Iterator[pd.DataFrame]:
+    """
+    Generate a synthetic employee population, one chunk at a time.
+
+    Args:
+        size: Number of employees
+        type_mix: {employee type: weight} (default: DEFAULT_TYPE_MIX)
+        id_start: Lowest employee ID
+        id_end: Highest employee ID (default: id_start + size * DEFAULT_ID_SPREAD - 1)
+        chunk_size: Employees per chunk
+        seed: Random seed; the same arguments always give the same employees
+
+    Yields:
+        DataFrames with employee_id (int64, unique across chunks) and
+        employee_edu_type columns
+
+    Raises:
+        ValueError: If the ID range is too small or the type mix is invalid
+    """
+    import numpy as np
+    import pandas as pd
+
+    if size < 0 or chunk_size < 1:
+        raise ValueError("size must be >= 0 and chunk_size >= 1")
+    mix = normalize_type_mix(type_mix or DEFAULT_TYPE_MIX)
+    if id_end is None:
+        id_end = id_start + max(size, 1) * DEFAULT_ID_SPREAD - 1
+    # span <= 2**31, so offset + row * stride stays well inside int64
+    span, stride, offset = _id_permutation(size, id_start, id_end, seed)
+
+    types = np.array(EMPLOYEE_TYPES, dtype=object)
+    probabilities = [mix[employee_type] for employee_type in EMPLOYEE_TYPES]
+
+    for chunk_index, chunk_start in enumerate(range(0, size, chunk_size)):
+        rows = np.arange(chunk_start, min(chunk_start + chunk_size, size), dtype=np.int64)
+        rng = np.random.default_rng([seed, 1, chunk_index])
+        yield pd.DataFrame({
+            'employee_id': id_start + (offset + rows * stride) % span,
+            'employee_edu_type': types[rng.choice(len(types), size=len(rows), p=probabilities)],
+        })
+
+
+def write_employees_file(path: str, size: int, type_mix: Optional[Dict[str, float]] = None,
+                         id_start: int = DEFAULT_ID_START, id_end: Optional[int] = None,
+                         comment_rate: float = 0.0, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                         seed: int = 42, progress_callback=None) -> Dict:
+    """
+    Write a synthetic employees CSV (see docs/actors/employees_file_format.md).
+
+    Args:
+        path: Output file path
+        size: Number of employees
+        type_mix: {employee type: weight} (default: DEFAULT_TYPE_MIX)
+        id_start: Lowest employee ID
+        id_end: Highest employee ID (default: id_start + size * DEFAULT_ID_SPREAD - 1)
+        comment_rate: Expected comment rows per employee row (0.01 = one per hundred)
+        chunk_size: Employees generated and written per chunk
+        seed: Random seed
+        progress_callback: Optional callback function for progress updates
+
+    Returns:
+        Dictionary with path, employees, comment_rows, types ({type: count}) and bytes
+    """
+    import numpy as np
+
+    if not 0 <= comment_rate <= 1:
+        raise ValueError("comment_rate must be between 0 and 1")
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    type_counts = {employee_type: 0 for employee_type in EMPLOYEE_TYPES}
+    written = 0
+    comment_rows = 0
+    comment_rng = np.random.default_rng([seed, 2])
+
+    with open(path, 'w', newline='') as f:
+        f.write("employee_id,employee_edu_type\n")
+        chunks = generate_employee_chunks(size, type_mix, id_start, id_end, chunk_size, seed)
+        for chunk in chunks:
+            employee_types = chunk['employee_edu_type'].to_numpy()
+            lines = [f"{employee_id},{employee_type}\n"
+                     for employee_id, employee_type in zip(chunk['employee_id'].tolist(),
+                                                           employee_types.tolist())]
+
+            # Comment rows go before the drawn employee rows
+            comment_positions = (np.flatnonzero(comment_rng.random(len(lines)) < comment_rate).tolist()
+                                 if comment_rate else [])
+            if comment_positions:
+                with_comments = []
+                previous = 0
+                for position in comment_positions:
+                    with_comments.extend(lines[previous:position])
+                    with_comments.append(f"# Synthetic employees from row {written + position + 1}\n")
+                    previous = position
+                with_comments.extend(lines[previous:])
+                lines = with_comments
+            f.writelines(lines)
+
+            for employee_type, count in chunk['employee_edu_type'].value_counts().items():
+                type_counts[employee_type] += int(count)
+            written += len(chunk)
+            comment_rows += len(comment_positions)
+
+            if progress_callback:
+                progress_callback(f"Wrote {written:,} of {size:,} employee(s)")
+
+    stats = {
+        'path': path,
+        'employees': written,
+        'comment_rows': comment_rows,
+        'types': type_counts,
+        'bytes': os.path.getsize(path),
+    }
+
+    if progress_callback:
+        progress_callback(f"Generated {path}: {written:,} employee(s), {comment_rows:,} comment row(s), "
+                          + ", ".join(f"{count:,} type {employee_type}"
+                                      for employee_type, count in type_counts.items()))
+
+    return stats
@@ -0,0 +1,373 @@
+"""
+BTC Fake - Time-Stepped Simulation
+
+Simulates a range of days in one process instead of one pipeline run per day:
+
+- the inbound files are downloaded once and the open assignments are loaded
+  from Databricks (or the local state mirror) once, for the first day
+- open assignments carry over from day to day; completed ones are removed
+- weekly manager assignments are created on Mondays
+- the 13-day recent-completion window is computed from the simulated history
+  (seeded with the completions Databricks already has for that window)
+- recommendations are fetched once per employee, or once per employee per day
+- every day gets its own ContentUserCompletion, NonCompletedAssignments and
+  UserCompletion files, named with that day's date
+
+Usage:
+    python -m simulation_cli timeline --start 2025-01-06 --end 2025-02-02
+"""
+
+from __future__ import annotations
+
+from datetime import date, datetime, time, timedelta
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import simulation_core as core
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from simulation_catalog import CourseCatalogIndex
+
+# 'once': fetch per employee on the first day and reuse; 'daily': fetch again every day
+RECOMMENDATION_REFRESH_MODES = ('once', 'daily')
+
+# Weekly manager assignments are created on this weekday (Monday = 0)
+ASSIGNMENT_WEEKDAY = 0
+
+RECENT_COMPLETION_LOOKBACK_DAYS = 13
+
+
+def get_simulation_days(start_date: date, end_date: date) -> List[date]:
+    """
+    List the days from start_date to end_date (inclusive).
+
+    Raises:
+        ValueError: If end_date is before start_date
+    """
+    if end_date < start_date:
+        raise ValueError(f"End date {end_date} is before start date {start_date}")
+    return [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+
+
+def get_simulated_now(day: date, time_of_day: time) -> datetime:
+    """Return the PT-aware datetime of a simulated day at the given time of day."""
+    return core.get_pt_timezone().localize(datetime.combine(day, time_of_day))
+
+
+class CompletionHistory:
+    """
+    Latest completion date of every (employee, content) pair, seeded from
+    content_completion and extended with each simulated day.
+    """
+
+    def __init__(self):
+        self._dates = {}
+
+    def seed(self, completion_dates_df: pd.DataFrame) -> None:
+        """Add completions read from content_completion (ba_id, content_id, completion_date rows)."""
+        for employee_id, content_id, completion_date in completion_dates_df.itertuples(index=False, name=None):
+            self.record(int(employee_id), int(content_id), completion_date)
+
+    def record(self, employee_id: int, content_id: int, completion_date: str) -> None:
+        """Record a completion (dates are YYYY-MM-DD, so they compare as strings)."""
+        employee_dates = self._dates.setdefault(employee_id, {})
+        if completion_date > employee_dates.get(content_id, ""):
+            employee_dates[content_id] = completion_date
+
+    def recent(self, employee_id: int, day: date,
+               lookback_days: int = RECENT_COMPLETION_LOOKBACK_DAYS) -> set:
+        """Content IDs completed in the lookback window ending on day (inclusive)."""
+        window_start = (day - timedelta(days=lookback_days - 1)).isoformat()
+        window_end = day.isoformat()
+        return {content_id for content_id, completion_date in self._dates.get(employee_id, {}).items()
+                if window_start <= completion_date <= window_end}
+
+
+def run_timeline_simulation(config: Dict, employees_file: str, start_date: date, end_date: date,
+                            publish_enabled: bool = False, recommendation_refresh: str = 'once',
+                            time_of_day: Optional[time] = None, progress_callback=None) -> Dict:
+    """
+    Simulate every day from start_date to end_date (inclusive) in one process.
+
+    Args:
+        config: Configuration dictionary
+        employees_file: Path to the employees CSV file
+        start_date: First simulated day (PT)
+        end_date: Last simulated day (PT)
+        publish_enabled: Whether to publish all generated files to SFTP outbound at the end
+        recommendation_refresh: 'once' or 'daily' (see RECOMMENDATION_REFRESH_MODES)
+        time_of_day: PT time used for each simulated run (default: the time of day of
+                     RUN_CLOCK_NOW, or the current one);
+                     it appears in the HHMMSS part of the filenames
+        progress_callback: Optional callback function for progress updates
+
+    Returns:
+        Dictionary with days (per-day date, files and counts), files (all generated
+        and downloaded files), course_catalog_path, standalone_content_path,
+        completion_count, published, metrics_path, trace_path and profile_paths
+
+    Raises:
+        ValueError: If the date range or recommendation_refresh is invalid
+        RuntimeError: If the inbound SFTP files cannot be downloaded
+    """
+    if recommendation_refresh not in RECOMMENDATION_REFRESH_MODES:
+        raise ValueError(f"Unknown recommendation refresh mode: {recommendation_refresh} "
+                         f"(expected one of {', '.join(RECOMMENDATION_REFRESH_MODES)})")
+
+    days = get_simulation_days(start_date, end_date)
+    if time_of_day is None:
+        # RUN_CLOCK_NOW's time of day if set, else the current time
+        time_of_day = core.RunClock.from_config(config).now.time().replace(microsecond=0)
+
+    result = {
+        'days': [],
+        'files': [],
+        'course_catalog_path': None,
+        'standalone_content_path': None,
+        'completion_count': 0,
+        'published': None,
+        'metrics_path': None,
+        'trace_path': None,
+        'profile_paths': [],
+    }
+
+    metrics = core.RunMetrics(trace=config['metrics_trace_enabled']) if config['metrics_enabled'] else None
+
+    with core.activate_run_metrics(metrics):
+        try:
+            with core.stage_timer('run'):
+                _run_timeline(config, employees_file, days, time_of_day, recommendation_refresh,
+                              publish_enabled, result, progress_callback)
+        except Exception:
+            core.increment_counter('errors.run')
+            raise
+        finally:
+            if config['metrics_enabled']:
+                result['metrics_path'], result['trace_path'] = core.export_run_metrics(
+                    metrics, config['output_dir'], progress_callback)
+
+    return result
+
+
+def _run_timeline(config: Dict, employees_file: str, days: List[date], time_of_day: time,
+                  recommendation_refresh: str, publish_enabled: bool, result: Dict,
+                  progress_callback=None) -> None:
+    """Run the steps of run_timeline_simulation(), filling in result as it goes."""
+    def progress(msg):
+        if progress_callback:
+            progress_callback(msg)
+
+    progress(f"Simulating {len(days)} day(s): {days[0]} to {days[-1]} at {time_of_day} PT")
+    progress("")
+
+    with core.stage_timer('cleanup'):
+        core.cleanup_output_directory(config, progress_callback)
+
+    with core.stage_timer('load_employees'):
+        employees_df, filtered_count = core.load_and_filter_employees(employees_file, progress_callback)
+
+    with core.stage_timer('sftp_download'):
+        course_catalog_path, standalone_content_path = core.download_inbound_files(config, progress_callback)
+    result['course_catalog_path'] = course_catalog_path
+    result['standalone_content_path'] = standalone_content_path
+
+    if not course_catalog_path or not standalone_content_path:
+        raise RuntimeError("Failed to download required files")
+
+    with core.stage_timer('load_standalone_content'):
+        standalone_df = core.load_standalone_content(standalone_content_path)
+
+    first_now = get_simulated_now(days[0], time_of_day)
+    with core.stage_timer('load_initial_state'):
+        open_assignments, history = load_initial_state(config, employees_df, first_now, progress_callback)
+
+    with core.stage_timer('catalog_index'):
+        catalog_index = core.open_course_catalog_index(course_catalog_path, progress_callback)
+    progress("")
+
+    recommendations = {}
+    try:
+        for day in days:
+            if recommendation_refresh == 'daily':
+                recommendations.clear()
+
+            with core.stage_timer('timeline_day'):
+                day_result = simulate_day(config, employees_df, standalone_df, day,
+                                          get_simulated_now(day, time_of_day), open_assignments,
+                                          history, recommendations, progress_callback, catalog_index)
+
+            result['days'].append(day_result)
+            result['completion_count'] += day_result['completion_count']
+            result['files'].extend(day_result['files'])
+    finally:
+        if catalog_index is not None:
+            catalog_index.close()
+
+    result['files'].extend([course_catalog_path, standalone_content_path])
+    core.increment_counter('rows.completions', result['completion_count'])
+    progress(f"Total completions: {result['completion_count']}")
+    progress("")
+
+    if publish_enabled:
+        publish_config = config.copy()
+        publish_config['sftp_publish_enabled'] = True
+
+        with core.stage_timer('publish'):
+            result['published'] = core.publish_files_to_sftp_outbound(
+                publish_config, result['files'], progress_callback)
+
+
+def load_initial_state(config: Dict, employees_df: pd.DataFrame, first_now: datetime,
+                       progress_callback=None):
+    """
+    Load the state the first simulated day starts from.
+
+    Args:
+        config: Configuration dictionary
+        employees_df: DataFrame with employee_id column
+        first_now: Simulated time of the first day
+        progress_callback: Optional callback function for progress updates
+
+    Returns:
+        Tuple of (open assignments {employee_id: [assignment, ...]}, CompletionHistory)
+    """
+    employee_ids = [int(employee_id) for employee_id in employees_df['employee_id'].tolist()]
+
+    if config['state_store_path']:
+        with core.stage_timer('state_sync'):
+            core.sync_local_state_store(config, progress_callback=progress_callback)
+
+    with core.stage_timer('databricks_open_assignments'):
+        open_assignments_df = core.get_open_assignments_from_databricks(config, employee_ids, progress_callback)
+
+    # Carried-over rows get the first simulated day's RequestId
+    clock = core.RunClock.from_config(config, first_now)
+    open_assignments = {}
+    for assignment in core.convert_databricks_assignments_to_output_format(open_assignments_df, clock):
+        open_assignments.setdefault(int(assignment['UserID']), []).append(assignment)
+
+    # Completions already recorded for the first day and the 12 days before it
+    # count towards the 13-day window of the first simulated days
+    history = CompletionHistory()
+    if config['state_store_path'] or core.is_databricks_configured(config):
+        with core.stage_timer('recent_completions_history'):
+            history.seed(core.get_completion_dates_for_employees(
+                config, employee_ids, RECENT_COMPLETION_LOOKBACK_DAYS, now=first_now))
+
+    return open_assignments, history
+
+
+def simulate_day(config: Dict, employees_df: pd.DataFrame, standalone_df: pd.DataFrame,
+                 day: date, now: datetime, open_assignments: Dict[int, List[Dict]],
+                 history: CompletionHistory, recommendations: Dict[int, List[Dict]],
+                 progress_callback=None,
+                 catalog_index: Optional[CourseCatalogIndex] = None) -> Dict:
+    """
+    Simulate one day and write its output files.
+
+    open_assignments, history and recommendations are updated in place so
+    they carry over to the next day.
+
+    Args:
+        config: Configuration dictionary
+        employees_df: DataFrame with employee_id and employee_edu_type columns
+        standalone_df: DataFrame containing standalone content for lookups
+        day: Simulated day (PT)
+        now: Simulated time on that day
+        open_assignments: {employee_id: [assignment, ...]} carried over from the previous day
+        history: Completion history for the 13-day window
+        recommendations: {employee_id: recommendations} cache
+        progress_callback: Optional callback function for progress updates
+        catalog_index: CourseCatalog index; recommendations are checked against
+                       it once, when fetched, and assigned content missing from
+                       CONTENT_NAME_LOOKUP is named from it
+
+    Returns:
+        Dictionary with date, completion_count, new_assignment_count,
+        open_assignment_count, output_path, assignments_path, user_completion_path and files
+    """
+    clock = core.RunClock.from_config(config, now)
+
+    new_assignment_count = 0
+    if day.weekday() == ASSIGNMENT_WEEKDAY:
+        new_assignments = core.create_manager_assignments(employees_df, clock=clock)
+        for assignment in new_assignments:
+            open_assignments.setdefault(int(assignment['UserID']), []).append(assignment)
+        new_assignment_count = len(new_assignments)
+
+    fetched = set()
+    if core.is_recommender_prefetch_enabled(config):
+        missing = [employee_id for employee_id in employees_df['employee_id'].tolist()
+                   if employee_id not in recommendations]
+        if missing:
+            with core.stage_timer('recommender'):
+                recommendations.update(core.get_training_recommendations_batch(config, missing))
+            fetched.update(missing)
+
+    day_completions = []
+    for employee in employees_df.itertuples():
+        employee_id = int(employee.employee_id)
+
+        if employee_id not in recommendations:
+            with core.stage_timer('recommender'):
+                recommendations[employee_id] = core.get_training_recommendations(config, employee_id)
+            fetched.add(employee_id)
+
+        if catalog_index is not None and employee_id in fetched and recommendations[employee_id]:
+            core.flag_unknown_recommendations(catalog_index, recommendations[employee_id], progress_callback)
+
+        assignments = open_assignments.get(employee_id, [])
+        manager_assignments = [core.build_manager_training(assignment['TrainingElementId'], catalog_index)
+                               for assignment in assignments]
+
+        with core.stage_timer('process_employee'):
+            completions = core.process_employee(
+                config, employee_id, employee.employee_edu_type,
+                manager_assignments, recommendations[employee_id], standalone_df, progress_callback,
+                recent_completions=history.recent(employee_id, day), clock=clock)
+
+        if not completions:
+            continue
+
+        completed_ids = {core.parse_content_id(completion['ContentId']) for completion in completions}
+        for content_id in completed_ids:
+            history.record(employee_id, content_id, day.isoformat())
+
+        remaining = [assignment for assignment in assignments
+                     if core.parse_content_id(assignment['TrainingElementId']) not in completed_ids]
+        if remaining:
+            open_assignments[employee_id] = remaining
+        else:
+            open_assignments.pop(employee_id, None)
+
+        day_completions.extend(completions)
+
+    all_open_assignments = [assignment for assignments in open_assignments.values()
+                            for assignment in assignments]
+
+    with core.stage_timer('write_outputs'):
+        shard_settings = core.get_shard_settings(config)
+        output_path = None
+        if day_completions:
+            output_path = core.write_content_user_completion_file(day_completions, config['output_dir'], now,
+                                                                  **shard_settings)
+        assignments_path = core.write_non_completed_assignments_file(
+            all_open_assignments, config['output_dir'], now, **shard_settings)
+        user_completion_path = core.generate_user_completion_file_from_template(config, now=now)
+
+    if progress_callback:
+        progress_callback(f"{day} ({day.strftime('%a')}): {len(day_completions)} completion(s), "
+                          f"{new_assignment_count} new assignment(s), "
+                          f"{len(all_open_assignments)} open assignment(s)")
+
+    return {
+        'date': day.isoformat(),
+        'completion_count': len(day_completions),
+        'new_assignment_count': new_assignment_count,
+        'open_assignment_count': len(all_open_assignments),
+        'output_path': output_path,
+        'assignments_path': assignments_path,
+        'user_completion_path': user_completion_path,
+        'files': [path for path in (output_path, assignments_path, user_completion_path) if path],
+    }
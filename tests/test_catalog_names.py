@@ -0,0 +1,50 @@
+"""
+Tests for naming assigned content from the CourseCatalog index.
+
+Run with:
+    python -m pytest -q tests
+"""
+
+import pandas as pd
+import pytest
+
+import simulation_core as core
+from simulation_catalog import CourseCatalogIndex
+from simulation_population import build_manager_assignments_table
+
+
+@pytest.fixture
+def catalog_index(tmp_path):
+    path = tmp_path / "CourseCatalog_V2_2025_1_14_1_100000.csv"
+    path.write_text(
+        "CourseId,CourseName,TrainingElementId,TrainingElementName,TrainingElementType\n"
+        'C1,Safety,"3,000,001",Ladder Safety,Media\n'
+        'C1,Safety,"3,000,002",,Media\n')
+    index = CourseCatalogIndex.open(str(path))
+    yield index
+    index.close()
+
+
+def test_build_manager_training_names(catalog_index):
+    known_id, known_name = next(iter(core.CONTENT_NAME_LOOKUP.items()))
+
+    assert core.build_manager_training("3,000,001", catalog_index).recommended_content == "Ladder Safety"
+    # Known content keeps its lookup name; untitled or unknown content falls back
+    assert core.build_manager_training(known_id, catalog_index).recommended_content == known_name
+    assert core.build_manager_training(3000002, catalog_index).recommended_content == "Training Content 3000002"
+    assert core.build_manager_training(3000009, catalog_index).recommended_content == "Training Content 3000009"
+    assert core.build_manager_training("3,000,001").recommended_content == "Training Content 3000001"
+
+
+def test_manager_assignments_table_matches_per_employee(catalog_index):
+    known_id = next(iter(core.CONTENT_NAME_LOOKUP))
+    assignments_df = pd.DataFrame({
+        'UserID': [1, 1, 2, 2],
+        'TrainingElementId': ["3,000,001", f"{int(known_id):,}", "3,000,009", "3,000,001"],
+    })
+
+    table = build_manager_assignments_table(assignments_df, catalog_index)
+
+    expected = [core.build_manager_training(content_id, catalog_index).recommended_content
+                for content_id in assignments_df['TrainingElementId']]
+    assert table['course_name'].tolist() == expected
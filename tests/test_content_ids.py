@@ -0,0 +1,58 @@
+"""
+Tests for the column conversions in simulation_content_ids.
+
+Run with:
+    python -m pytest -q tests
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulation_content_ids import (
+    MEMOIZED_DISTINCT_LIMIT,
+    format_content_ids,
+    parse_content_id,
+    parse_content_ids,
+)
+
+
+@pytest.mark.parametrize('distinct', [100, 2 * MEMOIZED_DISTINCT_LIMIT])
+def test_parse_mixed_ints_and_strings(distinct):
+    # CSV values (comma-formatted strings) combined with Databricks values (ints)
+    ints = list(range(1_000_000, 1_000_000 + distinct))
+    strings = [f"{value:,}" for value in range(2_000_000, 2_000_000 + distinct)]
+    values = pd.Series(ints + strings, dtype=object)
+
+    parsed = parse_content_ids(values)
+
+    expected = np.array(ints + list(range(2_000_000, 2_000_000 + distinct)), dtype=np.int64)
+    np.testing.assert_array_equal(parsed, expected)
+
+
+@pytest.mark.parametrize('distinct', [100, 2 * MEMOIZED_DISTINCT_LIMIT])
+def test_parse_matches_scalar_parser(distinct):
+    values = [f" {value:,} " if value % 3 else value for value in range(distinct)]
+    values = values + values[::-1]
+
+    parsed = parse_content_ids(pd.Series(values, dtype=object))
+
+    assert parsed.tolist() == [parse_content_id(value) for value in values]
+
+
+@pytest.mark.parametrize('distinct', [100, 2 * MEMOIZED_DISTINCT_LIMIT])
+@pytest.mark.parametrize('bad', ['abc', 1.5, None])
+def test_parse_rejects_invalid_values(distinct, bad):
+    values = pd.Series([f"{value:,}" for value in range(distinct)] + [bad], dtype=object)
+
+    with pytest.raises(ValueError):
+        parse_content_ids(values)
+
+
+def test_format_round_trip():
+    ids = np.array([1915085, 7, 1915085, 2020001], dtype=np.int64)
+
+    formatted = format_content_ids(ids)
+
+    assert formatted.tolist() == ['1,915,085', '7', '1,915,085', '2,020,001']
+    np.testing.assert_array_equal(parse_content_ids(formatted), ids)
@@ -0,0 +1,156 @@
+"""
+Parity tests: simulate_population_completions() against process_employee().
+
+The vectorized engine must return the concatenated process_employee()
+results row for row for the same inputs. The clock is frozen with fixed
+training times, so both engines stamp the same times.
+
+Run with:
+    python -m pytest -q tests
+"""
+
+import random
+
+import pandas as pd
+import pytest
+
+import simulation_core as core
+from simulation_population import (build_manager_assignments_table, build_recent_completions_table,
+                                   build_training_table, completions_to_records,
+                                   simulate_population_completions)
+from simulation_records import TrainingItem
+
+NOW = core.parse_clock_time("2025-01-14T09:30")
+
+
+def run_per_employee(config, employees_df, manager, recommendations, recent, clock):
+    completions = []
+    for employee in employees_df.itertuples():
+        employee_id = employee.employee_id
+        completions.extend(core.process_employee(
+            config, employee_id, employee.employee_edu_type,
+            manager.get(employee_id, []), recommendations.get(employee_id, []), None,
+            recent_completions=recent.get(employee_id, set()), clock=clock))
+    return completions
+
+
+def run_vectorized(employees_df, manager, recommendations, recent, clock):
+    completions_df = simulate_population_completions(
+        employees_df, build_training_table(manager), build_training_table(recommendations),
+        build_recent_completions_table(recent), clock=clock)
+    return completions_to_records(completions_df)
+
+
+def assert_parity(employees_df, manager, recommendations, recent):
+    config = core.load_config()
+    clock = core.RunClock(NOW)
+
+    expected = run_per_employee(config, employees_df, manager, recommendations, recent, clock)
+    actual = run_vectorized(employees_df, manager, recommendations, recent, clock)
+
+    assert [tuple(record) for record in actual] == [tuple(record) for record in expected]
+    return expected
+
+
+def manager_item(content_id):
+    return core.build_manager_training(content_id)
+
+
+def ai_item(content_id):
+    return TrainingItem(content_id, f"AI Course {content_id}", "ai")
+
+
+def test_type_rules_and_first_entry_across_sources():
+    employees_df = pd.DataFrame({
+        'employee_id': [1, 2, 3, 4, 5, 6, 7],
+        'employee_edu_type': ['a', 'b', 'b', 'b', 'f', ' B ', 'A'],
+    })
+    manager = {
+        1: [manager_item(1001), manager_item(1002)],
+        2: [manager_item(1003)],
+        5: [manager_item(1004)],
+        7: [manager_item(1005)],
+    }
+    recommendations = {
+        1: [ai_item(2001), ai_item(2002)],
+        2: [ai_item(2003)],
+        # Type b without manager assignments takes its first recommendation
+        3: [ai_item(2004), ai_item(2005)],
+        # Type b whose only recommendations were completed recently: nothing
+        4: [ai_item(2006)],
+        5: [ai_item(2007)],
+        6: [ai_item(2008), ai_item(2009)],
+    }
+    recent = {4: {2006}, 6: {2008}}
+
+    expected = assert_parity(employees_df, manager, recommendations, recent)
+
+    assert [(record.UserId, record.Source) for record in expected] == [
+        (1, 'manager'), (1, 'manager'), (1, 'ai'), (1, 'ai'),
+        (2, 'manager'), (3, 'ai'), (6, 'ai'), (7, 'manager')]
+    assert next(record.ContentId for record in expected if record.UserId == 6) == core.format_content_id(2009)
+
+
+def test_recent_completions_only_filter_ai_recommendations():
+    employees_df = pd.DataFrame({'employee_id': [10, 11], 'employee_edu_type': ['a', 'b']})
+    manager = {10: [manager_item(3001)], 11: [manager_item(3002)]}
+    recommendations = {10: [ai_item(3001), ai_item(3003)], 11: [ai_item(3004)]}
+    # A recent completion of manager-assigned content does not drop the assignment
+    recent = {10: {3001, 3003}, 11: {3002}}
+
+    expected = assert_parity(employees_df, manager, recommendations, recent)
+
+    assert [(record.UserId, record.ContentId, record.Source) for record in expected] == [
+        (10, core.format_content_id(3001), 'manager'), (11, core.format_content_id(3002), 'manager')]
+
+
+def test_duplicate_employee_ids():
+    employees_df = pd.DataFrame({
+        'employee_id': [20, 21, 20, 22, 21],
+        'employee_edu_type': ['a', 'b', 'b', 'f', 'a'],
+    })
+    manager = {20: [manager_item(4001)], 21: [manager_item(4002), manager_item(4003)]}
+    recommendations = {20: [ai_item(4004)], 21: [ai_item(4005)], 22: [ai_item(4006)]}
+
+    expected = assert_parity(employees_df, manager, recommendations, {})
+
+    assert [record.UserId for record in expected] == [20, 20, 21, 20, 21, 21, 21]
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_random_population(seed):
+    rng = random.Random(seed)
+    employee_ids = [100000 + rng.randrange(150) for _ in range(200)]
+    employees_df = pd.DataFrame({
+        'employee_id': employee_ids,
+        'employee_edu_type': [rng.choice(['a', 'b', 'f', 'A', ' b']) for _ in employee_ids],
+    })
+    content_ids = list(range(5000, 5040))
+    manager = {employee_id: [manager_item(content_id) for content_id in rng.sample(content_ids, rng.randrange(3))]
+               for employee_id in set(employee_ids) if rng.random() < 0.7}
+    recommendations = {employee_id: [ai_item(content_id) for content_id in rng.sample(content_ids, rng.randrange(4))]
+                       for employee_id in set(employee_ids) if rng.random() < 0.9}
+    recent = {employee_id: set(rng.sample(content_ids, rng.randrange(6)))
+              for employee_id in set(employee_ids) if rng.random() < 0.5}
+
+    assert_parity(employees_df, manager, recommendations, recent)
+
+
+def test_manager_table_from_assignments_file_rows():
+    employees_df = pd.DataFrame({'employee_id': [30, 31], 'employee_edu_type': ['a', 'b']})
+    assignments_df = pd.DataFrame({
+        'UserID': [31, 30, 31, 30],
+        'TrainingElementId': ["1,915,085", "2,020,001", "7,000,001", "1,915,085"],
+    })
+    manager_items = {}
+    for row in assignments_df.itertuples():
+        manager_items.setdefault(row.UserID, []).append(core.build_manager_training(row.TrainingElementId))
+    clock = core.RunClock(NOW)
+
+    expected = run_per_employee(core.load_config(), employees_df, manager_items, {}, {}, clock)
+    completions_df = simulate_population_completions(
+        employees_df, build_manager_assignments_table(assignments_df), build_training_table({}),
+        build_recent_completions_table({}), clock=clock)
+
+    assert [tuple(record) for record in completions_to_records(completions_df)] == \
+        [tuple(record) for record in expected]
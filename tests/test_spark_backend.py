@@ -0,0 +1,79 @@
+"""
+Local-mode PySpark tests: the Spark backend must write the same files as the
+local backend.
+
+Both backends run against the load harness stand-ins with a frozen clock and
+fixed training times, and their ContentUserCompletion, NonCompletedAssignments
+and UserCompletion files are compared byte for byte. This checks the partition
+ordering, format_number and the merged-CSV layout of simulation_spark.
+
+Skipped when pyspark or a Java runtime is missing (pip install -r
+requirements-dev.txt).
+
+Run with:
+    python -m pytest -q tests
+"""
+
+import os
+import shutil
+import sys
+from datetime import date
+
+import pytest
+
+pytest.importorskip('pyspark')
+if not (shutil.which('java') or os.environ.get('JAVA_HOME')):
+    pytest.skip("PySpark needs a Java runtime", allow_module_level=True)
+
+import simulation_core as core  # noqa: E402
+from load_harness.harness import LoadHarness  # noqa: E402
+from simulation_spark import get_spark_session  # noqa: E402
+
+POPULATION_SIZE = 120
+
+# UserCompletion is also the suffix of ContentUserCompletion: match on the prefix
+OUTPUT_PREFIXES = ('ContentUserCompletion', 'Non_Completed_Assignments', 'UserCompletion')
+
+
+@pytest.fixture(scope='module')
+def spark():
+    # Python workers run with the test interpreter
+    os.environ.setdefault('PYSPARK_PYTHON', sys.executable)
+    session = get_spark_session({'spark_master': 'local[1]'})
+    yield session
+    session.stop()
+
+
+@pytest.fixture
+def frozen_run(monkeypatch):
+    # Today's date, so the seeded completions fall inside the 13-day window
+    monkeypatch.setenv('RUN_CLOCK_NOW', f"{date.today().isoformat()}T09:30")
+    monkeypatch.setenv('TRAINING_TIME_DISTRIBUTION', 'fixed')
+    # The backends choose the non-Daily Dose assignment differently (random
+    # vs hashed); with a single candidate they agree
+    monkeypatch.setattr(core, 'NON_DAILY_DOSE_CONTENT', core.NON_DAILY_DOSE_CONTENT[:1])
+
+
+def run_backend(work_dir, backend, monkeypatch, partitions=0):
+    monkeypatch.setenv('EXECUTION_BACKEND', backend)
+    monkeypatch.setenv('SPARK_PARTITIONS', str(partitions))
+    with LoadHarness(work_dir=str(work_dir)) as harness:
+        report = harness.run(POPULATION_SIZE)
+
+    output_dir = work_dir / f"run_{POPULATION_SIZE}" / "generated_files"
+    files = {path.name: path.read_bytes() for path in sorted(output_dir.glob('*.csv'))
+             if path.name.startswith(OUTPUT_PREFIXES)}
+    return report, files
+
+
+@pytest.mark.parametrize('partitions', [1, 4])
+def test_spark_output_matches_local_backend(spark, frozen_run, monkeypatch, tmp_path, partitions):
+    local_report, local_files = run_backend(tmp_path / 'local', 'local', monkeypatch)
+    spark_report, spark_files = run_backend(tmp_path / 'spark', 'spark', monkeypatch, partitions)
+
+    assert local_report['completions'] > 0
+    assert spark_report['completions'] == local_report['completions']
+    assert sorted(spark_files) == sorted(local_files)
+    assert all(any(name.startswith(prefix) for name in local_files) for prefix in OUTPUT_PREFIXES)
+    for name, content in local_files.items():
+        assert spark_files[name] == content, name
@@ -0,0 +1,133 @@
+"""
+Round-trip tests for simulation_core.write_zip_archive.
+
+Large files are deflated in worker threads and appended as raw entries, which
+goes through ZipFile internals (see _write_precompressed_entry). These tests
+read every archive back with zipfile and testzip() so a change in zipfile that
+breaks the raw entry path shows up here.
+
+Run with:
+    python -m pytest -q tests
+"""
+
+import io
+import os
+import random
+import zipfile
+
+import pytest
+
+from simulation_core import write_zip_archive
+
+
+class NonSeekableWriter(io.RawIOBase):
+    """Write-only stream without seek/tell, like an HTTP response body."""
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def write(self, data):
+        return self.buffer.write(data)
+
+
+@pytest.fixture
+def sample_files(tmp_path):
+    """A mix of small and large, compressible and random files."""
+    rng = random.Random(7)
+    contents = {
+        'employees.csv': b'ba_id,job_code\n' + b''.join(
+            f'{i},J{i % 17:03d}\n'.encode() for i in range(2000)),
+        'Assignments.csv': b'RequestId,BA_ID,ContentId\n' * 40000,
+        'Completions.csv': bytes(rng.getrandbits(8) for _ in range(300 * 1024)),
+        'empty.csv': b'',
+    }
+    paths = []
+    for name, data in contents.items():
+        path = tmp_path / name
+        path.write_bytes(data)
+        paths.append(str(path))
+    return paths, contents
+
+
+def assert_round_trip(archive, contents):
+    with zipfile.ZipFile(archive) as zip_file:
+        assert zip_file.testzip() is None
+        assert zip_file.namelist() == list(contents)
+        for name, data in contents.items():
+            assert zip_file.read(name) == data
+
+
+@pytest.mark.parametrize('parallel_min_bytes', [0, 64 * 1024, 1 << 40])
+def test_path_destination_round_trip(tmp_path, sample_files, parallel_min_bytes):
+    paths, contents = sample_files
+    destination = str(tmp_path / 'out.zip')
+
+    added = write_zip_archive(paths, destination, workers=2,
+                              parallel_min_bytes=parallel_min_bytes)
+
+    assert added == len(paths)
+    assert_round_trip(destination, contents)
+
+
+@pytest.mark.parametrize('parallel_min_bytes', [0, 1 << 40])
+def test_non_seekable_destination_round_trip(sample_files, parallel_min_bytes):
+    paths, contents = sample_files
+    destination = NonSeekableWriter()
+
+    write_zip_archive(paths, destination, workers=2, parallel_min_bytes=parallel_min_bytes)
+
+    assert_round_trip(io.BytesIO(destination.buffer.getvalue()), contents)
+
+
+def test_stored_compression_and_missing_files(tmp_path, sample_files):
+    paths, contents = sample_files
+    destination = str(tmp_path / 'stored.zip')
+
+    added = write_zip_archive(paths + [str(tmp_path / 'missing.csv'), None],
+                              destination, compression='stored')
+
+    assert added == len(paths)
+    assert_round_trip(destination, contents)
+    with zipfile.ZipFile(destination) as zip_file:
+        assert {info.compress_type for info in zip_file.infolist()} == {zipfile.ZIP_STORED}
+
+
+def test_parallel_entries_keep_file_metadata(tmp_path, sample_files):
+    paths, _ = sample_files
+    destination = str(tmp_path / 'out.zip')
+
+    write_zip_archive(paths, destination, parallel_min_bytes=0)
+
+    with zipfile.ZipFile(destination) as zip_file:
+        for path in paths:
+            info = zip_file.getinfo(os.path.basename(path))
+            expected = zipfile.ZipInfo.from_file(path, os.path.basename(path))
+            # DOS timestamps have two-second resolution
+            assert info.date_time[:5] == expected.date_time[:5]
+            assert info.date_time[5] == expected.date_time[5] // 2 * 2
+            assert info.external_attr == expected.external_attr
+            assert info.compress_type == zipfile.ZIP_DEFLATED
+
+
+def test_duplicate_names_warn(tmp_path):
+    first = tmp_path / 'a'
+    second = tmp_path / 'b'
+    first.mkdir()
+    second.mkdir()
+    (first / 'same.csv').write_bytes(b'one\n' * 1000)
+    (second / 'same.csv').write_bytes(b'two\n' * 1000)
+
+    with pytest.warns(UserWarning, match='Duplicate name'):
+        write_zip_archive([str(first / 'same.csv'), str(second / 'same.csv')],
+                          str(tmp_path / 'dup.zip'), parallel_min_bytes=0)
+
+
+def test_unsupported_compression(tmp_path):
+    with pytest.raises(ValueError):
+        write_zip_archive([], str(tmp_path / 'x.zip'), compression='bzip2')